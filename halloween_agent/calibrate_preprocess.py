@@ -0,0 +1,116 @@
+"""
+Pick the smallest LLM input resolution that keeps people detection accuracy.
+
+Runs every image of the validation set through the vision LLM at full
+resolution and at each candidate long edge from settings.image.preprocess.adaptive,
+then writes the smallest long edge whose accuracy is within max_accuracy_drop of
+the full resolution accuracy to the calibration file read by core.preprocess_frame.
+
+The validation directory holds the images plus a labels.json file mapping each
+file name to whether people are present, e.g. {"porch_001.jpg": true}.
+
+Usage:
+    python calibrate_preprocess.py
+"""
+import os
+import json
+import time
+import logging
+from core import settings, llm, FrameImage, preprocess_frame, create_prompt_message, build_prompt, response_parser
+from response_parser import ResponseValidationError
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+def load_validation_set(validation_dir):
+    """
+    Load labeled validation images
+
+    Args:
+        validation_dir: Directory with images and labels.json
+    Returns:
+        list: (FrameImage, found_people label) tuples
+    """
+    with open(os.path.join(validation_dir, 'labels.json')) as f:
+        labels = json.load(f)
+    samples = []
+    for filename, found_people in labels.items():
+        with open(os.path.join(validation_dir, filename), 'rb') as f:
+            samples.append((FrameImage(f.read()), bool(found_people)))
+    return samples
+
+def detect_people(frame, provider, prompt):
+    """
+    Ask the LLM whether people are present, None if the answer cannot be parsed
+    """
+    response = llm.invoke(create_prompt_message(frame, prompt, provider))
+    content = response.content if hasattr(response, 'content') else str(response)
+    try:
+        return response_parser.parse(content)['found_people']
+    except (json.JSONDecodeError, ResponseValidationError):
+        return None
+
+def evaluate(samples, max_long_edge, provider, prompt):
+    """
+    Accuracy and mean latency of the LLM on the validation set at one resolution
+
+    Args:
+        samples: Output of load_validation_set
+        max_long_edge: Long edge to resize to, None for full resolution
+    Returns:
+        tuple: (accuracy, mean seconds per frame)
+    """
+    correct = 0
+    start = time.time()
+    for frame, label in samples:
+        llm_frame = preprocess_frame(frame, max_long_edge=max_long_edge or 0)
+        if detect_people(llm_frame, provider, prompt) == label:
+            correct += 1
+    return correct / len(samples), (time.time() - start) / len(samples)
+
+def calibrate():
+    """
+    Evaluate candidate resolutions from the largest down and write the calibration file
+
+    The smallest edge is chosen for which it and every larger candidate keep
+    the accuracy; evaluation stops at the first candidate that loses too much.
+    If the largest candidate already does, 0 (do not downscale) is written.
+
+    Returns:
+        dict: The calibration result that was written
+    """
+    adaptive = settings.image.preprocess.adaptive
+    provider = settings.llm.provider.lower()
+    prompt = build_prompt()
+    samples = load_validation_set(adaptive.validation_dir)
+    if not samples:
+        raise ValueError(f"No labeled images in {adaptive.validation_dir}")
+
+    baseline_accuracy, baseline_latency = evaluate(samples, None, provider, prompt)
+    logger.info(f"Full resolution: accuracy {baseline_accuracy:.3f}, {baseline_latency:.2f}s per frame")
+
+    results = {}
+    chosen = 0  # full resolution, when even the largest candidate loses accuracy
+    for edge in sorted(adaptive.candidate_edges, reverse=True):
+        accuracy, latency = evaluate(samples, edge, provider, prompt)
+        results[str(edge)] = {"accuracy": accuracy, "seconds_per_frame": latency}
+        logger.info(f"Long edge {edge}: accuracy {accuracy:.3f}, {latency:.2f}s per frame")
+        if accuracy < baseline_accuracy - adaptive.max_accuracy_drop:
+            # Accuracy is not monotonic in resolution on a small validation set: a smaller
+            # edge passing by chance after this one failed would not be trustworthy
+            break
+        chosen = edge
+
+    calibration = {
+        "max_long_edge": chosen,
+        "baseline": {"accuracy": baseline_accuracy, "seconds_per_frame": baseline_latency},
+        "candidates": results,
+        "num_samples": len(samples),
+    }
+    with open(adaptive.calibration_file, 'w') as f:
+        json.dump(calibration, f, indent=2)
+    logger.info(f"Selected max_long_edge={chosen}, written to {adaptive.calibration_file}")
+    return calibration
+
+if __name__ == "__main__":
+    print(json.dumps(calibrate(), indent=2))
@@ -1,8 +1,9 @@
 import os
+import json
 import base64
+import binascii
 import logging
 import traceback
-from datetime import datetime
 from io import BytesIO
 from PIL import Image
 import cv2
@@ -10,6 +11,8 @@ import numpy as np
 from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, AIMessage
 from dynaconf import Dynaconf
+from storage import ImageStore
+from response_parser import ResponseParser, build_schema, schema_instructions
 
 # Initialize settings
 settings = Dynaconf(
@@ -36,11 +39,137 @@ class LLMProcessingError(Exception):
     """Custom exception for LLM processing errors"""
     pass
 
+class FrameImage:
+    """
+    Request-scoped image that decodes its base64 payload once.
+
+    The raw bytes are kept as received and every derived form (PIL header,
+    numpy array, base64 string, downscaled JPEG) is computed on first use and
+    cached, so validation, motion detection, storage and prompt construction
+    share one decode.
+    """
+
+    def __init__(self, image_bytes, image_base64=None):
+        """
+        Args:
+            image_bytes: Encoded image file contents (JPEG, PNG, ...)
+            image_base64: Base64 encoding of image_bytes without data-URL prefix, if already known
+        """
+        if not image_bytes:
+            raise ImageProcessingError("No image data provided")
+        self.data = image_bytes
+        self._base64 = image_base64
+        self._header = None
+        self._array = None
+
+    @classmethod
+    def from_base64(cls, image_base64):
+        """
+        Create a frame from a base64 string, with or without a data-URL prefix
+        """
+        if not image_base64:
+            raise ImageProcessingError("No image data provided")
+        if ';base64,' in image_base64:
+            image_base64 = image_base64.split(';base64,')[1]
+        try:
+            image_bytes = base64.b64decode(image_base64)
+        except (binascii.Error, ValueError) as e:
+            raise ImageProcessingError(f"Invalid base64 image data: {str(e)}")
+        return cls(image_bytes, image_base64)
+
+    @classmethod
+    def from_array(cls, image_np, quality=90):
+        """
+        Create a JPEG frame from a BGR numpy array
+        """
+        if image_np is None:
+            raise ImageProcessingError("Input image is None")
+        ok, buffer = cv2.imencode('.jpg', image_np, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ImageProcessingError("Failed to encode image as JPEG")
+        frame = cls(buffer.tobytes())
+        frame._array = image_np
+        return frame
+
+    def _read_header(self):
+        # Image.open only parses the header; pixel data is not decoded
+        if self._header is None:
+            try:
+                with Image.open(BytesIO(self.data)) as img:
+                    self._header = ((img.format or '').lower(), img.size)
+            except Exception as e:
+                raise ImageProcessingError(f"Unrecognized image data: {str(e)}")
+        return self._header
+
+    @property
+    def format(self):
+        return self._read_header()[0]
+
+    @property
+    def size(self):
+        """(width, height) read from the image header"""
+        return self._read_header()[1]
+
+    @property
+    def mime_type(self):
+        return f"image/{'jpeg' if self.format in ('jpeg', 'jpg') else self.format}"
+
+    @property
+    def extension(self):
+        return 'jpg' if self.format in ('jpeg', 'jpg') else self.format
+
+    @property
+    def array(self):
+        """BGR numpy array, decoded on first access"""
+        if self._array is None:
+            self._array = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+            if self._array is None:
+                raise ImageProcessingError("Failed to decode image data")
+        return self._array
+
+    @property
+    def base64(self):
+        """Base64 string without data-URL prefix"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode('utf-8')
+        return self._base64
+
+    def to_jpeg(self, max_long_edge=None, quality=85):
+        """
+        Return a (optionally downscaled) JPEG copy of this frame
+
+        Args:
+            max_long_edge: Maximum length in pixels of the longer side, None to keep the size
+            quality: JPEG quality (1-100)
+        Returns:
+            FrameImage: The re-encoded frame
+        """
+        image_np = self.array
+        h, w = image_np.shape[:2]
+        if max_long_edge and max(h, w) > max_long_edge:
+            scale = max_long_edge / max(h, w)
+            image_np = cv2.resize(image_np, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        return FrameImage.from_array(image_np, quality=quality)
+
+
+def as_frame(image):
+    """
+    Accept either a FrameImage or a base64 string and return a FrameImage
+    """
+    if isinstance(image, FrameImage):
+        return image
+    return FrameImage.from_base64(image)
+
+# Schema of the JSON the LLM must answer with, generated from settings.llm.response_fields
+response_schema = build_schema(settings.llm.response_fields)
+response_parser = ResponseParser(response_schema)
+
 if settings.llm.provider == "ollama":
-    # Initialize LLM
+    # Initialize LLM; in structured output mode Ollama constrains decoding to the schema
     llm = ChatOllama(
         model=settings.llm.model,
-        temperature=settings.llm.temperature
+        temperature=settings.llm.temperature,
+        format=response_schema if settings.llm.structured_output else None
     )
 elif settings.llm.provider == "together":
     print("Using Together AI")
@@ -57,46 +186,29 @@ elif settings.llm.provider == "together":
     
     
 
-def manage_image_storage(image_base64):
+_image_store = None
+
+def get_image_store():
+    """
+    Shared ImageStore built from settings.image.storage on first use
+    """
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore.from_settings(settings.image.storage)
+    return _image_store
+
+def manage_image_storage(image):
     """
     Save image to storage and maintain only the last N images
-    
+
     Args:
-        image_base64: Base64 encoded image string
+        image: FrameImage or base64 encoded image string
     Returns:
         str: Path to the saved image
     """
     try:
-        storage_dir = settings.image.storage.dir
-        max_images = settings.image.storage.max_images
-
-        # Create storage directory if it doesn't exist
-        os.makedirs(storage_dir, exist_ok=True)
-
-        # Generate timestamp-based filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"image_{timestamp}.jpg"
-        filepath = os.path.join(storage_dir, filename)
-
-        # Save the new image
-        if ';base64,' in image_base64:
-            image_base64 = image_base64.split(';base64,')[1]
-        image_data = base64.b64decode(image_base64)
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
-
-        # Get list of existing images sorted by creation time
-        existing_images = sorted(
-            [os.path.join(storage_dir, f) for f in os.listdir(storage_dir) if f.endswith(('.jpg', '.jpeg', '.png'))],
-            key=os.path.getctime
-        )
-
-        # Remove oldest images if exceeding max_images
-        while len(existing_images) >= max_images:
-            oldest_image = existing_images.pop(0)
-            os.remove(oldest_image)
-            logger.info(f"Removed oldest image: {oldest_image}")
-
+        frame = as_frame(image)
+        filepath = get_image_store().save(frame.data, frame.extension)
         logger.info(f"Saved new image: {filepath}")
         return filepath
 
@@ -104,6 +216,80 @@ def manage_image_storage(image_base64):
         logger.error(f"Error in manage_image_storage: {str(e)}\n{traceback.format_exc()}")
         raise ImageProcessingError(f"Failed to manage image storage: {str(e)}")
 
+_calibration_cache = {"mtime": None, "max_long_edge": None}
+
+def _calibrated_long_edge(calibration_file):
+    """
+    Read the long edge chosen by calibrate_preprocess.py, reloading the file when it changes
+    """
+    try:
+        mtime = os.path.getmtime(calibration_file)
+    except OSError:
+        return None
+    if _calibration_cache["mtime"] != mtime:
+        with open(calibration_file) as f:
+            _calibration_cache["max_long_edge"] = json.load(f).get("max_long_edge")
+        _calibration_cache["mtime"] = mtime
+        logger.info(f"Loaded calibrated max_long_edge={_calibration_cache['max_long_edge']} from {calibration_file}")
+    return _calibration_cache["max_long_edge"]
+
+def preprocess_frame(frame, max_long_edge=None, roi=None, jpeg_quality=None):
+    """
+    Shrink a frame before it is sent to the vision LLM
+
+    Optionally crops a region of interest (e.g. the door area), resizes so the
+    longer side is at most max_long_edge, and re-encodes as JPEG. Arguments
+    default to the image.preprocess settings; in adaptive mode the long edge
+    comes from the calibration file written by calibrate_preprocess.py.
+
+    Args:
+        frame: FrameImage to preprocess
+        max_long_edge: Maximum length in pixels of the longer side, 0 to keep the resolution
+        roi: [x, y, width, height] as fractions of the frame, None for the whole frame
+        jpeg_quality: JPEG quality (1-100)
+    Returns:
+        FrameImage: The frame to send to the LLM (the input frame if nothing had to change)
+    """
+    try:
+        preprocess_settings = settings.image.preprocess
+        if max_long_edge is None:
+            max_long_edge = preprocess_settings.max_long_edge
+            if preprocess_settings.adaptive.enabled:
+                calibrated = _calibrated_long_edge(preprocess_settings.adaptive.calibration_file)
+                if calibrated is not None:  # 0: calibration found no edge that keeps accuracy, send full resolution
+                    max_long_edge = calibrated
+        if roi is None:
+            roi = preprocess_settings.roi
+        if jpeg_quality is None:
+            jpeg_quality = preprocess_settings.jpeg_quality
+
+        width, height = frame.size
+        if not roi and not (max_long_edge and max(width, height) > max_long_edge) and frame.format == 'jpeg':
+            return frame
+
+        image_np = frame.array
+        if roi:
+            x, y, w, h = roi
+            x0, y0 = int(x * width), int(y * height)
+            x1, y1 = int((x + w) * width), int((y + h) * height)
+            image_np = image_np[max(y0, 0):min(y1, height), max(x0, 0):min(x1, width)]
+            if image_np.size == 0:
+                raise ImageProcessingError(f"Region of interest {roi} is empty")
+        h, w = image_np.shape[:2]
+        if max_long_edge and max(h, w) > max_long_edge:
+            scale = max_long_edge / max(h, w)
+            image_np = cv2.resize(image_np, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        processed = FrameImage.from_array(image_np, quality=jpeg_quality)
+        logger.debug(f"Preprocessed frame {width}x{height} ({len(frame.data)} bytes) -> "
+                     f"{processed.size[0]}x{processed.size[1]} ({len(processed.data)} bytes)")
+        return processed
+
+    except ImageProcessingError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in preprocess_frame: {str(e)}\n{traceback.format_exc()}")
+        raise ImageProcessingError(f"Failed to preprocess image: {str(e)}")
+
 def convert_to_base64(pil_image):
     """
     Convert PIL images to Base64 encoded strings
@@ -174,20 +360,19 @@ def decode_image(image_base64):
 
 
 
-def create_prompt_message(image_base64, text, provider="ollama"):
+def create_prompt_message(image, text, provider="ollama"):
     """
     Create prompt message with image and text content based on provider
     
     Args:
-        image_base64: Base64 encoded image string
+        image: FrameImage or base64 encoded image string
         text: Prompt text
         provider: LLM provider ("ollama" or "together")
     Returns:
         list: Formatted messages for the specified provider
     """
-    # Handle base64 prefix if present
-    if ';base64,' in image_base64:
-        image_base64 = image_base64.split(';base64,')[1]
+    frame = as_frame(image)
+    image_url = f"data:{frame.mime_type};base64,{frame.base64}"
     
     ai_prompt = AIMessage(content="You are a bot that is good at analyzing images.")
     
@@ -195,7 +380,7 @@ def create_prompt_message(image_base64, text, provider="ollama"):
         # Ollama format
         image_part = {
             "type": "image_url",
-            "image_url": f"data:image/jpeg;base64,{image_base64}"
+            "image_url": image_url
         }
         text_part = {"type": "text", "text": text}
         content_parts = [image_part, text_part]
@@ -209,7 +394,7 @@ def create_prompt_message(image_base64, text, provider="ollama"):
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_base64}"
+                        "url": image_url
                     }
                 },
                 {
@@ -221,24 +406,36 @@ def create_prompt_message(image_base64, text, provider="ollama"):
     else:
         raise ValueError(f"Unsupported provider: {provider}")
 
+def build_prompt():
+    """
+    Prompt from settings followed by a description of the expected JSON
+    """
+    prompt = settings.llm.prompt if hasattr(settings.llm, 'prompt') else "Describe the contents of this image."
+    return prompt + schema_instructions(response_schema)
+
 def summarize_image(encoded_image):
     """
     Generate summary of image using LLM
+
+    Args:
+        encoded_image: FrameImage or base64 encoded image string
     """
     try:
         logger.info("Starting image summarization")
         if not encoded_image:
             raise LLMProcessingError("No encoded image provided")
+        frame = as_frame(encoded_image)
 
         # Save image before processing
-        manage_image_storage(encoded_image)
+        manage_image_storage(frame)
 
         # Get provider from settings
         provider = settings.llm.provider.lower()
 
         # Create prompt message
-        prompt = settings.llm.prompt if hasattr(settings.llm, 'prompt') else "Describe the contents of this image."
-        message = create_prompt_message(encoded_image, prompt, provider)
+        prompt = build_prompt()
+        llm_frame = preprocess_frame(frame) if settings.image.preprocess.enabled else frame
+        message = create_prompt_message(llm_frame, prompt, provider)
         
         logger.debug(f"Sending request to LLM using provider: {provider}")
         logger.debug("message: " + str(message))
@@ -1,35 +1,223 @@
 import sqlite3
 import json
+import queue
 import logging
+import threading
+import time
+from datetime import datetime, timezone
 
 # Get logger
 logger = logging.getLogger(__name__)
 
-def init_db():
-    """Initialize SQLite database and create necessary tables"""
-    conn = sqlite3.connect('halloween_responses.db')
+DB_PATH = 'halloween_responses.db'
+
+_STOP = object()
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # WAL keeps the database consistent with NORMAL; only the last batches can be lost on power failure
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class DatabaseWriter:
+    """
+    Single writer thread owning one WAL-mode connection.
+
+    Statements are queued by `execute` and committed in batches: a transaction
+    is committed once `batch_size` statements are collected or
+    `flush_interval_seconds` after its first statement, whichever comes first,
+    so a busy camera feed costs one fsync per batch instead of one per frame.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=50, flush_interval_seconds=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def execute(self, sql, params=()):
+        """Queue a write statement; it is committed with the next batch"""
+        if not self._thread.is_alive():
+            raise RuntimeError("Database writer is closed")
+        self._queue.put((sql, params))
+
+    def flush(self):
+        """Block until every queued statement is committed"""
+        self._queue.join()
+
+    def close(self):
+        """Commit pending statements and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self):
+        conn = _connect(self.db_path)
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval_seconds
+                while item is not _STOP and len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+
+                statements = [entry for entry in batch if entry is not _STOP]
+                try:
+                    with conn:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                    if statements:
+                        logger.info(f"Committed {len(statements)} database writes")
+                except Exception as e:
+                    logger.error(f"Error saving to database, dropped {len(statements)} writes: {str(e)}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if len(statements) != len(batch):
+                    break
+        finally:
+            conn.close()
+
+
+_writer = None
+
+def init_db(db_path=DB_PATH, batch_size=50, flush_interval_seconds=1.0):
+    """Initialize SQLite database, create necessary tables and start the writer thread"""
+    global _writer
+    conn = _connect(db_path)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS llm_responses
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                   response_data JSON,
                   timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_timestamp ON llm_responses (timestamp)')
+    # Validated LLM answers as typed columns, so queries and alerts need no JSON parsing
+    c.execute('''CREATE TABLE IF NOT EXISTS detections
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  timestamp DATETIME NOT NULL,
+                  found_people BOOLEAN NOT NULL,
+                  people_count INTEGER NOT NULL,
+                  description_of_people JSON)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections (timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_detections_found_people ON detections (found_people, timestamp)')
     conn.commit()
     conn.close()
 
+    if _writer is not None:
+        _writer.close()
+    _writer = DatabaseWriter(db_path, batch_size=batch_size, flush_interval_seconds=flush_interval_seconds)
+
+def flush_db():
+    """Block until queued writes are committed"""
+    if _writer is not None:
+        _writer.flush()
+
+def close_db():
+    """Commit queued writes and stop the writer thread"""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+def _timestamp(moment=None):
+    # Same format and UTC clock as SQLite's CURRENT_TIMESTAMP, so old and new rows compare correctly
+    return (moment or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _require_writer():
+    # Initializing here would silently write to the default path with default batching
+    if _writer is None:
+        raise RuntimeError("Database is not initialized, call init_db() first")
+
 def save_json_response(json_data):
     """
-    Save JSON response to SQLite database
+    Queue a JSON response for the next database batch
     Args:
         json_data: Parsed JSON data to save
+    Raises:
+        RuntimeError: If init_db has not been called
+    """
+    _require_writer()
+    _writer.execute('INSERT INTO llm_responses (response_data, timestamp) VALUES (?, ?)',
+                    [json.dumps(json_data), _timestamp()])
+
+def save_detection(record):
     """
+    Queue a validated LLM answer for the next database batch
+    Args:
+        record: Validated response with found_people and description_of_people
+    Raises:
+        RuntimeError: If init_db has not been called
+    """
+    _require_writer()
+    descriptions = record.get('description_of_people') or []
+    _writer.execute('INSERT INTO detections (timestamp, found_people, people_count, description_of_people) '
+                    'VALUES (?, ?, ?, ?)',
+                    [_timestamp(), bool(record['found_people']), len(descriptions), json.dumps(descriptions)])
+
+def _time_range(start, end):
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('timestamp >= ?')
+        params.append(_timestamp(start))
+    if end is not None:
+        conditions.append('timestamp < ?')
+        params.append(_timestamp(end))
+    return conditions, params
+
+def _read(sql, params, db_path):
+    conn = sqlite3.connect(db_path or (_writer.db_path if _writer else DB_PATH))
     try:
-        conn = sqlite3.connect('halloween_responses.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO llm_responses (response_data) VALUES (?)',
-                 [json.dumps(json_data)])
-        conn.commit()
+        return conn.execute(sql, params).fetchall()
+    finally:
         conn.close()
-        logger.info("Successfully saved JSON response to database")
-    except Exception as e:
-        logger.error(f"Error saving to database: {str(e)}")
-        raise
+
+def query_detections(start=None, end=None, found_people=None, limit=100, db_path=None):
+    """
+    Detections in a time range, newest first
+
+    Args:
+        start: datetime, only detections at or after this time (naive means local time)
+        end: datetime, only detections before this time (naive means local time)
+        found_people: If set, only detections with this found_people value
+        limit: Maximum number of rows
+    Returns:
+        list: {"id", "timestamp", "found_people", "people_count", "description_of_people"} dicts
+    """
+    conditions, params = _time_range(start, end)
+    if found_people is not None:
+        conditions.append('found_people = ?')
+        params.append(bool(found_people))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = _read(f'SELECT id, timestamp, found_people, people_count, description_of_people FROM detections {where} '
+                 'ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit], db_path)
+    return [{"id": row[0], "timestamp": row[1], "found_people": bool(row[2]), "people_count": row[3],
+             "description_of_people": json.loads(row[4])} for row in rows]
+
+def query_recent(start=None, end=None, limit=100, db_path=None):
+    """
+    Raw JSON responses from the llm_responses table in a time range, newest first
+
+    Args:
+        start: datetime, only responses at or after this time (naive means local time)
+        end: datetime, only responses before this time (naive means local time)
+        limit: Maximum number of rows
+    Returns:
+        list: {"id", "timestamp", "response_data"} dicts with the JSON already parsed
+    """
+    conditions, params = _time_range(start, end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = _read(f'SELECT id, timestamp, response_data FROM llm_responses {where} '
+                 'ORDER BY timestamp DESC, id DESC LIMIT ?', params + [limit], db_path)
+    return [{"id": row[0], "timestamp": row[1], "response_data": json.loads(row[2])} for row in rows]
@@ -0,0 +1,198 @@
+import math
+import time
+import logging
+import threading
+import cv2
+import numpy as np
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+TIERS = ("negative", "uncertain", "positive")
+
+
+def _logit(p):
+    p = min(max(p, 1e-6), 1 - 1e-6)
+    return math.log(p / (1 - p))
+
+
+class PersonDetector:
+    """
+    Cheap CPU person detector that runs before the vision LLM.
+
+    Each frame gets a person confidence and one of three tiers:
+        negative: confidence below `negative_threshold`, the LLM is skipped
+        uncertain: in between, the LLM decides
+        positive: at or above `positive_threshold`, the LLM still runs; the tier is
+            reported with the result and its LLM hit rate is tracked in `metrics`
+
+    Methods:
+        hog: OpenCV's HOG + linear SVM people detector, no model files needed.
+            The SVM margin of the best window is mapped to a confidence with a
+            logistic function, so a margin of 0 (the SVM boundary) is 0.5.
+            The HOG window is 64x128 pixels at `process_width`; people smaller
+            than that are not found, so lower thresholds are safer for far views.
+            OpenCV 5 removed HOGDescriptor; there the dnn method is used instead
+            if a dnn model is configured.
+        dnn: An OpenCV DNN SSD detector (e.g. MobileNet-SSD Caffe) given by
+            dnn.model / dnn.config; its person score is used as is.
+        yolo: An ultralytics YOLO model (COCO weights such as yolov8n.pt) run on
+            the CPU at `process_width`; its person score is used as is.
+    """
+
+    def __init__(self, method="hog", negative_threshold=0.3, positive_threshold=0.8, process_width=640,
+                 dnn_model=None, dnn_config=None, dnn_input_size=300, dnn_scale=1 / 127.5,
+                 dnn_mean=127.5, dnn_swap_rb=False, dnn_person_class_id=15,
+                 yolo_model="yolov8n.pt", yolo_person_class_id=0):
+        if method not in ("hog", "dnn", "yolo"):
+            raise ValueError(f"Unsupported person detector method: {method}")
+        if not 0 <= negative_threshold <= positive_threshold <= 1:
+            raise ValueError("Thresholds must satisfy 0 <= negative_threshold <= positive_threshold <= 1")
+        if method == "hog" and not hasattr(cv2, "HOGDescriptor"):
+            if not dnn_model:
+                raise ValueError("This OpenCV build has no HOGDescriptor (removed in OpenCV 5), "
+                                 "set person_detector.dnn.model or use the yolo method")
+            logger.warning("This OpenCV build has no HOGDescriptor (removed in OpenCV 5), "
+                           "using the dnn person detector instead")
+            method = "dnn"
+        self.method = method
+        self.negative_threshold = negative_threshold
+        self.positive_threshold = positive_threshold
+        self.process_width = process_width
+        self.dnn_input_size = dnn_input_size
+        self.dnn_scale = dnn_scale
+        self.dnn_mean = dnn_mean
+        self.dnn_swap_rb = dnn_swap_rb
+        self.dnn_person_class_id = dnn_person_class_id
+        self.yolo_person_class_id = yolo_person_class_id
+        # None of the backends is documented as thread-safe
+        self._lock = threading.Lock()
+
+        if method == "dnn":
+            if not dnn_model:
+                raise ValueError("person_detector.dnn.model is required for the dnn method")
+            self._net = cv2.dnn.readNet(dnn_model, dnn_config) if dnn_config else cv2.dnn.readNet(dnn_model)
+        elif method == "yolo":
+            from ultralytics import YOLO
+            self._yolo = YOLO(yolo_model)
+        else:
+            self._hog = cv2.HOGDescriptor()
+            self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+        self._stats = {tier: {"frames": 0, "llm_calls": 0, "llm_found_people": 0} for tier in TIERS}
+        self._detect_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, detector_settings):
+        """Build a detector from the `person_detector` section of settings.yaml"""
+        dnn = detector_settings.get('dnn') or {}
+        yolo = detector_settings.get('yolo') or {}
+        return cls(
+            method=detector_settings.method,
+            negative_threshold=detector_settings.negative_threshold,
+            positive_threshold=detector_settings.positive_threshold,
+            process_width=detector_settings.process_width,
+            dnn_model=dnn.get('model'),
+            dnn_config=dnn.get('config'),
+            dnn_input_size=dnn.get('input_size', 300),
+            dnn_scale=dnn.get('scale', 1 / 127.5),
+            dnn_mean=dnn.get('mean', 127.5),
+            dnn_swap_rb=dnn.get('swap_rb', False),
+            dnn_person_class_id=dnn.get('person_class_id', 15),
+            yolo_model=yolo.get('model', "yolov8n.pt"),
+            yolo_person_class_id=yolo.get('person_class_id', 0),
+        )
+
+    def _detect_hog(self, image_np):
+        h, w = image_np.shape[:2]
+        scale = min(1.0, self.process_width / w)
+        small = cv2.resize(image_np, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        if small.shape[0] < 128 or small.shape[1] < 64:
+            return None  # smaller than one HOG window, cannot rule anything out
+        # Ask for every window above the negative threshold, not only above the SVM boundary
+        rects, weights = self._hog.detectMultiScale(small, hitThreshold=_logit(self.negative_threshold),
+                                                    winStride=(8, 8), padding=(8, 8), scale=1.1)
+        weights = np.asarray(weights).reshape(-1)
+        return [([int(x / scale), int(y / scale), int(bw / scale), int(bh / scale)], 1 / (1 + math.exp(-float(weight))))
+                for (x, y, bw, bh), weight in zip(rects, weights)]
+
+    def _detect_dnn(self, image_np):
+        h, w = image_np.shape[:2]
+        blob = cv2.dnn.blobFromImage(image_np, self.dnn_scale, (self.dnn_input_size, self.dnn_input_size),
+                                     self.dnn_mean, swapRB=self.dnn_swap_rb)
+        self._net.setInput(blob)
+        output = self._net.forward().reshape(-1, 7)  # [image_id, class_id, score, x1, y1, x2, y2]
+        detections = []
+        for _, class_id, score, x1, y1, x2, y2 in output:
+            if int(class_id) != self.dnn_person_class_id or score < self.negative_threshold:
+                continue
+            x1, x2 = int(np.clip(x1, 0, 1) * w), int(np.clip(x2, 0, 1) * w)
+            y1, y2 = int(np.clip(y1, 0, 1) * h), int(np.clip(y2, 0, 1) * h)
+            detections.append(([x1, y1, x2 - x1, y2 - y1], float(score)))
+        return detections
+
+    def _detect_yolo(self, image_np):
+        result = self._yolo.predict(image_np, classes=[self.yolo_person_class_id], conf=self.negative_threshold,
+                                    imgsz=self.process_width, device="cpu", verbose=False)[0]
+        boxes = result.boxes.xyxy.cpu().numpy()
+        scores = result.boxes.conf.cpu().numpy()
+        return [([int(x1), int(y1), int(x2 - x1), int(y2 - y1)], float(score))
+                for (x1, y1, x2, y2), score in zip(boxes, scores)]
+
+    def tier(self, confidence):
+        if confidence < self.negative_threshold:
+            return "negative"
+        if confidence >= self.positive_threshold:
+            return "positive"
+        return "uncertain"
+
+    def detect(self, image_np):
+        """
+        Detect people in a frame
+
+        Args:
+            image_np: BGR numpy array image
+        Returns:
+            dict: {"tier": str, "confidence": float, "boxes": [[x, y, w, h], ...], "seconds": float}
+                with boxes in the coordinates of the input frame; confidence is None (and the
+                tier uncertain) for frames too small to scan
+        """
+        with self._lock:
+            start = time.perf_counter()
+            detections = getattr(self, f"_detect_{self.method}")(image_np)
+            seconds = time.perf_counter() - start
+            if detections is None:
+                detections, confidence, tier = [], None, "uncertain"
+            else:
+                confidence = max((score for _, score in detections), default=0.0)
+                tier = self.tier(confidence)
+            self._stats[tier]["frames"] += 1
+            self._detect_seconds += seconds
+        logger.debug(f"Person detector: {tier} (confidence {confidence}, {len(detections)} boxes, {seconds * 1000:.1f} ms)")
+        return {"tier": tier, "confidence": confidence, "boxes": [box for box, _ in detections], "seconds": seconds}
+
+    def record_llm_result(self, tier, found_people):
+        """Record the LLM's verdict on a frame escalated from `tier`, for the per-tier hit rates"""
+        self._stats[tier]["llm_calls"] += 1
+        if found_people:
+            self._stats[tier]["llm_found_people"] += 1
+
+    def metrics(self):
+        """
+        Per-tier frame share and LLM hit rate (fraction of escalated frames where the LLM found people)
+        """
+        total = sum(tier["frames"] for tier in self._stats.values())
+        tiers = {}
+        for name, tier in self._stats.items():
+            tiers[name] = {
+                **tier,
+                "frame_share": tier["frames"] / total if total else 0.0,
+                "llm_hit_rate": tier["llm_found_people"] / tier["llm_calls"] if tier["llm_calls"] else None,
+            }
+        return {
+            "method": self.method,
+            "frames": total,
+            "llm_skip_rate": self._stats["negative"]["frames"] / total if total else 0.0,
+            "avg_detect_ms": self._detect_seconds / total * 1000 if total else None,
+            "tiers": tiers,
+        }
@@ -0,0 +1,162 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+
+class DispatcherRejected(Exception):
+    """Base class for frames the dispatcher did not send to the LLM"""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class FrameSuperseded(DispatcherRejected):
+    """A newer frame replaced this one while it was waiting for the LLM"""
+    pass
+
+class DispatcherOverloaded(DispatcherRejected):
+    """No LLM slot became free in time, or the dispatcher does not queue frames"""
+    pass
+
+
+class LLMDispatcher:
+    """
+    Admission control in front of the vision LLM.
+
+    At most `max_in_flight` calls run at once, on a dedicated thread pool.
+    Frames arriving while all slots are busy wait in a queue of at most
+    `max_pending` entries; when the queue is full the oldest waiting frame is
+    dropped (latest frame wins), since only the current state of the porch is
+    interesting. A slot stays occupied until the LLM call actually returns,
+    even if the caller gave up on it after `timeout_seconds`, so a slow model
+    is never sent more work than it can handle.
+
+    All state is owned by the event loop thread; worker threads only run `fn`.
+    """
+
+    def __init__(self, fn, max_in_flight=1, max_pending=1, timeout_seconds=30,
+                 queue_timeout_seconds=30, retry_after_seconds=2):
+        self.fn = fn
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm-dispatch")
+        self._in_flight = 0
+        self._pending = deque()  # asyncio futures of waiting frames, oldest first
+        self._avg_latency = None
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "superseded": 0,
+            "rejected": 0,
+        }
+
+    @classmethod
+    def from_settings(cls, fn, llm_settings):
+        """Build a dispatcher from the `llm` section of settings.yaml"""
+        dispatcher_settings = llm_settings.dispatcher
+        return cls(
+            fn,
+            max_in_flight=dispatcher_settings.max_in_flight,
+            max_pending=dispatcher_settings.max_pending,
+            timeout_seconds=llm_settings.timeout_seconds,
+            queue_timeout_seconds=dispatcher_settings.queue_timeout_seconds,
+            retry_after_seconds=dispatcher_settings.retry_after_seconds,
+        )
+
+    def retry_after(self):
+        """Seconds a client should wait before sending the next frame"""
+        if self._avg_latency is None:
+            return self.retry_after_seconds
+        return max(1, math.ceil(self._avg_latency))
+
+    async def submit(self, *args):
+        """
+        Run fn(*args) on the LLM thread pool once a slot is free
+
+        Returns:
+            The return value of fn
+        Raises:
+            FrameSuperseded: A newer frame took this frame's place in the queue
+            DispatcherOverloaded: The queue is disabled or no slot freed up in time
+            asyncio.TimeoutError: fn did not return within timeout_seconds
+        """
+        self._counters["submitted"] += 1
+        if self._in_flight < self.max_in_flight:
+            self._in_flight += 1
+        else:
+            await self._wait_for_slot()
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = self._executor.submit(self.fn, *args)
+        # Free the slot when the call really finishes, not when the caller stops waiting
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f, start))
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            raise
+
+    async def _wait_for_slot(self):
+        if self.max_pending <= 0:
+            self._counters["rejected"] += 1
+            raise DispatcherOverloaded("All LLM slots are busy", self.retry_after())
+        if len(self._pending) >= self.max_pending:
+            stale = self._pending.popleft()
+            self._counters["superseded"] += 1
+            stale.set_exception(FrameSuperseded("Superseded by a newer frame", self.retry_after()))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending.append(waiter)
+        try:
+            # _release hands its slot over by resolving the waiter
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            if waiter in self._pending:
+                self._pending.remove(waiter)
+                self._counters["rejected"] += 1
+                raise DispatcherOverloaded("Timed out waiting for a free LLM slot", self.retry_after())
+            waiter.result()  # resolved at the same moment: either we own a slot or this raises
+        except asyncio.CancelledError:
+            if waiter in self._pending:
+                self._pending.remove(waiter)
+            elif waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self._release(None, None)  # the slot was already handed to us, pass it on
+            raise
+
+    def _release(self, future, start):
+        if future is not None:
+            latency = time.perf_counter() - start
+            self._avg_latency = latency if self._avg_latency is None else 0.8 * self._avg_latency + 0.2 * latency
+            self._counters["failed" if future.exception() else "completed"] += 1
+        if self._pending:
+            self._pending.popleft().set_result(None)
+        else:
+            self._in_flight -= 1
+
+    def metrics(self):
+        """Queue depth, in-flight calls, outcome counters and drop rate"""
+        submitted = self._counters["submitted"]
+        dropped = self._counters["superseded"] + self._counters["rejected"]
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": len(self._pending),
+            "max_pending": self.max_pending,
+            **self._counters,
+            "drop_rate": dropped / submitted if submitted else 0.0,
+            "avg_latency_seconds": self._avg_latency,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,320 @@
+"""
+Offline load test for the FastAPI service.
+
+Starts main.app in-process with the vision LLM replaced by a stub with a
+configurable latency, replays recorded frames (or synthetic ones) at a fixed
+request rate, and reports latency percentiles, throughput, drop rate and peak
+memory. Every settings variant runs in a fresh process, because main.py and
+core.py read their settings at import time; variants are given as dotted
+setting overrides and applied through Dynaconf environment variables.
+
+Storage and database paths always point to a temporary directory, so the
+tracked database and processed_images are never touched.
+
+Usage:
+    python load_test.py --frames recorded_frames --rate 5 --duration 30 --llm-latency 1.5
+    python load_test.py --synthetic 50 --variants load_test_variants.yaml --output results.json
+
+A variants file is a YAML (or JSON) list such as:
+    - name: baseline
+      settings: {}
+    - name: no-motion-gate
+      settings:
+        motion.enabled: false
+    - name: unbatched-db
+      settings:
+        database.batch_size: 1
+"""
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+import yaml
+
+DEFAULT_VARIANTS = [{"name": "baseline", "settings": {}}]
+
+
+class StubLLM:
+    """
+    Stand-in for the vision LLM: sleeps like a model would and answers with schema-valid JSON
+    """
+
+    def __init__(self, latency=1.0, jitter=0.0, people_rate=0.1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.people_rate = people_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def invoke(self, message):
+        self.calls += 1
+        time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        found = self._random.random() < self.people_rate
+        content = json.dumps({"found_people": found, "description_of_people": ["person in costume"] if found else []})
+        return type("StubResponse", (), {"content": content})()
+
+
+def load_frames(frames_dir=None, synthetic=0, size=(640, 480), seed=0):
+    """
+    Recorded frames as base64 strings, the way the browser posts them
+
+    Args:
+        frames_dir: Directory of .jpg/.jpeg/.png frames, replayed in name order
+        synthetic: If no directory is given, number of generated frames: a static
+            porch with a figure walking across it
+    Returns:
+        list: base64 encoded images
+    """
+    import base64
+    import cv2
+
+    if frames_dir:
+        names = sorted(f for f in os.listdir(frames_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+        frames = []
+        for name in names:
+            with open(os.path.join(frames_dir, name), 'rb') as f:
+                frames.append(base64.b64encode(f.read()).decode('utf-8'))
+        if not frames:
+            raise ValueError(f"No frames in {frames_dir}")
+        return frames
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (21, 21), 0)
+    frames = []
+    for i in range(synthetic):
+        image = background.copy()
+        x = int((i / max(synthetic - 1, 1)) * (width - 80))
+        cv2.rectangle(image, (x, height // 3), (x + 60, height // 3 + 180), (220, 220, 220), -1)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        frames.append(base64.b64encode(encoded.tobytes()).decode('utf-8'))
+    return frames
+
+
+def settings_env(overrides):
+    """
+    Dynaconf environment variables for dotted setting overrides, e.g. {"motion.enabled": False}
+    """
+    env = {}
+    for key, value in overrides.items():
+        name = "DYNACONF_" + "__".join(part.upper() for part in key.split("."))
+        env[name] = value if isinstance(value, str) else f"@json {json.dumps(value)}"
+    return env
+
+
+def summarize(latencies, statuses, wall_seconds, extra):
+    ok = [lat for lat, status in zip(latencies, statuses) if status == 200]
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    dropped = counts.get("429", 0) + counts.get("503", 0)
+    p50, p95, p99 = (np.percentile(ok, [50, 95, 99]) * 1000).tolist() if ok else (None, None, None)
+    return {
+        "requests": len(statuses),
+        "status_counts": counts,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_ms": max(ok) * 1000 if ok else None,
+        "throughput_rps": len(ok) / wall_seconds if wall_seconds else 0.0,
+        "drop_rate": dropped / len(statuses) if statuses else 0.0,
+        "error_rate": sum(1 for s in statuses if s not in (200, 429, 503)) / len(statuses) if statuses else 0.0,
+        "wall_seconds": wall_seconds,
+        **extra,
+    }
+
+
+async def replay(app, frames, rate, duration):
+    """
+    Post frames at a fixed rate (open loop: a slow response does not delay the next request)
+
+    Returns:
+        tuple: (latencies in seconds, status codes, response bodies, wall seconds)
+    """
+    import httpx
+
+    total = max(1, int(rate * duration))
+    latencies, statuses, bodies = [None] * total, [None] * total, [None] * total
+
+    async def post(client, i):
+        start = time.perf_counter()
+        response = await client.post("/process_image", data={"image": frames[i % len(frames)]})
+        latencies[i] = time.perf_counter() - start
+        statuses[i] = response.status_code
+        bodies[i] = response.json() if response.status_code == 200 else None
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(post(client, i)))
+        await asyncio.gather(*tasks)
+        wall_seconds = time.perf_counter() - start
+    return latencies, statuses, bodies, wall_seconds
+
+
+def run_variant(variant, options):
+    """
+    Run one settings variant; meant to be called in a fresh process
+
+    Returns:
+        dict: Summary with latency percentiles, throughput, drop rate and memory
+    """
+    with tempfile.TemporaryDirectory(prefix="halloween-load-") as work_dir:
+        overrides = {
+            "image.storage.dir": os.path.join(work_dir, "processed_images"),
+            "database.path": os.path.join(work_dir, "load_test.db"),
+            "image.preprocess.adaptive.calibration_file": os.path.join(work_dir, "calibration.json"),
+            **variant.get("settings", {}),
+        }
+        os.environ.update(settings_env(overrides))
+
+        rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        import core
+        import main
+        from database import close_db
+
+        stub = StubLLM(options["llm_latency"], options["llm_jitter"], options["people_rate"])
+        core.llm = stub
+        frames = load_frames(options.get("frames"), options.get("synthetic", 0))
+
+        latencies, statuses, bodies, wall_seconds = asyncio.run(
+            replay(main.app, frames, options["rate"], options["duration"]))
+        close_db()
+
+        ok_bodies = [body for body in bodies if body is not None]
+        extra = {
+            "name": variant["name"],
+            "settings": variant.get("settings", {}),
+            "llm_calls": stub.calls,
+            "skipped_no_change": sum(1 for body in ok_bodies if body.get("no_change")),
+            "skipped_no_people": sum(1 for body in ok_bodies
+                                     if (body.get("person_detector") or {}).get("tier") == "negative"),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024,
+            "dispatcher": main.llm_dispatcher.metrics(),
+        }
+        return summarize(latencies, statuses, wall_seconds, extra)
+
+
+def _variant_worker(variant, options, results):
+    # Keep the app's log lines out of the report
+    import logging
+    logging.disable(logging.INFO)
+    try:
+        results.put(run_variant(variant, options))
+    except Exception as e:
+        results.put({"name": variant["name"], "error": f"{type(e).__name__}: {str(e)}"})
+
+
+def run_all(variants, options):
+    """
+    Run every variant in its own process, one after another
+
+    A variant whose process dies without a result (killed, crashed in native
+    code) or runs longer than `duration + timeout` seconds is reported with
+    an error instead of blocking the remaining variants.
+
+    Returns:
+        list: One summary per variant
+    """
+    context = multiprocessing.get_context("spawn")
+    limit = options["duration"] + options.get("timeout", 120)
+    summaries = []
+    for variant in variants:
+        results = context.Queue()
+        process = context.Process(target=_variant_worker, args=(variant, options, results))
+        process.start()
+        deadline = time.monotonic() + limit
+        summary = None
+        while summary is None:
+            try:
+                summary = results.get(timeout=1)
+            except queue.Empty:
+                alive = process.is_alive()
+                if alive and time.monotonic() <= deadline:
+                    continue
+                if alive:
+                    process.terminate()
+                process.join()
+                try:
+                    # The result may have been put between the timeout above and the liveness check
+                    summary = results.get_nowait()
+                except queue.Empty:
+                    summary = {"name": variant["name"],
+                               "error": f"Variant did not finish within {limit:.0f} s" if alive else
+                                        f"Variant process exited with code {process.exitcode} without a result"}
+        process.join()
+        summaries.append(summary)
+    return summaries
+
+
+def format_table(summaries):
+    columns = ["name", "requests", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "drop_rate", "llm_calls", "peak_rss_mb"]
+    lines = ["  ".join(f"{column:>14}" for column in columns)]
+    for summary in summaries:
+        if "error" in summary:
+            lines.append(f"{summary['name']:>14}  error: {summary['error']}")
+            continue
+        cells = []
+        for column in columns:
+            value = summary.get(column)
+            cells.append(f"{value:>14.2f}" if isinstance(value, float) else f"{str(value):>14}")
+        lines.append("  ".join(cells))
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay frames against the halloween agent with a stubbed LLM")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--frames", help="Directory of recorded frames to replay")
+    source.add_argument("--synthetic", type=int, default=30, help="Number of generated frames if --frames is not given")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of traffic per variant")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mean stub LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Uniform +/- jitter on the stub latency")
+    parser.add_argument("--people-rate", type=float, default=0.1, help="Fraction of stub answers with people")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="Seconds a variant may take beyond --duration before it is reported as failed")
+    parser.add_argument("--variants", help="YAML/JSON list of {name, settings} variants")
+    parser.add_argument("--output", help="Write the summaries to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    variants = DEFAULT_VARIANTS
+    if args.variants:
+        with open(args.variants) as f:
+            variants = yaml.safe_load(f)
+    options = {
+        "frames": args.frames,
+        "synthetic": args.synthetic,
+        "rate": args.rate,
+        "duration": args.duration,
+        "llm_latency": args.llm_latency,
+        "llm_jitter": args.llm_jitter,
+        "people_rate": args.people_rate,
+        "timeout": args.timeout,
+    }
+    summaries = run_all(variants, options)
+    print(format_table(summaries))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summaries, f, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
-from fastapi import FastAPI, Request, HTTPException, Form
+from fastapi import FastAPI, Request, HTTPException, Form, WebSocket, WebSocketDisconnect
+from datetime import datetime
+from typing import Optional
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import logging
 import asyncio
-import base64
-from PIL import Image
-import io
 import json
-from core import summarize_image, ImageProcessingError, LLMProcessingError
+from core import summarize_image, response_parser, FrameImage, ImageProcessingError, LLMProcessingError
+from response_parser import ResponseValidationError
 from dynaconf import Dynaconf
-from database import init_db, save_json_response
+from database import init_db, close_db, save_detection, query_detections
+from motion import MotionGate
+from detector import PersonDetector
+from dispatcher import LLMDispatcher, FrameSuperseded, DispatcherOverloaded
+from stream import LatestFrameSlot, BytesDecoder, CaptureReader
 
 # Initialize settings
 settings = Dynaconf(
@@ -21,7 +25,25 @@ settings = Dynaconf(
 logger = logging.getLogger(__name__)
 
 # Initialize database on startup
-init_db()
+init_db(settings.database.path,
+        batch_size=settings.database.batch_size,
+        flush_interval_seconds=settings.database.flush_interval_seconds)
+
+# Motion pre-filter: frames with no change skip the LLM
+motion_gate = MotionGate.from_settings(settings.motion) if settings.motion.enabled else None
+last_llm_response = None
+
+# Cheap person detector: frames it rules out never reach the LLM
+person_detector = None
+if settings.person_detector.enabled:
+    try:
+        person_detector = PersonDetector.from_settings(settings.person_detector)
+    except Exception as e:
+        # The detector only saves LLM calls; run without it rather than not at all
+        logger.error(f"Person detector disabled: {str(e)}")
+
+# Bounded, latest-frame-wins access to the LLM
+llm_dispatcher = LLMDispatcher.from_settings(summarize_image, settings.llm)
 
 app = FastAPI()
 # Change the static files mount point to /static instead of root
@@ -30,37 +52,28 @@ app.mount("/static", StaticFiles(directory="templates"), name="static")
 # Add templates directory for serving HTML files
 templates = Jinja2Templates(directory="templates")
 
-def validate_base64_image(base64_str: str) -> bool:
+def validate_image(frame: FrameImage) -> bool:
     """
-    Validate if the string is a proper base64 encoded image
+    Validate size, dimensions and format of a decoded request image.
+    Only the image header is parsed; pixel data is not decoded.
     Returns True if valid, False otherwise
     """
     try:
-        # Remove header if present
-        if ';base64,' in base64_str:
-            base64_str = base64_str.split(';base64,')[1]
-        
-        # Try to decode base64
-        image_data = base64.b64decode(base64_str)
-        
-        # Try to open as image
-        img = Image.open(io.BytesIO(image_data))
-        
         # Check if image is too large
         max_size = settings.image.max_size_mb * 1024 * 1024  # Convert MB to bytes
-        if len(image_data) > max_size:
+        if len(frame.data) > max_size:
             logger.error("Image size too large")
             return False
             
         # Validate image dimensions
-        width, height = img.size
+        width, height = frame.size
         if width > settings.image.max_width or height > settings.image.max_height:
             logger.error(f"Image dimensions too large: {width}x{height}")
             return False
             
         # Check if image format is supported
-        if img.format.lower() not in settings.image.supported_formats:
-            logger.error(f"Unsupported image format: {img.format}")
+        if frame.format not in settings.image.supported_formats:
+            logger.error(f"Unsupported image format: {frame.format}")
             return False
             
         return True
@@ -74,6 +87,130 @@ async def read_root(request: Request):
     logger.info("Serving root endpoint")
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.on_event("shutdown")
+def shutdown():
+    # Commit detections still waiting in the writer queue
+    close_db()
+
+@app.get("/detections")
+async def detections(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     found_people: Optional[bool] = None, limit: int = 100):
+    """
+    Stored detections in a time range, newest first
+    """
+    return query_detections(start, end, found_people, limit)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    LLM dispatcher queue depth, outcome counters and drop rate, and person detector tier rates
+    """
+    metrics = llm_dispatcher.metrics()
+    if person_detector is not None:
+        metrics["person_detector"] = person_detector.metrics()
+    return metrics
+
+def error_response(e):
+    """
+    Map an exception raised while analyzing a frame to an HTTP status
+    Returns:
+        tuple: (status_code, detail, headers)
+    """
+    if isinstance(e, HTTPException):
+        return e.status_code, e.detail, e.headers
+    if isinstance(e, FrameSuperseded):
+        logger.info("Frame superseded by a newer frame while waiting for the LLM")
+        return 429, str(e), {"Retry-After": str(e.retry_after)}
+    if isinstance(e, DispatcherOverloaded):
+        logger.warning(f"LLM dispatcher overloaded: {str(e)}")
+        return 503, str(e), {"Retry-After": str(e.retry_after)}
+    if isinstance(e, asyncio.TimeoutError):
+        logger.error("LLM processing timeout")
+        return 504, "Processing timeout", None
+    if isinstance(e, ImageProcessingError):
+        error_msg = f"Image processing error: {str(e)}"
+    elif isinstance(e, LLMProcessingError):
+        error_msg = f"LLM processing error: {str(e)}"
+    else:
+        error_msg = f"Unexpected error: {str(e)}"
+    logger.error(error_msg)
+    return (400 if isinstance(e, ImageProcessingError) else 500), error_msg, None
+
+async def analyze_frame(frame: FrameImage):
+    """
+    Validate a frame, skip it if nothing moved, otherwise run the LLM and store the result
+    Returns:
+        dict: Response sent back to the client
+    """
+    global last_llm_response
+
+    # Validate image format and size
+    if not validate_image(frame):
+        raise HTTPException(status_code=400, detail="Invalid image format or size")
+
+    # Skip the LLM when the scene has not changed since the last analysis
+    motion = None
+    if motion_gate is not None:
+        motion = motion_gate.update(frame.array)
+        if not motion["has_motion"] and last_llm_response is not None:
+            logger.info(f"No motion detected (score {motion['motion_score']:.4f}), skipping LLM")
+            return {
+                "llm_response": "no change",
+                "no_change": True,
+                "motion_score": motion["motion_score"],
+                "motion_regions": motion["regions"],
+                "last_llm_response": last_llm_response
+            }
+
+    # Tier 1: cheap person detector, off the event loop
+    people = None
+    if person_detector is not None:
+        people = await asyncio.get_running_loop().run_in_executor(None, person_detector.detect, frame.array)
+        if people["tier"] == "negative":
+            logger.info(f"Person detector found nobody (confidence {people['confidence']:.2f}), skipping LLM")
+            detection = {"found_people": False, "description_of_people": []}
+            # This is now the latest answer: later no-motion frames must not repeat an older LLM answer
+            last_llm_response = json.dumps(detection)
+            response = {
+                "llm_response": "no people detected",
+                "detection": detection,
+                "no_change": False,
+                "person_detector": people
+            }
+            if motion is not None:
+                response["motion_score"] = motion["motion_score"]
+                response["motion_regions"] = motion["regions"]
+            return response
+
+    # Tier 2: run LLM analysis through the dispatcher, which limits concurrent calls
+    logger.info("Getting LLM analysis")
+    llm_response = await llm_dispatcher.submit(frame)
+    last_llm_response = llm_response
+
+    # Validate the structured answer and store it as a typed detection
+    detection = None
+    try:
+        detection = response_parser.parse(llm_response)
+        save_detection(detection)
+        if people is not None:
+            person_detector.record_llm_result(people["tier"], detection["found_people"])
+        logger.info("Successfully parsed and saved detection")
+    except json.JSONDecodeError as e:
+        logger.warning(f"Failed to parse JSON from response: {str(e)}")
+    except ResponseValidationError as e:
+        logger.warning(f"LLM response does not match the schema: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error processing JSON response: {str(e)}")
+
+    logger.info("Successfully processed image and generated response")
+    response = {"llm_response": llm_response, "detection": detection, "no_change": False}
+    if people is not None:
+        response["person_detector"] = people
+    if motion is not None:
+        response["motion_score"] = motion["motion_score"]
+        response["motion_regions"] = motion["regions"]
+    return response
+
 @app.post("/process_image")
 async def process_image(request: Request):
     """
@@ -88,57 +225,92 @@ async def process_image(request: Request):
             logger.warning("No image data received in request")
             raise HTTPException(status_code=400, detail="No image data provided")
 
-        # Validate image format and size
-        if not validate_base64_image(image):
-            raise HTTPException(status_code=400, detail="Invalid image format or size")
+        # Decode once; the same frame is used for validation, motion, storage and the prompt
+        frame = FrameImage.from_base64(image)
+        return await analyze_frame(frame)
 
-        encoded_image = image
-        
-        # Run LLM analysis in a separate thread with timeout
-        logger.info("Getting LLM analysis")
-        loop = asyncio.get_event_loop()
-        try:
-            llm_response = await asyncio.wait_for(
-                loop.run_in_executor(None, summarize_image, encoded_image),
-                timeout=settings.llm.timeout_seconds
-            )
-        except asyncio.TimeoutError:
-            logger.error("LLM processing timeout")
-            raise HTTPException(status_code=504, detail="Processing timeout")
-        
-        # Check if response contains JSON
-        if '```json' in llm_response:
+    except Exception as e:
+        status_code, detail, headers = error_response(e)
+        raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+@app.websocket("/ws/stream")
+async def stream_frames(websocket: WebSocket, fps: Optional[float] = None):
+    """
+    Analyze a continuous stream of frames.
+
+    The client either sends encoded images (JPEG/PNG bytes) as binary messages,
+    or a single text message {"source": "<rtsp/http url or video file>", "fps": 1}
+    to have the server read the stream itself. Frames are decoded on a separate
+    thread and sampled at `fps`; while the LLM is busy only the newest frame is
+    kept. Each result is sent back as a JSON message, with "error" and "status"
+    set when a frame could not be analyzed.
+    """
+    await websocket.accept()
+    fps = fps if fps is not None else settings.stream.fps
+    slot = LatestFrameSlot(asyncio.get_running_loop())
+    decoder = BytesDecoder(slot, fps)
+    decoder.start()
+    reader = None
+    logger.info(f"Stream connected, sampling at {fps} fps")
+
+    async def receive():
+        nonlocal reader
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                decoder.push(message["bytes"])
+                continue
+            try:
+                source = json.loads(message.get("text") or "{}").get("source")
+            except (json.JSONDecodeError, AttributeError):
+                source = None
+            if not source:
+                await websocket.send_json({"error": "Expected binary frames or {\"source\": ...}", "status": 400})
+            elif not settings.stream.allow_sources:
+                await websocket.send_json({"error": "Server-side sources are disabled", "status": 403})
+            elif reader is not None:
+                await websocket.send_json({"error": "Stream source already set", "status": 409})
+            else:
+                logger.info(f"Reading stream source {source}")
+                reader = CaptureReader(source, slot, fps, jpeg_quality=settings.stream.jpeg_quality)
+                reader.start()
+
+    async def analyze():
+        frame_index = 0
+        while True:
+            try:
+                frame = await slot.get()
+            except ImageProcessingError as e:
+                await websocket.send_json({"error": str(e), "status": 400, "end_of_stream": True})
+                return
+            if frame is None:
+                await websocket.send_json({"end_of_stream": True, "frames_received": slot.received})
+                return
+            frame_index += 1
             try:
-                # Extract JSON content between ```json and ```
-                json_start = llm_response.find('```json') + 7
-                json_end = llm_response.find('```', json_start)
-                json_str = llm_response[json_start:json_end].strip()
-                
-                # Try to parse JSON
-                json_data = json.loads(json_str)
-                
-                # Save to database if parsing successful
-                save_json_response(json_data)
-                logger.info("Successfully parsed and saved JSON response")
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse JSON from response: {str(e)}")
+                result = await analyze_frame(frame)
             except Exception as e:
-                logger.error(f"Error processing JSON response: {str(e)}")
-        
-        logger.info("Successfully processed image and generated response")
-        return {"llm_response": llm_response}
+                status_code, detail, _ = error_response(e)
+                result = {"error": detail, "status": status_code}
+            result["frame_index"] = frame_index
+            result["dropped_frames"] = slot.dropped
+            await websocket.send_json(result)
 
-    except ImageProcessingError as e:
-        error_msg = f"Image processing error: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(status_code=400, detail=error_msg)
-    
-    except LLMProcessingError as e:
-        error_msg = f"LLM processing error: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
-    
-    except Exception as e:
-        error_msg = f"Unexpected error: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(analyze())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Stop the threads before awaiting anything, the server may cancel this handler at any await
+        decoder.stop()
+        if reader is not None:
+            reader.stop()
+        for task in tasks:
+            task.cancel()
+        logger.info(f"Stream closed after {slot.received} frames ({slot.dropped} dropped)")
+        await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
@@ -0,0 +1,101 @@
+import logging
+import cv2
+import numpy as np
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+
+class MotionGate:
+    """
+    Rolling background model used to skip the LLM when the porch has not changed.
+
+    Frames are downscaled to `process_width`, converted to grayscale and compared
+    against a background model, either a running average (cv2.accumulateWeighted)
+    or OpenCV's MOG2 subtractor. The fraction of changed pixels is the motion
+    score; frames scoring below `threshold` are considered unchanged.
+    """
+
+    def __init__(self, method="running_average", threshold=0.01, pixel_threshold=25,
+                 learning_rate=0.05, min_area=50, process_width=320):
+        if method not in ("running_average", "mog2"):
+            raise ValueError(f"Unsupported motion method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        self.min_area = min_area
+        self.process_width = process_width
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, motion_settings):
+        """Build a gate from the `motion` section of settings.yaml"""
+        return cls(
+            method=motion_settings.method,
+            threshold=motion_settings.threshold,
+            pixel_threshold=motion_settings.pixel_threshold,
+            learning_rate=motion_settings.learning_rate,
+            min_area=motion_settings.min_area,
+            process_width=motion_settings.process_width,
+        )
+
+    def reset(self):
+        self._background = None
+        self._subtractor = None
+        self._shape = None
+
+    def _prepare(self, image_np):
+        h, w = image_np.shape[:2]
+        scale = min(1.0, self.process_width / w)
+        small = cv2.resize(image_np, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0), scale
+
+    def update(self, image_np):
+        """
+        Compare a frame against the background model and update the model
+
+        Args:
+            image_np: BGR (or grayscale) numpy array image
+        Returns:
+            dict: {"has_motion": bool, "motion_score": float, "regions": [[x, y, w, h], ...]}
+                with regions in the coordinates of the input frame
+        """
+        gray, scale = self._prepare(image_np)
+
+        # First frame, or the browser changed the crop size: nothing to compare to yet
+        if self._shape != gray.shape:
+            self.reset()
+            self._shape = gray.shape
+            if self.method == "mog2":
+                self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+                self._subtractor.apply(gray, learningRate=1.0)
+            else:
+                self._background = gray.astype(np.float32)
+            logger.info("Initialized motion background model")
+            return {"has_motion": True, "motion_score": 1.0, "regions": []}
+
+        if self.method == "mog2":
+            mask = self._subtractor.apply(gray, learningRate=self.learning_rate)
+            mask = (mask > 200).astype(np.uint8)
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+            mask = (diff > self.pixel_threshold).astype(np.uint8)
+            cv2.accumulateWeighted(gray.astype(np.float32), self._background, self.learning_rate)
+
+        # Drop single-pixel noise (sensor noise, compression artifacts)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+        motion_score = float(mask.mean())
+
+        regions = []
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h / (scale * scale) >= self.min_area:
+                regions.append([int(x / scale), int(y / scale), int(w / scale), int(h / scale)])
+
+        has_motion = motion_score >= self.threshold
+        logger.debug(f"Motion score {motion_score:.4f}, {len(regions)} regions, has_motion={has_motion}")
+        return {"has_motion": has_motion, "motion_score": motion_score, "regions": regions}
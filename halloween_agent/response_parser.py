@@ -0,0 +1,161 @@
+import copy
+import json
+import logging
+from functools import lru_cache
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Field types accepted in settings.llm.response_fields
+_SCALAR_TYPES = ("boolean", "integer", "number", "string")
+
+# Fields the rest of the agent relies on: the detections table, the person detector stats
+# and calibration read them, so settings may add fields but not drop or retype these
+REQUIRED_FIELDS = {"found_people": "boolean", "description_of_people": "list[string]"}
+
+
+class ResponseValidationError(ValueError):
+    """LLM response JSON does not match the response schema"""
+    pass
+
+
+def _field_schema(type_name):
+    type_name = str(type_name).strip().lower()
+    if type_name.startswith("list[") and type_name.endswith("]"):
+        return {"type": "array", "items": _field_schema(type_name[5:-1])}
+    if type_name not in _SCALAR_TYPES:
+        raise ValueError(f"Unsupported response field type: {type_name}")
+    return {"type": type_name}
+
+
+def build_schema(fields):
+    """
+    Build a JSON schema from the response fields in settings
+
+    Args:
+        fields: Mapping of field name to type, e.g. {"found_people": "boolean",
+            "description_of_people": "list[string]"}
+    Returns:
+        dict: JSON schema of an object with all fields required; accepted by Ollama's `format`
+    Raises:
+        ValueError: If a field type is unsupported or a field of REQUIRED_FIELDS is missing or retyped
+    """
+    for name, type_name in REQUIRED_FIELDS.items():
+        if name not in fields:
+            raise ValueError(f"Response fields must include '{name}' ({type_name})")
+        if _field_schema(fields[name]) != _field_schema(type_name):
+            raise ValueError(f"Response field '{name}' must be {type_name}, got {fields[name]}")
+    return {
+        "type": "object",
+        "properties": {name: _field_schema(type_name) for name, type_name in fields.items()},
+        "required": list(fields.keys()),
+    }
+
+
+def schema_instructions(schema):
+    """
+    Prompt suffix telling the model which JSON to produce
+    """
+    example = {name: _example_value(spec) for name, spec in schema["properties"].items()}
+    return f" Respond only with a JSON object of this form: {json.dumps(example)}"
+
+
+def _example_value(spec):
+    if spec["type"] == "array":
+        return [_example_value(spec["items"])]
+    return {"boolean": True, "integer": 0, "number": 0.0, "string": "..."}[spec["type"]]
+
+
+def _coerce(value, spec, name):
+    expected = spec["type"]
+    if expected == "boolean":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+            return value.strip().lower() in ("true", "yes")
+    elif expected == "integer":
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+    elif expected == "number":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif expected == "string":
+        if isinstance(value, str):
+            return value
+    elif expected == "array":
+        if isinstance(value, str):  # a single item instead of a list
+            value = [value]
+        if isinstance(value, list):
+            return [_coerce(item, spec["items"], f"{name}[{i}]") for i, item in enumerate(value)]
+    raise ResponseValidationError(f"Field '{name}' should be {expected}, got {type(value).__name__}")
+
+
+def validate_response(data, schema):
+    """
+    Check parsed JSON against the schema
+
+    Args:
+        data: Parsed JSON
+        schema: Output of build_schema
+    Returns:
+        dict: The schema's fields with normalized types; unknown fields are dropped
+    Raises:
+        ResponseValidationError: If a required field is missing or has the wrong type
+    """
+    if not isinstance(data, dict):
+        raise ResponseValidationError(f"Expected a JSON object, got {type(data).__name__}")
+    missing = [name for name in schema["required"] if name not in data]
+    if missing:
+        raise ResponseValidationError(f"Missing fields: {', '.join(missing)}")
+    return {name: _coerce(data[name], spec, name)
+            for name, spec in schema["properties"].items() if name in data}
+
+
+def _load_json(llm_response):
+    text = llm_response.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    # Free-form answer (JSON mode off or unsupported provider): use the first JSON object in it
+    start = text.find('{')
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object in response", text, 0)
+    data, _ = json.JSONDecoder().raw_decode(text, start)
+    return data
+
+
+class ResponseParser:
+    """
+    Parses and validates LLM responses against one schema.
+
+    Identical responses are common at temperature 0 ("no people" for an empty
+    porch), so validated records are cached by response text.
+    """
+
+    def __init__(self, schema, cache_size=256):
+        self.schema = schema
+        self._parse_cached = lru_cache(maxsize=cache_size)(self._parse)
+
+    @classmethod
+    def from_fields(cls, fields):
+        return cls(build_schema(fields))
+
+    def _parse(self, llm_response):
+        return validate_response(_load_json(llm_response), self.schema)
+
+    def parse(self, llm_response):
+        """
+        Parse and validate an LLM response
+
+        Args:
+            llm_response: Response text, bare JSON in structured output mode
+        Returns:
+            dict: Validated record
+        Raises:
+            json.JSONDecodeError: If the response contains no valid JSON
+            ResponseValidationError: If the JSON does not match the schema
+        """
+        return copy.deepcopy(self._parse_cached(llm_response))
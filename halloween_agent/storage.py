@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+_SEQUENCE_PATTERN = re.compile(r'^image_(\d{10})_')
+
+
+class ImageStore:
+    """
+    Ring buffer of stored frames.
+
+    The directory is scanned once at startup; after that an in-memory index
+    (oldest first) tracks every stored frame, so saving a frame never lists
+    the directory. Filenames carry a monotonic sequence number, so frames
+    saved within the same second do not overwrite each other. Frames that
+    fall out of the retention policy are deleted by a background thread.
+
+    Retention policy, each limit optional:
+        max_images: keep at most this many frames
+        max_total_mb: keep at most this many megabytes of frames
+        max_age_seconds: delete frames older than this
+    """
+
+    def __init__(self, storage_dir, max_images=30, max_total_mb=None, max_age_seconds=None):
+        self.storage_dir = storage_dir
+        self.max_images = max_images
+        self.max_total_bytes = max_total_mb * 1024 * 1024 if max_total_mb else None
+        self.max_age_seconds = max_age_seconds
+        self._index = deque()  # (path, size_bytes, created_at), oldest first
+        self._total_bytes = 0
+        self._next_sequence = 0
+        self._lock = threading.Lock()
+        self._delete_queue = queue.Queue()
+
+        os.makedirs(storage_dir, exist_ok=True)
+        self._load_existing()
+        self._deleter = threading.Thread(target=self._delete_worker, name="image-store-deleter", daemon=True)
+        self._deleter.start()
+        with self._lock:
+            self._enforce_policy(time.time())
+
+    @classmethod
+    def from_settings(cls, storage_settings):
+        """Build a store from the image.storage section of settings.yaml"""
+        return cls(
+            storage_settings.dir,
+            max_images=storage_settings.max_images,
+            max_total_mb=storage_settings.get('max_total_mb'),
+            max_age_seconds=storage_settings.get('max_age_seconds'),
+        )
+
+    def _load_existing(self):
+        entries = []
+        for entry in os.scandir(self.storage_dir):
+            if not entry.is_file() or not entry.name.lower().endswith(_IMAGE_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            match = _SEQUENCE_PATTERN.match(entry.name)
+            # files from the old timestamp-only naming sort before any numbered file
+            sequence = int(match.group(1)) if match else -1
+            entries.append((sequence, stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        for sequence, mtime, path, size in entries:
+            self._index.append((path, size, mtime))
+            self._total_bytes += size
+            self._next_sequence = max(self._next_sequence, sequence + 1)
+        logger.info(f"Image store {self.storage_dir}: {len(self._index)} existing images")
+
+    def save(self, image_bytes, extension='jpg'):
+        """
+        Write a frame and schedule deletion of frames outside the retention policy
+
+        Args:
+            image_bytes: Encoded image file contents
+            extension: File extension without dot
+        Returns:
+            str: Path to the saved image
+        """
+        with self._lock:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(self.storage_dir, f"image_{sequence:010d}_{timestamp}.{extension}")
+        with open(filepath, 'wb') as f:
+            f.write(image_bytes)
+
+        now = time.time()
+        with self._lock:
+            self._index.append((filepath, len(image_bytes), now))
+            self._total_bytes += len(image_bytes)
+            self._enforce_policy(now)
+        return filepath
+
+    def _enforce_policy(self, now):
+        # Caller holds self._lock. Each eviction is O(1): the oldest frame is always at the left.
+        while self._index:
+            path, size, created_at = self._index[0]
+            over_count = self.max_images is not None and len(self._index) > self.max_images
+            over_size = self.max_total_bytes is not None and self._total_bytes > self.max_total_bytes and len(self._index) > 1
+            expired = self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+            if not (over_count or over_size or expired):
+                break
+            self._index.popleft()
+            self._total_bytes -= size
+            self._delete_queue.put(path)
+
+    def _delete_worker(self):
+        while True:
+            path = self._delete_queue.get()
+            try:
+                os.remove(path)
+                logger.info(f"Removed oldest image: {path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Failed to remove image {path}: {str(e)}")
+            finally:
+                self._delete_queue.task_done()
+
+    def flush(self):
+        """Block until all scheduled deletions are done"""
+        self._delete_queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": len(self._index),
+                "total_bytes": self._total_bytes,
+                "pending_deletes": self._delete_queue.qsize(),
+            }
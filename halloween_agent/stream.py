@@ -0,0 +1,181 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+import cv2
+from core import FrameImage, ImageProcessingError
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+
+class FrameSampler:
+    """
+    Keeps at most `fps` frames per second of stream time; fps of 0 or None keeps every frame
+    """
+
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._last = None
+
+    def accept(self, timestamp):
+        if self._last is not None and timestamp - self._last < self.interval:
+            return False
+        self._last = timestamp
+        return True
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox between the decode thread and the analysis loop.
+
+    A frame that has not been taken yet is replaced by the next one, so the
+    analysis always works on the newest frame and never builds up a backlog
+    when the LLM is slower than the stream. Only `get` runs on the event loop;
+    producers on other threads use the `*_threadsafe` methods.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._frame = None
+        self._closed = False
+        self._error = None
+        self._event = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+
+    def _put(self, frame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    def _close(self, error=None):
+        self._closed = True
+        self._error = error
+        self._event.set()
+
+    def put_threadsafe(self, frame):
+        self._loop.call_soon_threadsafe(self._put, frame)
+
+    def close_threadsafe(self, error=None):
+        self._loop.call_soon_threadsafe(self._close, error)
+
+    async def get(self):
+        """
+        Wait for the next frame
+
+        Returns:
+            FrameImage, or None once the source has ended
+        Raises:
+            ImageProcessingError: The source failed
+        """
+        while self._frame is None:
+            if self._closed:
+                if self._error:
+                    raise ImageProcessingError(self._error)
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+def _put_latest(q, item):
+    # Replace an item still waiting in a maxsize=1 queue instead of blocking the producer
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class CaptureReader(threading.Thread):
+    """
+    Reads an RTSP stream, MJPEG/HTTP URL or local video file with cv2.VideoCapture.
+
+    Frames skipped by the sampler are only grabbed, not converted. Live
+    sources are sampled by wall clock time; files by their media timestamps,
+    so a test file yields the same frames however fast it is decoded.
+    """
+
+    def __init__(self, source, slot, fps, jpeg_quality=90):
+        super().__init__(name="stream-capture", daemon=True)
+        self.source = source
+        self.slot = slot
+        self.sampler = FrameSampler(fps)
+        self.jpeg_quality = jpeg_quality
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            logger.error(f"Could not open video source: {self.source}")
+            self.slot.close_threadsafe(f"Could not open video source: {self.source}")
+            return
+        is_file = os.path.isfile(self.source)
+        error = None
+        try:
+            while not self._stop_event.is_set():
+                if not capture.grab():
+                    break
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000 if is_file else time.monotonic()
+                if not self.sampler.accept(timestamp):
+                    continue
+                ok, image = capture.retrieve()
+                if not ok:
+                    continue
+                self.slot.put_threadsafe(FrameImage.from_array(image, quality=self.jpeg_quality))
+        except Exception as e:
+            logger.error(f"Error reading video source {self.source}: {str(e)}")
+            error = str(e)
+        finally:
+            capture.release()
+            logger.info(f"Video source ended: {self.source}")
+            self.slot.close_threadsafe(error)
+
+
+class BytesDecoder(threading.Thread):
+    """
+    Decodes encoded images (JPEG/PNG bytes, one per WebSocket message) off the event loop.
+
+    Messages are sampled on arrival, before decoding; if decoding falls behind,
+    only the newest undecoded message is kept.
+    """
+
+    def __init__(self, slot, fps):
+        super().__init__(name="stream-decoder", daemon=True)
+        self.slot = slot
+        self.sampler = FrameSampler(fps)
+        self._input = queue.Queue(maxsize=1)
+
+    def push(self, data):
+        """Hand over one encoded image; called from the event loop"""
+        if self.sampler.accept(time.monotonic()):
+            _put_latest(self._input, data)
+
+    def stop(self):
+        _put_latest(self._input, None)
+
+    def run(self):
+        while True:
+            data = self._input.get()
+            if data is None:
+                break
+            try:
+                frame = FrameImage(data)
+                frame.array  # decode here, not on the event loop
+                self.slot.put_threadsafe(frame)
+            except ImageProcessingError as e:
+                logger.warning(f"Skipping undecodable stream frame: {str(e)}")
+        self.slot.close_threadsafe()
@@ -167,11 +167,29 @@ async function processFrame() {
             body: formData
         });
 
+        // Server is busy with a newer frame; the next capture will be analyzed instead
+        if (response.status === 429 || response.status === 503) {
+            console.log(`LLM busy, retry after ${response.headers.get('Retry-After')}s`);
+            return;
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
         const data = await response.json();
+
+        // Scene unchanged since the last analysis, nothing new to show
+        if (data.no_change) {
+            console.log(`No change (motion score ${data.motion_score})`);
+            return;
+        }
+
+        // Ruled out by the local person detector, the LLM was not asked
+        if (data.person_detector && data.person_detector.tier === 'negative') {
+            console.log(`No people detected (confidence ${data.person_detector.confidence})`);
+            return;
+        }
         
         // Create separator
         const separator = document.createElement('p');
@@ -1,6 +1,12 @@
+import os
+import json
+import tempfile
 import unittest
+from types import SimpleNamespace
+from unittest import mock
 import base64
-from core import summarize_image, encode_image, decode_image, ImageProcessingError
+import core
+from core import summarize_image, encode_image, decode_image, ImageProcessingError, FrameImage, preprocess_frame
 import cv2
 import numpy as np
 import string
@@ -67,5 +73,68 @@ class TestCore(unittest.TestCase):
         with self.assertRaises(Exception):  # Could be LLMProcessingError
             summarize_image("")
 
+class TestFrameImage(unittest.TestCase):
+    def setUp(self):
+        self.image_np = np.zeros((300, 400, 3), dtype=np.uint8)
+        self.image_np[100:200, 150:250] = (0, 0, 255)
+        ok, buffer = cv2.imencode('.png', self.image_np)
+        self.png_bytes = buffer.tobytes()
+        self.encoded_string = 'data:image/png;base64,' + base64.b64encode(self.png_bytes).decode('utf-8')
+
+    def test_from_base64(self):
+        frame = FrameImage.from_base64(self.encoded_string)
+        self.assertEqual(frame.data, self.png_bytes)
+        self.assertEqual(frame.format, 'png')
+        self.assertEqual(frame.size, (400, 300))
+        self.assertEqual(frame.mime_type, 'image/png')
+        self.assertEqual(frame.base64, self.encoded_string.split(';base64,')[1])
+        np.testing.assert_array_equal(frame.array, self.image_np)
+
+    def test_to_jpeg(self):
+        frame = FrameImage.from_base64(self.encoded_string)
+        small = frame.to_jpeg(max_long_edge=200, quality=80)
+        self.assertEqual(small.format, 'jpeg')
+        self.assertEqual(small.extension, 'jpg')
+        self.assertEqual(small.size, (200, 150))
+        # no upscaling
+        self.assertEqual(frame.to_jpeg(max_long_edge=1000).size, (400, 300))
+
+    def test_preprocess_frame(self):
+        frame = FrameImage.from_base64(self.encoded_string)
+        resized = preprocess_frame(frame, max_long_edge=100, roi=[], jpeg_quality=80)
+        self.assertEqual(resized.format, 'jpeg')
+        self.assertEqual(resized.size, (100, 75))
+
+        # crop to the red square, [x, y, width, height] as fractions of the frame
+        cropped = preprocess_frame(frame, max_long_edge=1000, roi=[0.375, 1 / 3, 0.25, 1 / 3], jpeg_quality=95)
+        self.assertEqual(cropped.size, (100, 100))
+        b, g, r = cropped.array[50, 50]
+        self.assertGreater(int(r), 200)
+        self.assertLess(int(b), 50)
+
+        with self.assertRaises(ImageProcessingError):
+            preprocess_frame(frame, max_long_edge=100, roi=[1.0, 1.0, 0.1, 0.1])
+
+    def test_calibrated_full_resolution(self):
+        # Calibration writes 0 when no candidate edge keeps accuracy: no downscaling, not the static edge
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calibration_file = os.path.join(tmp_dir, "calibration.json")
+            with open(calibration_file, 'w') as f:
+                json.dump({"max_long_edge": 0}, f)
+            preprocess = SimpleNamespace(max_long_edge=100, roi=None, jpeg_quality=90,
+                                         adaptive=SimpleNamespace(enabled=True, calibration_file=calibration_file))
+            with mock.patch.object(core, "settings", SimpleNamespace(image=SimpleNamespace(preprocess=preprocess))), \
+                    mock.patch.dict(core._calibration_cache, {"mtime": None, "max_long_edge": None}):
+                processed = preprocess_frame(FrameImage.from_base64(self.encoded_string))
+        self.assertEqual(processed.size, (400, 300))
+
+    def test_invalid_data(self):
+        with self.assertRaises(ImageProcessingError):
+            FrameImage.from_base64("")
+        with self.assertRaises(ImageProcessingError):
+            FrameImage.from_base64("not base64!")
+        with self.assertRaises(ImageProcessingError):
+            FrameImage(b"not an image").size
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import database
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "test.db")
+        database.init_db(self.db_path, batch_size=10, flush_interval_seconds=0.05)
+
+    def tearDown(self):
+        database.close_db()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_query_recent(self):
+        for i in range(25):
+            database.save_json_response({"found_people": i % 2 == 0, "frame": i})
+        database.flush_db()
+        rows = database.query_recent(limit=5)
+        self.assertEqual([row["response_data"]["frame"] for row in rows], [24, 23, 22, 21, 20])
+
+    def test_query_time_range(self):
+        database.save_json_response({"frame": 0})
+        database.flush_db()
+        now = datetime.now()
+        self.assertEqual(len(database.query_recent(start=now - timedelta(minutes=1))), 1)
+        self.assertEqual(database.query_recent(end=now - timedelta(minutes=1)), [])
+
+    def test_detections_are_typed(self):
+        database.save_detection({"found_people": True, "description_of_people": ["pirate", "ghost"]})
+        database.save_detection({"found_people": False, "description_of_people": []})
+        database.flush_db()
+        rows = database.query_detections(found_people=True)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["people_count"], 2)
+        self.assertEqual(rows[0]["description_of_people"], ["pirate", "ghost"])
+        self.assertEqual(len(database.query_detections()), 2)
+
+    def test_close_commits_pending_writes(self):
+        database.init_db(self.db_path, batch_size=1000, flush_interval_seconds=60)
+        database.save_json_response({"frame": 0})
+        database.close_db()
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0], 1)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_save_requires_init(self):
+        database.close_db()
+        with self.assertRaises(RuntimeError):
+            database.save_detection({"found_people": False, "description_of_people": []})
+
+if __name__ == '__main__':
+    unittest.main()
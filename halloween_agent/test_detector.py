@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+import cv2
+import numpy as np
+from detector import PersonDetector
+
+@unittest.skipUnless(hasattr(cv2, "HOGDescriptor"), "OpenCV build without HOG (OpenCV 5)")
+class TestPersonDetector(unittest.TestCase):
+    def test_tiers(self):
+        detector = PersonDetector(negative_threshold=0.3, positive_threshold=0.8)
+        self.assertEqual(detector.tier(0.1), "negative")
+        self.assertEqual(detector.tier(0.5), "uncertain")
+        self.assertEqual(detector.tier(0.9), "positive")
+
+    def test_empty_scene_is_negative(self):
+        detector = PersonDetector()
+        result = detector.detect(np.full((480, 640, 3), 90, np.uint8))
+        self.assertEqual(result["tier"], "negative")
+        self.assertEqual(result["boxes"], [])
+
+    def test_small_frame_is_uncertain(self):
+        result = PersonDetector().detect(np.zeros((64, 64, 3), np.uint8))
+        self.assertEqual(result["tier"], "uncertain")
+        self.assertIsNone(result["confidence"])
+
+    def test_metrics(self):
+        detector = PersonDetector()
+        detector.detect(np.full((480, 640, 3), 90, np.uint8))
+        detector.detect(np.zeros((64, 64, 3), np.uint8))
+        detector.record_llm_result("uncertain", True)
+        metrics = detector.metrics()
+        self.assertEqual(metrics["frames"], 2)
+        self.assertEqual(metrics["llm_skip_rate"], 0.5)
+        self.assertEqual(metrics["tiers"]["uncertain"]["llm_hit_rate"], 1.0)
+        self.assertIsNone(metrics["tiers"]["positive"]["llm_hit_rate"])
+
+class TestPersonDetectorSettings(unittest.TestCase):
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            PersonDetector(negative_threshold=0.9, positive_threshold=0.5)
+        with self.assertRaises(ValueError):
+            PersonDetector(method="dnn")
+
+    @unittest.skipIf(hasattr(cv2, "HOGDescriptor"), "OpenCV build with HOG")
+    def test_hog_falls_back_to_dnn(self):
+        with self.assertRaises(ValueError):
+            PersonDetector(method="hog")
+        with mock.patch.object(cv2.dnn, "readNet") as read_net:
+            detector = PersonDetector(method="hog", dnn_model="person.onnx")
+        self.assertEqual(detector.method, "dnn")
+        read_net.assert_called_once_with("person.onnx")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import time
+import asyncio
+import threading
+import unittest
+from dispatcher import LLMDispatcher, FrameSuperseded, DispatcherOverloaded
+
+class SlowLLM:
+    """Stand-in for summarize_image that records how many calls overlap"""
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, frame):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append(frame)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return f"response {frame}"
+
+class TestLLMDispatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_in_flight_calls(self):
+        llm = SlowLLM(delay=0.05)
+        dispatcher = LLMDispatcher(llm, max_in_flight=2, max_pending=10)
+        results = await asyncio.gather(*(dispatcher.submit(i) for i in range(6)))
+        self.assertEqual(results, [f"response {i}" for i in range(6)])
+        self.assertEqual(llm.max_active, 2)
+        self.assertEqual(dispatcher.metrics()["completed"], 6)
+        self.assertEqual(dispatcher.metrics()["in_flight"], 0)
+
+    async def test_latest_frame_wins(self):
+        llm = SlowLLM()
+        dispatcher = LLMDispatcher(llm, max_in_flight=1, max_pending=1)
+        tasks = []
+        for i in range(3):
+            tasks.append(asyncio.create_task(dispatcher.submit(i)))
+            await asyncio.sleep(0.01)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(results[0], "response 0")
+        self.assertIsInstance(results[1], FrameSuperseded)
+        self.assertEqual(results[2], "response 2")
+        self.assertEqual(llm.calls, [0, 2])
+        metrics = dispatcher.metrics()
+        self.assertEqual(metrics["superseded"], 1)
+        self.assertAlmostEqual(metrics["drop_rate"], 1 / 3)
+
+    async def test_overloaded_without_queue(self):
+        dispatcher = LLMDispatcher(SlowLLM(), max_in_flight=1, max_pending=0, retry_after_seconds=5)
+        first = asyncio.create_task(dispatcher.submit(0))
+        await asyncio.sleep(0.01)
+        with self.assertRaises(DispatcherOverloaded) as ctx:
+            await dispatcher.submit(1)
+        self.assertEqual(ctx.exception.retry_after, 5)
+        await first
+
+    async def test_timeout_keeps_slot_until_call_returns(self):
+        llm = SlowLLM(delay=0.2)
+        dispatcher = LLMDispatcher(llm, max_in_flight=1, max_pending=1, timeout_seconds=0.05)
+        with self.assertRaises(asyncio.TimeoutError):
+            await dispatcher.submit(0)
+        self.assertEqual(dispatcher.metrics()["in_flight"], 1)
+        llm.delay = 0.01
+        self.assertEqual(await asyncio.wait_for(dispatcher.submit(1), 1), "response 1")
+        self.assertEqual(llm.max_active, 1)
+
+if __name__ == '__main__':
+    unittest.main()
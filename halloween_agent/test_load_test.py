@@ -0,0 +1,33 @@
+import unittest
+import load_test
+
+class TestLoadTest(unittest.TestCase):
+    def test_settings_env(self):
+        env = load_test.settings_env({"motion.enabled": False, "image.storage.dir": "/tmp/x"})
+        self.assertEqual(env, {"DYNACONF_MOTION__ENABLED": "@json false", "DYNACONF_IMAGE__STORAGE__DIR": "/tmp/x"})
+
+    def test_summarize(self):
+        summary = load_test.summarize([0.1, 0.2, 0.3, 0.05], [200, 200, 200, 429], 2.0, {})
+        self.assertAlmostEqual(summary["p50_ms"], 200.0)
+        self.assertEqual(summary["drop_rate"], 0.25)
+        self.assertEqual(summary["throughput_rps"], 1.5)
+
+    def test_smoke_run(self):
+        summaries = load_test.main(["--synthetic", "3", "--rate", "10", "--duration", "0.5", "--llm-latency", "0.01"])
+        self.assertEqual(len(summaries), 1)
+        summary = summaries[0]
+        self.assertNotIn("error", summary)
+        self.assertEqual(summary["requests"], 5)
+        self.assertEqual(summary["error_rate"], 0.0)
+        self.assertIsNotNone(summary["p95_ms"])
+
+    def test_variant_timeout(self):
+        # Every frame reaches a stub LLM that answers after a minute, far past the deadline
+        variant = {"name": "slow-llm", "settings": {"motion.enabled": False, "person_detector.enabled": False}}
+        options = {"frames": None, "synthetic": 3, "rate": 10, "duration": 0.5, "llm_latency": 60,
+                   "llm_jitter": 0.0, "people_rate": 0.0, "timeout": 0}
+        summaries = load_test.run_all([variant], options)
+        self.assertIn("did not finish", summaries[0]["error"])
+
+if __name__ == '__main__':
+    unittest.main()
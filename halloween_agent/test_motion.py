@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from motion import MotionGate
+
+class TestMotionGate(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.background = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+    def test_first_frame_has_motion(self):
+        gate = MotionGate()
+        result = gate.update(self.background)
+        self.assertTrue(result["has_motion"])
+
+    def test_static_scene_has_no_motion(self):
+        for method in ("running_average", "mog2"):
+            gate = MotionGate(method=method)
+            gate.update(self.background)
+            for _ in range(3):
+                result = gate.update(self.background.copy())
+            self.assertFalse(result["has_motion"], method)
+            self.assertLess(result["motion_score"], gate.threshold)
+
+    def test_person_entering_has_motion(self):
+        gate = MotionGate()
+        gate.update(self.background)
+        frame = self.background.copy()
+        frame[60:200, 100:160] = 255  # bright figure in the door area
+        result = gate.update(frame)
+        self.assertTrue(result["has_motion"])
+        self.assertEqual(len(result["regions"]), 1)
+        x, y, w, h = result["regions"][0]
+        self.assertAlmostEqual(x, 100, delta=8)
+        self.assertAlmostEqual(w, 60, delta=16)
+
+    def test_resolution_change_resets_model(self):
+        gate = MotionGate()
+        gate.update(self.background)
+        result = gate.update(self.background[:120, :160])
+        self.assertTrue(result["has_motion"])
+
+if __name__ == '__main__':
+    unittest.main()
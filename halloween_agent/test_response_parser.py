@@ -0,0 +1,47 @@
+import json
+import unittest
+from response_parser import ResponseParser, ResponseValidationError, build_schema
+
+FIELDS = {"found_people": "boolean", "description_of_people": "list[string]"}
+
+class TestResponseParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = ResponseParser.from_fields(FIELDS)
+
+    def test_build_schema(self):
+        schema = build_schema(FIELDS)
+        self.assertEqual(schema["properties"]["description_of_people"],
+                         {"type": "array", "items": {"type": "string"}})
+        self.assertEqual(schema["required"], ["found_people", "description_of_people"])
+
+    def test_build_schema_requires_detection_fields(self):
+        schema = build_schema(dict(FIELDS, costume_count="integer"))
+        self.assertEqual(schema["properties"]["costume_count"], {"type": "integer"})
+        with self.assertRaises(ValueError):
+            build_schema({"found_people": "boolean"})
+        with self.assertRaises(ValueError):
+            build_schema(dict(FIELDS, found_people="string"))
+
+    def test_structured_output(self):
+        record = self.parser.parse('{"found_people": true, "description_of_people": ["child in a witch costume"]}')
+        self.assertEqual(record, {"found_people": True, "description_of_people": ["child in a witch costume"]})
+
+    def test_free_form_answer_with_fence(self):
+        text = 'Sure!\n```json\n{"found_people": "false", "description_of_people": [], "extra": 1}\n```'
+        self.assertEqual(self.parser.parse(text), {"found_people": False, "description_of_people": []})
+
+    def test_invalid_responses(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.parser.parse("no change")
+        with self.assertRaises(ResponseValidationError):
+            self.parser.parse('{"found_people": true}')
+        with self.assertRaises(ResponseValidationError):
+            self.parser.parse('{"found_people": 3, "description_of_people": []}')
+
+    def test_cached_records_are_copies(self):
+        text = '{"found_people": true, "description_of_people": ["ghost"]}'
+        self.parser.parse(text)["description_of_people"].append("vampire")
+        self.assertEqual(self.parser.parse(text)["description_of_people"], ["ghost"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from storage import ImageStore
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    def stored_files(self):
+        return sorted(os.listdir(self.storage_dir))
+
+    def test_keeps_last_max_images(self):
+        store = ImageStore(self.storage_dir, max_images=3)
+        paths = [store.save(b"frame %d" % i) for i in range(5)]
+        store.flush()
+        self.assertEqual(self.stored_files(), sorted(os.path.basename(p) for p in paths[-3:]))
+
+    def test_same_second_frames_do_not_collide(self):
+        store = ImageStore(self.storage_dir, max_images=10)
+        paths = [store.save(b"frame") for _ in range(4)]
+        self.assertEqual(len(set(paths)), 4)
+
+    def test_size_limit(self):
+        store = ImageStore(self.storage_dir, max_images=None, max_total_mb=1)
+        for _ in range(3):
+            store.save(b"x" * 400 * 1024)
+        store.flush()
+        self.assertEqual(len(self.stored_files()), 2)
+        self.assertLessEqual(store.stats()["total_bytes"], 1024 * 1024)
+
+    def test_age_limit(self):
+        store = ImageStore(self.storage_dir, max_images=None, max_age_seconds=0.05)
+        old = store.save(b"old")
+        time.sleep(0.1)
+        new = store.save(b"new")
+        store.flush()
+        self.assertEqual(self.stored_files(), [os.path.basename(new)])
+        self.assertFalse(os.path.exists(old))
+
+    def test_restart_continues_sequence(self):
+        with open(os.path.join(self.storage_dir, "image_20241031_200000.jpg"), "wb") as f:
+            f.write(b"legacy")
+        store = ImageStore(self.storage_dir, max_images=2)
+        first = store.save(b"a")
+        store.flush()
+
+        restarted = ImageStore(self.storage_dir, max_images=2)
+        second = restarted.save(b"b")
+        restarted.flush()
+        self.assertEqual(self.stored_files(), sorted([os.path.basename(first), os.path.basename(second)]))
+        self.assertGreater(os.path.basename(second), os.path.basename(first))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from stream import FrameSampler, LatestFrameSlot, BytesDecoder, CaptureReader
+from core import FrameImage, ImageProcessingError
+
+class TestFrameSampler(unittest.TestCase):
+    def test_sampling_rate(self):
+        sampler = FrameSampler(fps=2)
+        kept = [t / 10 for t in range(20) if sampler.accept(t / 10)]
+        self.assertEqual(kept, [0.0, 0.5, 1.0, 1.5])
+
+    def test_zero_fps_keeps_everything(self):
+        sampler = FrameSampler(fps=0)
+        self.assertTrue(all(sampler.accept(0.0) for _ in range(5)))
+
+class TestStreamThreads(unittest.IsolatedAsyncioTestCase):
+    async def test_slot_keeps_latest(self):
+        slot = LatestFrameSlot(asyncio.get_running_loop())
+        for i in range(3):
+            slot.put_threadsafe(i)
+        slot.close_threadsafe()
+        await asyncio.sleep(0)
+        self.assertEqual(await slot.get(), 2)
+        self.assertIsNone(await slot.get())
+        self.assertEqual(slot.dropped, 2)
+
+    async def test_bytes_decoder(self):
+        slot = LatestFrameSlot(asyncio.get_running_loop())
+        decoder = BytesDecoder(slot, fps=0)
+        decoder.start()
+        image = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+        decoder.push(FrameImage.from_array(image).data)
+        frame = await asyncio.wait_for(slot.get(), 1)
+        self.assertEqual(frame.array.shape, (48, 64, 3))
+        decoder.stop()
+        self.assertIsNone(await asyncio.wait_for(slot.get(), 1))
+
+    async def test_capture_reader_samples_file_by_media_time(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "clip.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+            for i in range(30):
+                writer.write(np.full((48, 64, 3), i * 8, np.uint8))
+            writer.release()
+
+            slot = LatestFrameSlot(asyncio.get_running_loop())
+            reader = CaptureReader(path, slot, fps=1)
+            reader.start()
+            await asyncio.get_running_loop().run_in_executor(None, reader.join)
+            await asyncio.sleep(0)
+            # 3 seconds of video sampled at 1 fps
+            self.assertEqual(slot.received, 3)
+
+    async def test_capture_reader_bad_source(self):
+        slot = LatestFrameSlot(asyncio.get_running_loop())
+        CaptureReader("/nonexistent/clip.avi", slot, fps=1).start()
+        with self.assertRaises(ImageProcessingError):
+            await asyncio.wait_for(slot.get(), 5)
+
+if __name__ == '__main__':
+    unittest.main()
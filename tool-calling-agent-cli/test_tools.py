@@ -1,5 +1,9 @@
 from utils import handle_tool_call
+import json
 import os
+import shutil
+import tempfile
+from pathlib import Path
 
 def test_weather():
     result = handle_tool_call({
@@ -18,16 +22,195 @@ def test_calculator():
     })
     print("Calculator test result:", result)
 
+    # Test expression with array statistics
+    result = handle_tool_call({
+        "name": "calculate",
+        "input": {
+            "expression": "mean(x) + 2 * std(x)",
+            "variables": {"x": [2, 4, 4, 4, 5, 5, 7, 9]}
+        }
+    })
+    print("Calculator expression test result:", result)
+    assert result["result"] == 9.0
+
+    # Test batch evaluation with assignments
+    result = handle_tool_call({
+        "name": "calculate",
+        "input": {
+            "expressions": ["r = 0.05", "round(1000 * (1 + r) ** 10, 2)", "undefined_name + 1"]
+        }
+    })
+    print("Calculator batch test result:", result)
+    assert result["result"][1]["result"] == 1628.89 and "error" in result["result"][2]
+
+    # Test error case - disallowed syntax
+    result = handle_tool_call({
+        "name": "calculate",
+        "input": {"expression": "__import__('os').getcwd()"}
+    })
+    print("Calculator error test result:", result)
+    assert "error" in result
+
+    # Test error case - results too large to compute are refused up front
+    result = handle_tool_call({
+        "name": "calculate",
+        "input": {"expressions": ["((7**9999)**9999)**9999", "comb(2*10**6, 10**6)", "zeros((10**4, 1)) * zeros(10**4)",
+                                  "comb(10**18, 3)"]}
+    })
+    print("Calculator limits test result:", result)
+    assert all("error" in r for r in result["result"][:3]) and "result" in result["result"][3]
+
+    # Integers beyond int64 in arrays become floats, not unbounded Python ints
+    result = handle_tool_call({
+        "name": "calculate",
+        "input": {"expressions": ["[10**30] ** (3*10**6)", "[10**30, 2] * 2", "x * 2", "array(10**30) ** 10**4",
+                                  "[10**400]"],
+                  "variables": {"x": [10**30]}}
+    })
+    print("Calculator array limits test result:", result)
+    json.dumps(result)
+    assert [r["result"] for r in result["result"][1:3]] == [[2e30, 4.0], [2e30]]
+    assert result["result"][0]["result"] == [float("inf")] and result["result"][3]["result"] == float("inf")
+    assert "error" in result["result"][4]
+    from tools.calculator import to_json
+    import numpy as np
+    assert to_json(np.array([10**2000, 1], dtype=object))[0]["digits"] == 2001
+
 def test_file_search():
     result = handle_tool_call({
         "name": "search_files",
         "input": {
             "directory": ".",
-            "pattern": "*.py"
+            "patterns": "py"
         }
     })
     print("File search test result:", result)
 
+    # Test .gitignore, exclude list and max_results
+    test_dir = tempfile.mkdtemp()
+    for name in ["keep.py", "build/skip.py", "node_modules/pkg/skip.py", "logs/skip.py", "notes.md"]:
+        os.makedirs(os.path.dirname(os.path.join(test_dir, name)), exist_ok=True)
+        with open(os.path.join(test_dir, name), "w") as f:
+            f.write("x = 1\n")
+    with open(os.path.join(test_dir, ".gitignore"), "w") as f:
+        f.write("build/\n")
+    result = handle_tool_call({
+        "name": "search_files",
+        "input": {
+            "directory": test_dir,
+            "patterns": "py",
+            "exclude": ["logs"]
+        }
+    })
+    print("File search ignore test result:", result)
+    assert [os.path.basename(p) for p in result["result"]] == ["keep.py"]
+
+    result = handle_tool_call({
+        "name": "search_files",
+        "input": {
+            "directory": test_dir,
+            "patterns": "*",
+            "respect_gitignore": False,
+            "max_results": 2
+        }
+    })
+    print("File search max_results test result:", result)
+    assert len(result["result"]) == 2 and result["truncated"]
+    shutil.rmtree(test_dir)
+
+def test_file_index():
+    test_dir = tempfile.mkdtemp()
+    with open(os.path.join(test_dir, "app.py"), "w") as f:
+        f.write("import os\n\ndef load_config(path):\n    return path\n")
+    with open(os.path.join(test_dir, "notes.md"), "w") as f:
+        f.write("Call load_config before start\n")
+
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": test_dir, "action": "find", "query": "*.py"}
+    })
+    print("File index find test result:", result)
+    assert [os.path.basename(p) for p in result["result"]] == ["app.py"]
+
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": test_dir, "action": "grep", "query": "LOAD_CONFIG", "patterns": "py"}
+    })
+    print("File index grep test result:", result)
+    assert [(os.path.basename(m["path"]), m["line"]) for m in result["result"]] == [("app.py", 3)]
+
+    # A new file shows up after a refresh, only the changed file is read
+    with open(os.path.join(test_dir, "extra.py"), "w") as f:
+        f.write("load_config('x')\n")
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": test_dir, "action": "refresh"}
+    })
+    print("File index refresh test result:", result)
+    assert result["result"]["added"] == 1 and result["result"]["unchanged"] == 2
+
+    # Queries pick up new directories and edited files without walking the tree again
+    os.makedirs(os.path.join(test_dir, "pkg"))
+    with open(os.path.join(test_dir, "pkg", "module.py"), "w") as f:
+        f.write("x = 1\n")
+    with open(os.path.join(test_dir, "notes.md"), "a") as f:
+        f.write("unique_marker\n")
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": test_dir, "action": "find", "query": "*.py"}
+    })
+    assert sorted(os.path.basename(p) for p in result["result"]) == ["app.py", "extra.py", "module.py"]
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": test_dir, "action": "grep", "query": "unique_marker"}
+    })
+    print("File index update test result:", result)
+    assert [os.path.basename(m["path"]) for m in result["result"]] == ["notes.md"]
+
+    # Test error case - missing directory
+    result = handle_tool_call({
+        "name": "query_file_index",
+        "input": {"directory": os.path.join(test_dir, "missing")}
+    })
+    print("File index error test result:", result)
+    shutil.rmtree(test_dir)
+
+def test_content_search():
+    test_dir = tempfile.mkdtemp()
+    with open(os.path.join(test_dir, "app.py"), "w") as f:
+        f.write("import os\n\ndef load_config(path):\n    return path\n\nconfig = load_config('a')\n")
+    with open(os.path.join(test_dir, "other.py"), "w") as f:
+        f.write("reload_configuration = True\n")
+    with open(os.path.join(test_dir, "data.bin"), "wb") as f:
+        f.write(b"\0load_config")
+
+    result = handle_tool_call({
+        "name": "search_content",
+        "input": {"path": test_dir, "query": r"load_config\w*", "context_lines": 1}
+    })
+    print("Content search test result:", result)
+    # Whole-word matches in app.py rank above the partial match; the binary file is skipped
+    assert [os.path.basename(r["path"]) for r in result["result"]] == ["app.py", "other.py"]
+    assert [m["line"] for m in result["result"][0]["matches"]] == [3, 6]
+    assert result["result"][0]["matches"][0]["before"] == [""]
+
+    # Test the result budget
+    result = handle_tool_call({
+        "name": "search_content",
+        "input": {"path": test_dir, "query": "LOAD_CONFIG", "fixed_string": True, "case_sensitive": False,
+                  "max_results": 1}
+    })
+    print("Content search budget test result:", result)
+    assert sum(len(r["matches"]) for r in result["result"]) == 1 and result["truncated"]
+
+    # Test error case - invalid regular expression
+    result = handle_tool_call({
+        "name": "search_content",
+        "input": {"path": test_dir, "query": "load_config("}
+    })
+    print("Content search error test result:", result)
+    shutil.rmtree(test_dir)
+
 def test_selenium_browser():
     result = handle_tool_call({
         "name": "selenium_browser_action",
@@ -68,6 +251,242 @@ def test_python_executor():
     })
     print("Python executor error test result:", result)
 
+def test_file_reader():
+    test_dir = tempfile.mkdtemp()
+    test_file = os.path.join(test_dir, "log.txt")
+    with open(test_file, "w") as f:
+        f.write("".join(f"line {i}\n" for i in range(1, 101)))
+
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": test_file, "start_line": 5, "end_line": 7}
+    })
+    print("File reader range test result:", result)
+    assert result["result"]["content"] == "line 5\nline 6\nline 7\n"
+    assert result["result"]["total_lines"] == 100 and result["result"]["next_line"] == 8
+
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": test_file, "mode": "tail", "lines": 2}
+    })
+    print("File reader tail test result:", result)
+    assert result["result"]["content"] == "line 99\nline 100\n" and result["result"]["start_line"] == 99
+
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": test_file, "mode": "preview", "lines": 1}
+    })
+    print("File reader preview test result:", result)
+    assert result["result"]["content"] == "line 1\n... [98 lines omitted] ...\nline 100\n"
+
+    # Pages are cut at a line boundary
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": test_file, "max_bytes": 20}
+    })
+    print("File reader page test result:", result)
+    assert result["result"]["content"] == "line 1\nline 2\n" and result["result"]["next_line"] == 3
+
+    # Test error case - offset past the end of the file
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": test_file, "offset": 10**6}
+    })
+    print("File reader offset error test result:", result)
+    assert "error" in result
+
+    # A UTF-16 preview cut by max_bytes marks the lines it leaves out
+    wide_file = os.path.join(test_dir, "wide.txt")
+    with open(wide_file, "w", encoding="utf-16") as f:
+        f.write("".join(f"l{i}\n" for i in range(1, 31)))
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": wide_file, "mode": "preview", "lines": 20, "max_bytes": 20}
+    })
+    print("File reader wide preview test result:", result)
+    assert result["result"]["content"] == "l1\nl2\nl3\nl4\nl5\nl6\n... [24 lines omitted] ...\n"
+    assert result["result"]["truncated"]
+
+    # Test error case - binary file
+    binary_file = os.path.join(test_dir, "data.bin")
+    with open(binary_file, "wb") as f:
+        f.write(bytes(range(256)))
+    result = handle_tool_call({
+        "name": "read_file",
+        "input": {"path": binary_file}
+    })
+    print("File reader binary test result:", result)
+    assert "error" in result
+    shutil.rmtree(test_dir)
+
+def test_command_runner():
+    result = handle_tool_call({
+        "name": "command_runner",
+        "input": {"command": "echo hello && pwd"}
+    })
+    print("Command runner test result:", result)
+    assert result["result"]["status"] == "exited" and result["result"]["output"].startswith("hello\n")
+
+    # Test background job and polling
+    result = handle_tool_call({
+        "name": "command_runner",
+        "input": {"command": "echo background", "action": "start"}
+    })
+    job_id = result["result"]["job_id"]
+    result = handle_tool_call({
+        "name": "command_runner",
+        "input": {"action": "poll", "job_id": job_id, "wait_seconds": 5}
+    })
+    print("Command runner poll test result:", result)
+    assert result["result"]["output"] == "background\n"
+
+    # Test error case - command refused by the deny list
+    result = handle_tool_call({
+        "name": "command_runner",
+        "input": {"command": "sudo ls"}
+    })
+    print("Command runner error test result:", result)
+    assert "error" in result
+
+    # Allowlisted commands with arguments that write files or run programs are not approved
+    from tools.command_runner import check_policy, load_policy
+    policy = {**load_policy(), "approval": "deny"}
+    for command in ['env bash -c "rm -rf ~/project"', "find / -name x -exec rm -r {} +", "find . -delete",
+                    "git diff --output=/root/.bashrc", "sort -o ~/.bashrc /dev/null", "sort -uo out in",
+                    "ls | sort --output out", "uniq in out", "git branch -D main", "rg --pre sh x"]:
+        assert check_policy(command, policy) is not None, command
+    for command in ["find . -name '*.py' -o -name '*.md'", "sort -u names.txt", "git branch -a",
+                    "grep -o foo bar.txt | sort | uniq -c"]:
+        assert check_policy(command, policy) is None, command
+
+def test_image_preprocessing():
+    from PIL import Image
+    from tools.analyze_image import ImageCache, image_settings, pack_requests
+
+    test_dir = tempfile.mkdtemp()
+    options = image_settings()
+    cache = ImageCache(os.path.join(test_dir, "cache"))
+    try:
+        # Large photo-like image: downscaled and sent as JPEG
+        photo = os.path.join(test_dir, "photo.png")
+        bands = [Image.effect_noise((4000, 3000), sigma) for sigma in (40, 60, 80)]
+        Image.merge("RGB", bands).save(photo)
+        prepared = cache.get(Path(photo), options)
+        print("Image preprocessing test result:", {key: value for key, value in prepared.items() if key != "base64"})
+        assert prepared["media_type"] == "image/jpeg"
+        assert max(prepared["width"], prepared["height"]) <= options["max_edge"]
+        assert prepared["sent_bytes"] < prepared["original_bytes"]
+
+        # Few colors (screenshot, diagram): stays PNG
+        diagram = os.path.join(test_dir, "diagram.png")
+        Image.new("RGB", (800, 600), "white").save(diagram)
+        assert cache.get(Path(diagram), options)["media_type"] == "image/png"
+
+        # A fresh cache finds the encoding on disk
+        assert ImageCache(cache.cache_dir).get(Path(photo), options)["base64"] == prepared["base64"]
+
+        # Batch mode packs images into requests by count and payload size
+        images = [{"base64": "x" * 400}] * 5
+        assert [len(batch) for batch in pack_requests(images, max_images=2, max_bytes=10000)] == [2, 2, 1]
+        assert [len(batch) for batch in pack_requests(images, max_images=20, max_bytes=1000)] == [2, 2, 1]
+    finally:
+        shutil.rmtree(test_dir)
+
+def test_image_batch_truncation():
+    from types import SimpleNamespace
+    from PIL import Image
+    from tools import analyze_image
+
+    class FakeMessages:
+        def __init__(self):
+            self.calls = []
+
+        def create(self, model, max_tokens, messages):
+            numbers = [block["text"] for block in messages[0]["content"]
+                       if block["type"] == "text" and block["text"].startswith("Image ")]
+            self.calls.append(len(numbers) or 1)
+            if not numbers:
+                return SimpleNamespace(content=[SimpleNamespace(text="single answer")], stop_reason="end_turn")
+            # Runs out of tokens in the middle of the answer for the second image
+            text = "## Image 1\nfirst answer\n## Image 2\nsecond ans"
+            return SimpleNamespace(content=[SimpleNamespace(text=text)], stop_reason="max_tokens")
+
+    test_dir = tempfile.mkdtemp()
+    saved = analyze_image._client, analyze_image._image_cache, analyze_image._answer_cache
+    try:
+        fake = FakeMessages()
+        analyze_image._client = SimpleNamespace(messages=fake)
+        analyze_image._image_cache = analyze_image.ImageCache(os.path.join(test_dir, "cache"))
+        analyze_image._answer_cache = analyze_image.AnswerCache(16)
+        paths = []
+        for i, color in enumerate(["red", "green", "blue"]):
+            paths.append(os.path.join(test_dir, f"{color}.png"))
+            Image.new("RGB", (64, 64), color).save(paths[-1])
+
+        result = analyze_image.analyze_images(paths, "What color is this?")
+        print("Image batch truncation test result:", result)
+        answers = [entry["result"] for entry in result["result"]]
+        # The cut-off answer is dropped and its image asked again with the unanswered ones
+        assert fake.calls == [3, 2, 1] and result["requests"] == 3
+        assert answers == ["first answer", "first answer", "single answer"]
+        assert all("error" not in entry and "truncated" not in entry for entry in result["result"])
+    finally:
+        analyze_image._client, analyze_image._image_cache, analyze_image._answer_cache = saved
+        shutil.rmtree(test_dir)
+
+def test_stl_viewer():
+    import numpy as np
+    from tools.stl_viewer import read_stl
+
+    test_dir = tempfile.mkdtemp()
+    try:
+        # Unit cube, 12 triangles, as binary and ASCII STL
+        corners = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float32)
+        faces = [[0, 2, 1], [1, 2, 3], [4, 5, 6], [5, 7, 6], [0, 1, 4], [1, 5, 4],
+                 [2, 6, 3], [3, 6, 7], [0, 4, 2], [2, 4, 6], [1, 3, 5], [3, 7, 5]]
+        triangles = corners[faces]
+        records = np.zeros(len(triangles), dtype=[("normal", "<f4", 3), ("vertices", "<f4", (3, 3)), ("attr", "<u2")])
+        records["vertices"] = triangles
+        binary_path = os.path.join(test_dir, "cube.stl")
+        with open(binary_path, "wb") as f:
+            f.write(b"solid cube".ljust(80) + np.uint32(len(triangles)).tobytes() + records.tobytes())
+        ascii_path = os.path.join(test_dir, "cube_ascii.stl")
+        with open(ascii_path, "w") as f:
+            f.write("solid cube\n")
+            for triangle in triangles:
+                f.write("facet normal 0 0 0\nouter loop\n")
+                f.write("".join(f"vertex {x} {y} {z}\n" for x, y, z in triangle))
+                f.write("endloop\nendfacet\n")
+            f.write("endsolid cube\n")
+        assert np.array_equal(read_stl(ascii_path), read_stl(binary_path))
+
+        result = handle_tool_call({
+            "name": "view_stl",
+            "input": {"stl_path": binary_path}
+        })
+        print("STL viewer test result:", result)
+        stats = result["result"]["stats"]
+        assert stats["triangles"] == 12 and abs(stats["volume"] - 1) < 1e-6 and abs(stats["surface_area"] - 6) < 1e-6
+        assert result["result"]["levels"] == [{"triangles": 12, "vertices": 8}]
+        assert os.path.exists(result["result"]["viewer_path"])
+
+        # Same content again: the preview is reused
+        result = handle_tool_call({
+            "name": "view_stl",
+            "input": {"stl_path": binary_path}
+        })
+        assert result["result"]["cached"]
+
+        # Test error case
+        result = handle_tool_call({
+            "name": "view_stl",
+            "input": {"stl_path": os.path.join(test_dir, "missing.stl")}
+        })
+        print("STL viewer error test result:", result)
+        assert "error" in result
+    finally:
+        shutil.rmtree(test_dir)
+
 def test_file_writer():
     test_file = "test_output/test_file.txt"
     test_dir = os.path.dirname(test_file)
@@ -99,6 +518,81 @@ def test_file_writer():
     })
     print("File writer append test result:", result)
 
+    # Test search-and-replace edit
+    result = handle_tool_call({
+        "name": "file_writer",
+        "input": {
+            "mode": "replace",
+            "path": test_file,
+            "edits": [{"old": "Second line", "new": "Second line, edited"}]
+        }
+    })
+    print("File writer replace test result:", result)
+    with open(test_file) as f:
+        assert f.read() == "Hello, World!\nSecond line, edited\n"
+
+    # Test unified diff patch
+    result = handle_tool_call({
+        "name": "file_writer",
+        "input": {
+            "mode": "patch",
+            "path": test_file,
+            "patch": "@@ -1,2 +1,3 @@\n Hello, World!\n+Inserted line\n Second line, edited\n"
+        }
+    })
+    print("File writer patch test result:", result)
+    with open(test_file) as f:
+        assert f.read() == "Hello, World!\nInserted line\nSecond line, edited\n"
+
+    # Test a multi-hunk patch without context (diff -U0), with insertion-only hunks
+    import difflib
+    lines_file = os.path.join(test_dir, "lines.txt")
+    old_lines = [f"line{i}\n" for i in range(1, 31)]
+    new_lines = old_lines[:5] + ["INS1\n", "INS2\n"] + old_lines[5:20] + ["INS3\n"] + old_lines[20:]
+    with open(lines_file, "w") as f:
+        f.writelines(old_lines)
+    result = handle_tool_call({
+        "name": "file_writer",
+        "input": {
+            "mode": "patch",
+            "path": lines_file,
+            "patch": "".join(difflib.unified_diff(old_lines, new_lines, n=0))
+        }
+    })
+    print("File writer -U0 patch test result:", result)
+    with open(lines_file) as f:
+        assert f.readlines() == new_lines
+    os.remove(lines_file)
+
+    # Test batch - one failing edit leaves every file unchanged
+    other_file = os.path.join(test_dir, "other.txt")
+    result = handle_tool_call({
+        "name": "file_writer",
+        "input": {
+            "mode": "batch",
+            "operations": [
+                {"mode": "write", "path": other_file, "content": "Other\n"},
+                {"mode": "replace", "path": test_file, "edits": [{"old": "Missing", "new": "x"}]}
+            ]
+        }
+    })
+    print("File writer batch error test result:", result)
+    assert "error" in result and not os.path.exists(other_file)
+
+    result = handle_tool_call({
+        "name": "file_writer",
+        "input": {
+            "mode": "batch",
+            "operations": [
+                {"mode": "write", "path": other_file, "content": "Other\n"},
+                {"mode": "replace", "path": test_file, "edits": [{"old": "Inserted line\n", "new": ""}]}
+            ]
+        }
+    })
+    print("File writer batch test result:", result)
+    assert len(result["files"]) == 2
+    os.remove(other_file)
+
     # Test error case - invalid path
     result = handle_tool_call({
         "name": "file_writer",
@@ -120,6 +614,13 @@ if __name__ == "__main__":
     test_weather()
     test_calculator()
     test_file_search()
+    test_file_index()
+    test_content_search()
     test_selenium_browser()
     test_python_executor()
+    test_file_reader()
+    test_command_runner()
+    test_image_preprocessing()
+    test_image_batch_truncation()
+    test_stl_viewer()
     test_file_writer()
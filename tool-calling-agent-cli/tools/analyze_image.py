@@ -1,8 +1,17 @@
 import base64
+import glob
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import anthropic
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 from dynaconf import Dynaconf
+from PIL import Image, ImageOps
 
 # Load configuration
 settings = Dynaconf(
@@ -10,10 +19,37 @@ settings = Dynaconf(
     environments=True
 )
 
+# Used for keys missing from the image_analysis section of config/settings.yaml.
+# Images are scaled to what the API actually looks at: larger ones are downscaled
+# server-side anyway, so sending more pixels only adds upload time and latency.
+DEFAULTS = {
+    "model": None,  # None: the main model from settings
+    "max_tokens": 1024,
+    "max_edge": 1568,
+    "max_megapixels": 1.15,
+    "jpeg_quality": 85,
+    "png_max_colors": 4096,  # images with at most this many colors are sent as PNG
+    "cache_dir": "temp/image_cache",
+    "answer_cache_size": 256,
+    # Batch mode: several images per request, several requests at a time
+    "batch_max_images": 20,  # images per request
+    "batch_max_mb": 20,  # base64 image payload per request (the API limit is 32 MB per request)
+    "batch_max_tokens": 8192,  # max_tokens per image, up to this much per request
+    "batch_max_files": 100,
+    "batch_concurrency": 4,
+    "encode_workers": 8,
+}
+
+# Headings the model is asked to start each per-image answer with in a batch request
+_ANSWER_HEADING = re.compile(r"^#{1,6}\s*Image\s+(\d+)\b[^\n]*\n?", re.MULTILINE | re.IGNORECASE)
+
 # Tool Specification
 TOOL_SPEC = {
     "name": "analyze_img_with_claude",
-    "description": "Analyzes an image using Claude Vision API and returns a summary based on the user's request",
+    "description": "Analyzes an image using Claude Vision API and returns a summary based on the user's request. "
+                   "To analyze several images in one call, give image_paths or a glob pattern instead of "
+                   "image_path; the request is answered for each image separately and one result is "
+                   "returned per image.",
     "input_schema": {
         "type": "object",
         "properties": {
@@ -21,73 +57,436 @@ TOOL_SPEC = {
                 "type": "string",
                 "description": "Path to the image file to analyze"
             },
+            "image_paths": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Paths of several images to analyze"
+            },
+            "pattern": {
+                "type": "string",
+                "description": "Glob pattern of images to analyze, e.g. 'screenshots/*.png' ('**' matches subdirectories)"
+            },
             "request": {
                 "type": "string",
-                "description": "What to analyze or describe about the image"
+                "description": "What to analyze or describe about the image (about each image in batch mode)"
             }
         },
-        "required": ["image_path", "request"]
+        "required": ["request"]
     }
 }
 
-def analyze_img_with_claude(image_path: str, request: str) -> Dict[str, Any]:
+
+def image_settings() -> Dict[str, Any]:
+    options = dict(DEFAULTS)
+    configured = settings.get("image_analysis") or {}
+    options.update({key.lower(): value for key, value in dict(configured).items()})
+    if not options["model"]:
+        options["model"] = settings.model
+    return options
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _target_size(width: int, height: int, max_edge: int, max_megapixels: float):
+    scale = min(1.0, max_edge / max(width, height), (max_megapixels * 1_000_000 / (width * height)) ** 0.5)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def encode_image(data: bytes, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Downscale an image to the API's effective resolution and re-encode it
+
+    Images with transparency or few colors (screenshots, diagrams, text) stay
+    lossless PNG, which is compact for flat colors and keeps small text sharp;
+    photos and other many-color images go out as JPEG.
+
+    Returns:
+        Dict[str, Any]: {"data": encoded bytes, "media_type", "width", "height"}
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)  # also loads only the first frame of animations
+        size = _target_size(image.width, image.height, options["max_edge"], options["max_megapixels"])
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+        output = io.BytesIO()
+        if has_alpha or image.getcolors(int(options["png_max_colors"])) is not None:
+            image.save(output, format="PNG")
+            media_type = "image/png"
+        else:
+            image.convert("RGB").save(output, format="JPEG", quality=int(options["jpeg_quality"]), optimize=True)
+            media_type = "image/jpeg"
+        return {"data": output.getvalue(), "media_type": media_type, "width": size[0], "height": size[1]}
+
+
+class ImageCache:
+    """
+    Encoded images by source file content, in memory and on disk.
+
+    The file hash is remembered per (path, size, mtime), so an unchanged file is
+    not read again; encodings are stored under temp/image_cache by content hash
+    and encoding options, so they survive restarts and are shared between copies.
+    """
+
+    def __init__(self, cache_dir: str, memory_items: int = 32):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self._hashes: Dict[tuple, str] = {}
+        self._encoded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def file_hash(self, path: Path) -> str:
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._hashes:
+                return self._hashes[key]
+        digest = _file_hash(path)
+        with self._lock:
+            self._hashes[key] = digest
+        return digest
+
+    def get(self, path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Prepared image for a file
+
+        Returns:
+            Dict[str, Any]: {"hash", "base64", "media_type", "width", "height", "original_bytes", "sent_bytes"}
+        """
+        digest = self.file_hash(path)
+        params = f"{options['max_edge']}-{options['max_megapixels']}-{options['jpeg_quality']}-{options['png_max_colors']}"
+        key = hashlib.sha256(f"{digest}-{params}".encode()).hexdigest()[:32]
+        with self._lock:
+            if key in self._encoded:
+                self._encoded.move_to_end(key)
+                return self._encoded[key]
+
+        prepared = self._load(key)
+        if prepared is None:
+            encoded = encode_image(path.read_bytes(), options)
+            prepared = {"media_type": encoded["media_type"], "width": encoded["width"],
+                        "height": encoded["height"], "data": encoded["data"]}
+            self._store(key, prepared)
+        prepared = {
+            "hash": digest,
+            "base64": base64.b64encode(prepared["data"]).decode("utf-8"),
+            "media_type": prepared["media_type"],
+            "width": prepared["width"],
+            "height": prepared["height"],
+            "original_bytes": path.stat().st_size,
+            "sent_bytes": len(prepared["data"]),
+        }
+        with self._lock:
+            self._encoded[key] = prepared
+            while len(self._encoded) > self.memory_items:
+                self._encoded.popitem(last=False)
+        return prepared
+
+    def _path(self, key: str, media_type: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{media_type.split('/')[1]}")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        for media_type in ("image/png", "image/jpeg"):
+            path = self._path(key, media_type)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                with Image.open(io.BytesIO(data)) as image:
+                    width, height = image.size
+                return {"media_type": media_type, "width": width, "height": height, "data": data}
+        return None
+
+    def _store(self, key: str, prepared: Dict[str, Any]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key, prepared["media_type"])
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(prepared["data"])
+        os.replace(temp_path, path)
+
+
+class AnswerCache:
+    """Answers by (image hash, model, request), least recently used first out"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._answers: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            if key in self._answers:
+                self._answers.move_to_end(key)
+                return self._answers[key]
+        return None
+
+    def put(self, key: tuple, answer: str) -> None:
+        with self._lock:
+            self._answers[key] = answer
+            while len(self._answers) > self.size:
+                self._answers.popitem(last=False)
+
+
+_client = None
+_client_lock = threading.Lock()
+_image_cache = None
+_answer_cache = None
+
+
+def get_client() -> anthropic.Anthropic:
+    """Shared Anthropic client, so its HTTP connection pool is reused between calls"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        return _client
+
+
+def get_caches(options: Dict[str, Any]):
+    global _image_cache, _answer_cache
+    with _client_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache(options["cache_dir"])
+            _answer_cache = AnswerCache(int(options["answer_cache_size"]))
+        return _image_cache, _answer_cache
+
+
+def prepare_image(image_path: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Downscaled, re-encoded image for the API, from the cache when the file is unchanged
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    options = options or image_settings()
+    path = Path(image_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+    image_cache, _ = get_caches(options)
+    return image_cache.get(path, options)
+
+
+def image_block(prepared: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": prepared["media_type"],
+            "data": prepared["base64"],
+        },
+    }
+
+
+def _details(prepared: Dict[str, Any], cached_answer: bool) -> Dict[str, Any]:
+    details = {key: prepared[key] for key in ("width", "height", "media_type", "original_bytes", "sent_bytes")}
+    return {**details, "cached_answer": cached_answer}
+
+
+def ask(prepared: List[Dict[str, Any]], request: str,
+        options: Dict[str, Any]) -> Tuple[List[Optional[str]], bool]:
+    """
+    Send one request with one or more images
+
+    With several images, each is labelled and the model is asked to answer under
+    an "## Image <n>" heading per image, so the answer can be split up again.
+
+    When the response stops at max_tokens, the section it was writing is cut
+    off and is dropped like a missing one.
+
+    Returns:
+        Tuple[List[Optional[str]], bool]: (answer per image, None where the response had no
+            complete section for it; whether the response stopped at max_tokens)
+    """
+    if len(prepared) == 1:
+        content = [image_block(prepared[0]), {"type": "text", "text": request}]
+        max_tokens = options["max_tokens"]
+    else:
+        content = []
+        for number, item in enumerate(prepared, 1):
+            content.append({"type": "text", "text": f"Image {number}:"})
+            content.append(image_block(item))
+        content.append({"type": "text", "text": (
+            f"{request}\n\nAnswer this separately for each of the {len(prepared)} images above, in order. "
+            f"Start each answer with a heading line of the form '## Image <number>' and do not refer to "
+            f"the other images in it.")})
+        max_tokens = min(int(options["max_tokens"]) * len(prepared), int(options["batch_max_tokens"]))
+
+    message = get_client().messages.create(
+        model=options["model"],
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": content}],
+    )
+    text = message.content[0].text
+    truncated = message.stop_reason == "max_tokens"
+    if len(prepared) == 1:
+        return [text], truncated
+
+    answers: List[Optional[str]] = [None] * len(prepared)
+    headings = list(_ANSWER_HEADING.finditer(text))
+    complete = headings[:-1] if truncated else headings  # the last section was cut off
+    for heading, following in zip(complete, headings[1:] + [None]):
+        number = int(heading.group(1))
+        if 1 <= number <= len(prepared) and answers[number - 1] is None:
+            answers[number - 1] = text[heading.end():following.start() if following else len(text)].strip()
+    return answers, truncated
+
+
+def pack_requests(prepared: List[Dict[str, Any]], max_images: int, max_bytes: int) -> List[List[Dict[str, Any]]]:
+    """Split images, in order, into requests of at most max_images images and max_bytes of base64 data"""
+    batches, batch, size = [], [], 0
+    for item in prepared:
+        item_bytes = len(item["base64"])
+        if batch and (len(batch) >= max_images or size + item_bytes > max_bytes):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(item)
+        size += item_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def analyze_images(image_paths: List[str], request: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Answer the same request about each of several images
+
+    Images are encoded in parallel, cached answers are reused, and the rest are
+    packed into as few requests as the payload budget allows, which are sent
+    batch_concurrency at a time. Images a response has no complete answer for
+    (it stopped at max_tokens, or skipped them) are sent again in follow-up
+    requests; if a round answers none of them, they are sent one per request.
+
+    Returns:
+        Dict[str, Any]: {"result": [{"image_path", "result" or "error", "image"}, ...], "requests": requests sent}
+            A "truncated": True entry was cut off at max_tokens and is not cached
+    """
+    options = options or image_settings()
+    _, answer_cache = get_caches(options)
+
+    def prepare(path):
+        try:
+            return prepare_image(path, options)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=int(options["encode_workers"])) as pool:
+        prepared = list(pool.map(prepare, image_paths))
+
+    results: List[Dict[str, Any]] = []
+    pending = []
+    for path, item in zip(image_paths, prepared):
+        if isinstance(item, Exception):
+            results.append({"image_path": path, "error": str(item)})
+            continue
+        cached = answer_cache.get((item["hash"], options["model"], request.strip()))
+        if cached is not None:
+            results.append({"image_path": path, "result": cached, "image": _details(item, True)})
+        else:
+            results.append({"image_path": path, "image": _details(item, False)})
+            pending.append({**item, "index": len(results) - 1})
+
+    def send(batch):
+        try:
+            return ask(batch, request, options)
+        except Exception as e:
+            return e
+
+    max_images = int(options["batch_max_images"])
+    max_bytes = int(float(options["batch_max_mb"]) * 1024 * 1024)
+    requests = 0
+    with ThreadPoolExecutor(max_workers=int(options["batch_concurrency"])) as pool:
+        while pending:
+            batches = pack_requests(pending, max_images, max_bytes)
+            requests += len(batches)
+            unanswered = []
+            for batch, reply in zip(batches, pool.map(send, batches)):
+                if isinstance(reply, Exception):
+                    for item in batch:
+                        results[item["index"]]["error"] = str(reply)
+                    continue
+                answers, truncated = reply
+                for item, answer in zip(batch, answers):
+                    if answer is None:
+                        unanswered.append(item)
+                    elif truncated and len(batch) == 1:
+                        results[item["index"]].update(result=answer, truncated=True)
+                    else:
+                        results[item["index"]]["result"] = answer
+                        answer_cache.put((item["hash"], options["model"], request.strip()), answer)
+            if len(unanswered) == len(pending):
+                max_images = 1  # no progress; a single image always gets an answer
+            pending = unanswered
+
+    return {"result": results, "requests": requests}
+
+
+def expand_image_paths(image_paths: Optional[List[str]], pattern: Optional[str], limit: int) -> List[str]:
+    paths = list(image_paths or [])
+    if pattern:
+        paths.extend(path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        raise ValueError(f"No images match {pattern!r}" if pattern else "image_paths is empty")
+    if len(paths) > limit:
+        raise ValueError(f"{len(paths)} images given, the limit is {limit}; narrow the pattern or split the call")
+    return paths
+
+
+def analyze_img_with_claude(image_path: Optional[str] = None, request: str = "",
+                            image_paths: Optional[List[str]] = None, pattern: Optional[str] = None) -> Dict[str, Any]:
     """
     Analyzes an image using Claude Vision API based on the user's request.
-    
+
+    The image is downscaled to the API's effective resolution and re-encoded before
+    upload; encodings are cached by file content, and answers by (image, request).
+    With image_paths or pattern, the request is answered for each image, several
+    images per API request.
+
     Args:
         image_path (str): Path to the image file
         request (str): What to analyze or describe about the image
-        
+        image_paths (List[str]): Paths of several images (batch mode)
+        pattern (str): Glob pattern of images (batch mode)
+
     Returns:
         Dict: Result dictionary containing either:
-            - Success case: {"result": "Claude's analysis"}
+            - Success case: {"result": "Claude's analysis", "image": size and cache details},
+              plus "truncated": True if the answer was cut off at max_tokens
+            - Batch mode: {"result": [{"image_path", "result" or "error", "image"}, ...], "requests": n}
             - Error case: {"error": "error message"}
     """
     try:
-        # Verify file exists and is an image
-        path = Path(image_path)
-        if not path.exists():
-            return {"error": f"Image file not found: {image_path}"}
-            
-        # Read and encode image
-        with open(path, "rb") as img_file:
-            image_data = base64.b64encode(img_file.read()).decode("utf-8")
-            
-        # Determine media type based on file extension
-        media_type = f"image/{path.suffix[1:].lower()}"
-        if media_type == "image/jpg":
-            media_type = "image/jpeg"
-            
-        # Initialize Anthropic client
-        client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
-        
-        # Create message with image analysis request
-        message = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": image_data,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": request
-                        }
-                    ],
-                }
-            ],
-        )
-        
-        # Return Claude's analysis
-        return {"result": message.content[0].text}
-        
+        options = image_settings()
+        if image_paths or pattern:
+            paths = expand_image_paths(image_paths, pattern, int(options["batch_max_files"]))
+            return analyze_images(paths, request, options)
+        if not image_path:
+            return {"error": "image_path, image_paths or pattern is required"}
+
+        try:
+            prepared = prepare_image(image_path, options)
+        except FileNotFoundError as e:
+            return {"error": str(e)}
+
+        _, answer_cache = get_caches(options)
+        key = (prepared["hash"], options["model"], request.strip())
+        cached = answer_cache.get(key)
+        if cached is not None:
+            return {"result": cached, "image": _details(prepared, True)}
+
+        answers, truncated = ask([prepared], request, options)
+        if truncated:
+            # cut off at max_tokens: returned, but not cached as the answer to this request
+            return {"result": answers[0], "truncated": True, "image": _details(prepared, False)}
+        answer_cache.put(key, answers[0])
+        return {"result": answers[0], "image": _details(prepared, False)}
+
     except Exception as e:
         return {"error": str(e)}
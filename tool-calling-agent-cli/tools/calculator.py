@@ -1,58 +1,385 @@
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
+import ast
+import math
+import operator
+import numpy as np
+
+# Largest array an expression may create, and the most elements returned per result
+MAX_ARRAY_SIZE = 10_000_000
+MAX_RESULT_ITEMS = 1000
+# Largest exact integer an operation may produce (about 600,000 digits). Python ints have
+# arbitrary precision, so unbounded ((7**9999)**9999)**9999 or comb(2*10**6, 10**6) would run for hours
+MAX_INT_BITS = 2_000_000
+# Longer integer results are returned as an approximation (json refuses ints over 4300 digits)
+MAX_RESULT_DIGITS = 1000
 
 # Tool specification
 TOOL_SPEC = {
     "name": "calculate",
-    "description": "Perform mathematical calculations",
+    "description": "Evaluate math expressions safely, e.g. 'sqrt(2) * sin(pi / 4)' or 'mean(x) + 2 * std(x)'. "
+                   "Supports + - * / // % ** @, comparisons, math functions, and NumPy array and statistics "
+                   "functions (sum, mean, median, std, var, percentile, min, max, cumsum, dot, linspace, ...) "
+                   "applied element-wise to arrays. Arrays can be written inline ([1, 2, 3]), passed in "
+                   "`variables`, or loaded from CSV/NPY files with `files`. Use `expressions` to evaluate many "
+                   "expressions in one call; 'name = expression' stores a result for later expressions. "
+                   "The older operation/numbers form (add, subtract, multiply, divide) is still accepted.",
     "input_schema": {
         "type": "object",
         "properties": {
+            "expression": {
+                "type": "string",
+                "description": "A single expression to evaluate"
+            },
+            "expressions": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Expressions or 'name = expression' assignments, evaluated in order"
+            },
+            "variables": {
+                "type": "object",
+                "description": "Named numbers or arrays (nested lists) usable in the expressions"
+            },
+            "files": {
+                "type": "object",
+                "description": "Named CSV (comma-separated, optional header row) or .npy files to load as arrays, "
+                               "e.g. {\"data\": \"results.csv\"}; columns are data[:, 0], data[:, 1], ..."
+            },
             "operation": {
                 "type": "string",
-                "description": "The mathematical operation to perform (add, subtract, multiply, divide)",
+                "description": "Legacy form: the mathematical operation to perform (add, subtract, multiply, divide)",
                 "enum": ["add", "subtract", "multiply", "divide"]
             },
             "numbers": {
                 "type": "array",
                 "items": {"type": "number"},
-                "description": "List of numbers to perform the operation on",
+                "description": "Legacy form: list of numbers to perform the operation on",
                 "minItems": 2
             }
-        },
-        "required": ["operation", "numbers"]
+        }
     }
 }
 
-def calculate(operation: str, numbers: List[float]) -> Dict:
+_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf, "nan": math.nan}
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_bits(bits: float) -> None:
+    if bits > MAX_INT_BITS:
+        raise ValueError(f"Result too large for exact integer arithmetic (about {bits / math.log2(10):.3g} digits), "
+                         f"use floats")
+
+
+def _numeric_array(value: Any) -> np.ndarray:
+    """
+    np.asarray for user arrays. Integers beyond int64 would make an object array of Python
+    ints, which no size check covers ([10**30] ** 10**6), so those arrays are converted to floats.
+    """
+    array = np.asarray(value)
+    if array.dtype != object:
+        return array
+    for dtype in (np.float64, np.complex128):
+        try:
+            return array.astype(dtype)
+        except OverflowError:
+            raise ValueError("Array element too large for a float (limit about 1.8e308)")
+        except (TypeError, ValueError):
+            continue
+    raise ValueError("Arrays can only contain numbers")
+
+
+def _sized(function):
+    """
+    Wrap an array constructor taking a shape, so it cannot allocate more than MAX_ARRAY_SIZE elements.
+    Arrays grown by broadcasting in operators are checked in Evaluator._check_operands.
     """
-    Perform mathematical calculations
-    
+    def wrapper(shape, *args, **kwargs):
+        if np.prod(shape) > MAX_ARRAY_SIZE:
+            raise ValueError(f"Array too large (limit {MAX_ARRAY_SIZE} elements)")
+        return function(shape, *args, **kwargs)
+    return wrapper
+
+
+def _factorial(n):
+    n = int(n)
+    if n > 2:
+        _check_bits(n * math.log2(n))
+    return math.factorial(n)
+
+
+def _comb(n, k):
+    if _is_int(n) and _is_int(k) and n > 2:
+        _check_bits(max(0, min(k, n - k)) * math.log2(n))
+    return math.comb(n, k)
+
+
+def _perm(n, k=None):
+    if _is_int(n) and n > 2:
+        _check_bits(max(0, min(n if k is None else k, n)) * math.log2(n))
+    return math.perm(n, k)
+
+
+def _arange(*args):
+    start, stop, step = (0, args[0], 1) if len(args) == 1 else (args + (1,))[:3]
+    if step == 0 or (stop - start) / step > MAX_ARRAY_SIZE:
+        raise ValueError(f"Array too large (limit {MAX_ARRAY_SIZE} elements)")
+    return np.arange(start, stop, step)
+
+
+def _linspace(start, stop, num=50):
+    if num > MAX_ARRAY_SIZE:
+        raise ValueError(f"Array too large (limit {MAX_ARRAY_SIZE} elements)")
+    return np.linspace(start, stop, int(num))
+
+
+def _log(x, base=None):
+    return np.log(x) if base is None else np.log(x) / np.log(base)
+
+
+FUNCTIONS = {
+    # Element-wise math
+    "abs": np.abs, "sqrt": np.sqrt, "cbrt": np.cbrt, "exp": np.exp, "log": _log, "ln": np.log,
+    "log10": np.log10, "log2": np.log2, "sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin,
+    "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2, "sinh": np.sinh, "cosh": np.cosh,
+    "tanh": np.tanh, "degrees": np.degrees, "radians": np.radians, "hypot": np.hypot, "floor": np.floor,
+    "ceil": np.ceil, "round": np.round, "sign": np.sign, "clip": np.clip, "where": np.where,
+    # Integer math (exact, scalars)
+    "factorial": _factorial, "comb": _comb, "perm": _perm, "gcd": math.gcd, "lcm": math.lcm,
+    "isqrt": math.isqrt,
+    # Reductions and statistics
+    "sum": np.sum, "prod": np.prod, "mean": np.mean, "median": np.median, "std": np.std, "var": np.var,
+    "min": np.min, "max": np.max, "argmin": np.argmin, "argmax": np.argmax, "percentile": np.percentile,
+    "quantile": np.quantile, "count_nonzero": np.count_nonzero, "any": np.any, "all": np.all,
+    "corrcoef": np.corrcoef, "cov": np.cov, "len": len,
+    # Array operations
+    "array": _numeric_array, "cumsum": np.cumsum, "cumprod": np.cumprod, "diff": np.diff, "sort": np.sort,
+    "unique": np.unique, "dot": np.dot, "cross": np.cross, "norm": np.linalg.norm, "transpose": np.transpose,
+    "reshape": np.reshape, "concatenate": np.concatenate, "arange": _arange, "linspace": _linspace,
+    "zeros": _sized(np.zeros), "ones": _sized(np.ones), "inv": np.linalg.inv, "det": np.linalg.det,
+    "solve": np.linalg.solve, "polyfit": np.polyfit, "polyval": np.polyval, "interp": np.interp,
+    "histogram": np.histogram,
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow, ast.MatMult: operator.matmul,
+}
+_UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_}
+_COMPARISONS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+
+
+class Evaluator:
+    """
+    Evaluates arithmetic expressions by walking their AST. Only the node types
+    and functions listed here are accepted: no attribute access, imports,
+    comprehensions or calls to anything outside FUNCTIONS.
+    """
+
+    def __init__(self, variables: Optional[Dict[str, Any]] = None):
+        self.variables = dict(variables or {})
+
+    def evaluate(self, source: str) -> Any:
+        """
+        Evaluate an expression, or a 'name = expression' assignment (which also stores the value)
+
+        Raises:
+            ValueError: For syntax the evaluator does not allow, unknown names and oversized results
+        """
+        tree = ast.parse(source.strip(), mode="exec")
+        if len(tree.body) != 1:
+            raise ValueError("Expected a single expression")
+        statement = tree.body[0]
+        if isinstance(statement, ast.Assign):
+            if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Name):
+                raise ValueError("Only 'name = expression' assignments are allowed")
+            name = statement.targets[0].id
+            if name in FUNCTIONS or name in _CONSTANTS:
+                raise ValueError(f"Cannot assign to built-in name '{name}'")
+            value = self._eval(statement.value)
+            self.variables[name] = value
+            return value
+        if isinstance(statement, ast.Expr):
+            return self._eval(statement.value)
+        raise ValueError(f"Unsupported statement: {type(statement).__name__}")
+
+    def _eval(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, (int, float, complex, bool)):
+                return node.value
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return self.variables[node.id]
+            if node.id in _CONSTANTS:
+                return _CONSTANTS[node.id]
+            raise ValueError(f"Unknown name: {node.id}")
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            left, right = self._eval(node.left), self._eval(node.right)
+            self._check_operands(node.op, left, right)
+            return _BINARY_OPERATORS[type(node.op)](left, right)
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            operand = self._eval(node.operand)
+            if isinstance(node.op, ast.Not) and isinstance(operand, np.ndarray):
+                return np.logical_not(operand)
+            return _UNARY_OPERATORS[type(node.op)](operand)
+        if isinstance(node, ast.Compare):
+            left, result = self._eval(node.left), True
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in _COMPARISONS:
+                    raise ValueError(f"Unsupported comparison: {type(op).__name__}")
+                right = self._eval(comparator)
+                self._check_operands(op, left, right)
+                result = np.logical_and(result, _COMPARISONS[type(op)](left, right))
+                left = right
+            return result
+        if isinstance(node, ast.IfExp):
+            return self._eval(node.body) if self._eval(node.test) else self._eval(node.orelse)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return _numeric_array([self._eval(element) for element in node.elts])
+        if isinstance(node, ast.Subscript):
+            return self._eval(node.value)[self._index(node.slice)]
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                name = node.func.id if isinstance(node.func, ast.Name) else ast.unparse(node.func)
+                raise ValueError(f"Unknown function: {name}")
+            args = [self._eval(arg) for arg in node.args]
+            kwargs = {kw.arg: self._eval(kw.value) for kw in node.keywords if kw.arg is not None}
+            return FUNCTIONS[node.func.id](*args, **kwargs)
+        raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+    def _index(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.Slice):
+            return slice(*(None if part is None else int(self._eval(part))
+                           for part in (node.lower, node.upper, node.step)))
+        if isinstance(node, ast.Tuple):
+            return tuple(self._index(element) for element in node.elts)
+        index = self._eval(node)
+        if isinstance(index, float) and index.is_integer():
+            return int(index)
+        return index
+
+    @staticmethod
+    def _check_operands(op: ast.AST, left: Any, right: Any) -> None:
+        """Refuse an operation whose result would be too large, before computing it"""
+        if _is_int(left) and _is_int(right):
+            if isinstance(op, ast.Pow) and right > 0 and abs(left) > 1:
+                _check_bits(right * math.log2(abs(left)))
+            elif isinstance(op, ast.Mult):
+                _check_bits(left.bit_length() + right.bit_length())
+        elif isinstance(left, np.ndarray) or isinstance(right, np.ndarray):
+            if any(isinstance(x, np.ndarray) and x.dtype == object for x in (left, right)):
+                raise ValueError("Arrays of Python objects are not supported, use numbers")
+            # Broadcasting can make the result much larger than either operand: zeros((10**4, 1)) * zeros(10**4)
+            if isinstance(op, ast.MatMult):
+                return
+            size = math.prod(np.broadcast_shapes(np.shape(left), np.shape(right)))
+            if size > MAX_ARRAY_SIZE:
+                raise ValueError(f"Array too large (limit {MAX_ARRAY_SIZE} elements)")
+
+
+def load_array(path: str) -> np.ndarray:
+    """Load a .npy file, or a comma-separated file with an optional header row"""
+    if path.lower().endswith(".npy"):
+        return np.load(path, allow_pickle=False)
+    data = np.genfromtxt(path, delimiter=",", dtype=float)
+    if data.ndim == 2 and np.isnan(data[0]).all():
+        data = data[1:]  # header row
+    elif data.ndim == 1 and data.size and np.isnan(data[0]):
+        data = data[1:]  # single column with a header
+    return data
+
+
+def to_json(value: Any) -> Any:
+    """Convert a result to plain Python values; long arrays are summarized"""
+    if isinstance(value, tuple):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.ndarray):
+        if value.size > MAX_RESULT_ITEMS:
+            flat = value.ravel()
+            return {"shape": list(value.shape), "first": to_json(flat[:10]), "last": to_json(flat[-10:]),
+                    "note": f"{value.size} elements, assign the array to a name and reduce it (sum, mean, ...)"}
+        return to_json(value.tolist()) if value.dtype.kind in "cO" else value.tolist()
+    if isinstance(value, list):
+        return [to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, complex):
+        return str(value)
+    if _is_int(value) and value.bit_length() > MAX_RESULT_DIGITS * math.log2(10):
+        exponent = math.log10(abs(value))
+        digits = int(exponent) + 1
+        mantissa = 10 ** (exponent - int(exponent))
+        return {"approximately": f"{'-' if value < 0 else ''}{mantissa:.9f}e+{int(exponent)}", "digits": digits,
+                "note": "exact integer with too many digits to return, shown in scientific notation"}
+    return value
+
+
+def _legacy(operation: str, numbers: List[float]) -> Dict:
+    if operation == "add":
+        return {"result": sum(numbers)}
+    if operation == "subtract":
+        return {"result": numbers[0] - sum(numbers[1:])}
+    if operation == "multiply":
+        return {"result": math.prod(numbers)}
+    if operation == "divide":
+        result = numbers[0]
+        for num in numbers[1:]:
+            if num == 0:
+                return {"error": "Division by zero"}
+            result /= num
+        return {"result": result}
+    return {"error": f"Unknown operation: {operation}"}
+
+
+def calculate(expression: Optional[str] = None, expressions: Optional[List[str]] = None,
+              variables: Optional[Dict[str, Any]] = None, files: Optional[Dict[str, str]] = None,
+              operation: Optional[str] = None, numbers: Optional[List[float]] = None) -> Dict:
+    """
+    Evaluate math expressions
+
     Args:
-        operation (str): Operation to perform (add, subtract, multiply, divide)
-        numbers (List[float]): Numbers to operate on
-        
+        expression (str): A single expression
+        expressions (List[str]): Expressions or assignments, evaluated in order with shared variables
+        variables (Dict[str, Any]): Named numbers or nested lists
+        files (Dict[str, str]): Named CSV or .npy files to load as arrays
+        operation (str): Legacy operation (add, subtract, multiply, divide)
+        numbers (List[float]): Legacy operands
+
     Returns:
-        Dict: Result of calculation or error message
+        Dict: Result of calculation or error message. For `expressions`, the result is a list
+            with {"expression", "result"} or {"expression", "error"} per expression
     """
     try:
-        if operation == "add":
-            result = sum(numbers)
-        elif operation == "subtract":
-            result = numbers[0] - sum(numbers[1:])
-        elif operation == "multiply":
-            result = 1
-            for num in numbers:
-                result *= num
-        elif operation == "divide":
-            result = numbers[0]
-            for num in numbers[1:]:
-                if num == 0:
-                    return {"error": "Division by zero"}
-                result /= num
-        else:
-            return {"error": f"Unknown operation: {operation}"}
-            
-        return {"result": result}
-        
+        if expression is None and not expressions:
+            if operation is None:
+                return {"error": "Provide expression, expressions, or operation and numbers"}
+            return _legacy(operation, numbers or [])
+
+        scope = {}
+        for name, value in (variables or {}).items():
+            scope[name] = _numeric_array(value) if isinstance(value, list) else value
+        for name, path in (files or {}).items():
+            scope[name] = load_array(path)
+        evaluator = Evaluator(scope)
+
+        with np.errstate(all="ignore"):
+            if expression is not None and not expressions:
+                return {"result": to_json(evaluator.evaluate(expression))}
+
+            results = []
+            for source in ([expression] if expression is not None else []) + list(expressions):
+                try:
+                    results.append({"expression": source, "result": to_json(evaluator.evaluate(source))})
+                except Exception as e:
+                    results.append({"expression": source, "error": f"{type(e).__name__}: {str(e)}"})
+            return {"result": results}
+
+    except ZeroDivisionError:
+        return {"error": "Division by zero"}
     except Exception as e:
         return {"error": str(e)}
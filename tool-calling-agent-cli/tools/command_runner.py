@@ -1,70 +1,382 @@
 import subprocess
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import itertools
+import os
+import re
+import shlex
+import signal
 import sys
+import threading
+import time
+from dynaconf import Dynaconf
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits
+    resource = None
+
+# Load configuration
+settings = Dynaconf(
+    settings_files=['config/settings.yaml', 'config/secrets.yaml'],
+    environments=True
+)
+
+# Used when config/settings.yaml has no command_runner section
+DEFAULT_POLICY = {
+    "approval": "prompt",
+    "allow": [r"^(ls|pwd|echo|cat|head|tail|wc|du|df|which|whoami|date|uname)\b",
+              r"^(grep|rg|find|sort|uniq|diff)\b",
+              r"^git (status|log|diff|show|branch)\b",
+              r"^(python|python3|pip) (--version|-V|list|show)\b"],
+    "deny": [r"\bsudo\b", r"\brm\s+-[a-zA-Z]*[rf][a-zA-Z]*\s+(/|~)(\s|$)", r"\bmkfs\b", r"\bdd\s+if=",
+             r"\b(shutdown|reboot|halt|poweroff)\b", r":\(\)\s*\{"],
+    "timeout_seconds": 120,
+    "cpu_seconds": 60,
+    "memory_mb": 2048,
+    "output_buffer_kb": 256,
+    "max_jobs": 4,
+    "wait_seconds": 30,
+}
+
+# Shell syntax that can chain, substitute or redirect; such commands are never approved automatically
+_SHELL_SYNTAX = re.compile(r"`|\$\(|[<>]")
+_SEGMENT_SEPARATORS = re.compile(r"\|\||&&|[;|&\n]")
+
+# Options that make an allowlisted command write files or run other programs; a command
+# using one is never approved automatically. Short options also match inside clusters
+# ("sort -uo out") and with attached values ("sort -oout").
+_UNSAFE_OPTIONS = {
+    "find": ("-exec", "-execdir", "-ok", "-okdir", "-delete", "-fprint", "-fprint0", "-fprintf", "-fls"),
+    "sort": ("-o", "--output", "--compress-program"),
+    "git": ("--output", "--ext-diff", "--textconv", "-c", "--exec-path"),
+    "rg": ("--pre",),
+    "date": ("-s", "--set"),
+}
+# git branch only lists branches when given no names and none of these
+_GIT_BRANCH_CHANGES = ("-d", "-D", "-m", "-M", "-c", "-C", "-f", "-u", "--delete", "--move", "--copy",
+                       "--force", "--set-upstream-to", "--unset-upstream", "--edit-description", "--track")
 
 TOOL_SPEC = {
     "name": "command_runner",
-    "description": "Executes command line commands with user confirmation. Shows command output in real-time.",
+    "description": "Runs shell commands as jobs. Commands are checked against an allow/deny policy; commands "
+                   "outside the allowlist need confirmation on the terminal or are refused. 'run' waits up to "
+                   "wait_seconds and returns the output (or a job id if still running); 'start' returns a job "
+                   "id at once; 'poll' returns new output of a job since an offset; 'kill' stops a job; 'list' "
+                   "shows jobs. Jobs have CPU, memory and wall-clock limits, and only the last part of long "
+                   "output is kept.",
     "input_schema": {
         "type": "object",
         "properties": {
+            "action": {
+                "type": "string",
+                "enum": ["run", "start", "poll", "kill", "list"],
+                "description": "What to do",
+                "default": "run"
+            },
             "command": {
                 "type": "string",
-                "description": "The command to execute"
+                "description": "The command to execute ('run' and 'start')"
+            },
+            "job_id": {
+                "type": "integer",
+                "description": "Job to poll or kill"
+            },
+            "since": {
+                "type": "integer",
+                "description": "'poll': output byte offset returned by the previous call, to get only new output",
+                "default": 0
+            },
+            "wait_seconds": {
+                "type": "number",
+                "description": "'run' and 'poll': how long to wait for the job to finish before returning"
+            },
+            "timeout_seconds": {
+                "type": "number",
+                "description": "Kill the job after this many seconds (capped by the policy)"
+            },
+            "cwd": {
+                "type": "string",
+                "description": "Working directory for the command"
             }
-        },
-        "required": ["command"]
+        }
     }
 }
 
-def command_runner(command: str) -> Dict[str, Any]:
+
+def load_policy() -> Dict[str, Any]:
+    policy = dict(DEFAULT_POLICY)
+    configured = settings.get("command_runner") or {}
+    policy.update({key.lower(): value for key, value in dict(configured).items()})
+    return policy
+
+
+def _has_option(argv: List[str], option: str) -> bool:
+    for arg in argv:
+        if arg == "--":
+            return False
+        if arg == option or (option.startswith("--") and arg.startswith(option + "=")):
+            return True
+        # Short option: in a cluster of single-letter options, or with its value attached
+        if len(option) == 2 and re.fullmatch(r"-[a-zA-Z]+", arg) and option[1] in arg[1:]:
+            return True
+    return False
+
+
+def unsafe_argument(segment: str) -> Optional[str]:
     """
-    Executes a command line command after user confirmation.
-    Streams the output in real-time.
-    
-    Args:
-        command (str): The command to execute
-        
+    Check one command of a pipeline for arguments that write files or run programs
+
     Returns:
-        Dict: Result dictionary containing either:
-            - Success case: {"result": "Command executed successfully"}
-            - Error case: {"error": "error message"}
+        Optional[str]: None if there are none, otherwise what was found
     """
     try:
-        # Show command and ask for confirmation
+        argv = shlex.split(segment)
+    except ValueError:
+        return "command cannot be parsed"
+    if not argv:
+        return None
+    name = os.path.basename(argv[0])
+    for option in _UNSAFE_OPTIONS.get(name, ()):
+        if _has_option(argv[1:], option):
+            return f"{name} {option}"
+    operands = [arg for arg in argv[1:] if not arg.startswith("-")]
+    if name == "uniq" and len(operands) > 1:
+        return "uniq with an output file"
+    if name == "git" and len(argv) > 1 and argv[1] == "branch":
+        if operands[1:] or any(_has_option(argv[2:], option) for option in _GIT_BRANCH_CHANGES):
+            return "git branch that changes branches"
+    return None
+
+
+def check_policy(command: str, policy: Dict[str, Any]) -> Optional[str]:
+    """
+    Decide whether a command may run
+
+    Returns:
+        Optional[str]: None if it may run, otherwise the reason it may not
+    """
+    for pattern in policy.get("deny") or []:
+        if re.search(pattern, command):
+            return f"Command matches deny pattern {pattern!r}"
+    segments = [segment.strip() for segment in _SEGMENT_SEPARATORS.split(command) if segment.strip()]
+    allowed = bool(segments) and not _SHELL_SYNTAX.search(command) and all(
+        any(re.search(pattern, segment) for pattern in policy.get("allow") or [])
+        and unsafe_argument(segment) is None for segment in segments)
+    if allowed:
+        return None
+    if policy.get("approval") == "prompt" and sys.stdin is not None and sys.stdin.isatty():
         print(f"\nCommand to execute: {command}")
-        confirmation = input("Execute this command? (y/n): ")
-        
-        if confirmation.lower() != 'y':
-            return {"result": "Command execution cancelled by user"}
-        
-        # Execute command with real-time output
-        process = subprocess.Popen(
+        if input("Execute this command? (y/n): ").strip().lower() == "y":
+            return None
+        return "Command execution cancelled by user"
+    return "Command is not in the allowlist and cannot be confirmed interactively"
+
+
+def _limit_resources(cpu_seconds: Optional[int], memory_mb: Optional[int]):
+    def apply():
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds) + 5))
+        if memory_mb:
+            limit = int(memory_mb) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return apply
+
+
+class OutputBuffer:
+    """
+    Ring buffer of the last `capacity` bytes of a job's output. Offsets count every
+    byte ever written, so a poller can ask for what is new since its last call.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = bytearray()
+        self._start = 0  # absolute offset of _data[0]
+        self._lock = threading.Lock()
+
+    def write(self, chunk: bytes) -> None:
+        with self._lock:
+            self._data += chunk
+            excess = len(self._data) - self.capacity
+            if excess > 0:
+                del self._data[:excess]
+                self._start += excess
+
+    @property
+    def end(self) -> int:
+        return self._start + len(self._data)
+
+    def read(self, since: int = 0) -> Dict[str, Any]:
+        with self._lock:
+            start = max(since, self._start)
+            data = bytes(self._data[start - self._start:])
+            return {"output": data.decode("utf-8", errors="replace"), "offset": self._start + len(self._data),
+                    "dropped_bytes": max(0, self._start - since)}
+
+
+class Job:
+    def __init__(self, job_id: int, command: str, cwd: Optional[str], policy: Dict[str, Any],
+                 timeout_seconds: float):
+        self.id = job_id
+        self.command = command
+        self.status = "running"
+        self.exit_code = None
+        self.started = time.monotonic()
+        self.ended = None
+        self.output = OutputBuffer(int(policy["output_buffer_kb"]) * 1024)
+        self._done = threading.Event()
+        self.process = subprocess.Popen(
             command,
             shell=True,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            start_new_session=True,  # own process group, so the whole pipeline can be killed
+            preexec_fn=_limit_resources(policy.get("cpu_seconds"), policy.get("memory_mb")) if resource else None,
         )
-        
-        # Stream output in real-time
-        output = []
+        self._timer = threading.Timer(timeout_seconds, self.kill, kwargs={"status": "timeout"})
+        self._timer.daemon = True
+        self._timer.start()
+        threading.Thread(target=self._pump, name=f"command-job-{job_id}", daemon=True).start()
+
+    def _pump(self) -> None:
+        fd = self.process.stdout.fileno()
         while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
+            chunk = os.read(fd, 65536)
+            if not chunk:
                 break
-            if line:
-                print(line.rstrip())
-                output.append(line)
-                
-        return_code = process.wait()
-        
-        if return_code == 0:
-            return {"result": "Command executed successfully", "output": "".join(output)}
-        else:
-            return {"error": f"Command failed with return code {return_code}", "output": "".join(output)}
-            
+            self.output.write(chunk)
+        self.process.stdout.close()
+        self.exit_code = self.process.wait()
+        self._timer.cancel()
+        self.ended = time.monotonic()
+        if self.status == "running":
+            self.status = "exited"
+        self._done.set()
+
+    def kill(self, status: str = "killed") -> None:
+        if self._done.is_set():
+            return
+        self.status = status
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            self.process.kill()
+
+    def wait(self, seconds: float) -> bool:
+        return self._done.wait(seconds)
+
+    @property
+    def running(self) -> bool:
+        return not self._done.is_set()
+
+    def info(self, since: int = 0) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "elapsed_seconds": round((self.ended or time.monotonic()) - self.started, 3),
+            **self.output.read(since),
+        }
+
+
+class JobManager:
+    """Runs commands as background jobs, at most `max_jobs` at a time; keeps the last 50 finished ones"""
+
+    def __init__(self):
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, command: str, cwd: Optional[str], policy: Dict[str, Any],
+              timeout_seconds: Optional[float]) -> Job:
+        timeout = min(float(timeout_seconds or policy["timeout_seconds"]), float(policy["timeout_seconds"]))
+        with self._lock:
+            running = [job for job in self._jobs.values() if job.running]
+            if len(running) >= int(policy["max_jobs"]):
+                raise RuntimeError(f"{len(running)} jobs already running (limit {policy['max_jobs']}), "
+                                   f"poll or kill one first")
+            finished = [job_id for job_id, job in self._jobs.items() if not job.running]
+            for job_id in finished[:-50]:
+                del self._jobs[job_id]
+            job = Job(next(self._ids), command, cwd, policy, timeout)
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id: int) -> Job:
+        if job_id not in self._jobs:
+            raise ValueError(f"Unknown job: {job_id}")
+        return self._jobs[job_id]
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{key: value for key, value in job.info(job.output.end).items() if key != "output"}
+                for job in list(self._jobs.values())]
+
+
+jobs = JobManager()
+
+
+def command_runner(command: Optional[str] = None, action: str = "run", job_id: Optional[int] = None,
+                   since: int = 0, wait_seconds: Optional[float] = None, timeout_seconds: Optional[float] = None,
+                   cwd: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs commands as jobs, after checking them against the policy in config/settings.yaml.
+
+    Args:
+        command (str): The command to execute ('run' and 'start')
+        action (str): 'run', 'start', 'poll', 'kill' or 'list'
+        job_id (int): Job to poll or kill
+        since (int): Output offset from the previous poll
+        wait_seconds (float): How long 'run' and 'poll' wait for the job to finish
+        timeout_seconds (float): Kill the job after this long (capped by the policy)
+        cwd (str): Working directory
+
+    Returns:
+        Dict: Result dictionary containing either:
+            - Success case: {"result": {"job_id", "status", "exit_code", "output", "offset", ...}}
+            - Error case: {"error": "error message"}, with the job fields if the command failed
+    """
+    try:
+        policy = load_policy()
+
+        if action in ("run", "start"):
+            if not command:
+                return {"error": "command is required"}
+            refusal = check_policy(command, policy)
+            if refusal:
+                return {"error": refusal}
+            job = jobs.start(command, cwd, policy, timeout_seconds)
+            if action == "start":
+                return {"result": job.info()}
+            job.wait(float(policy["wait_seconds"] if wait_seconds is None else wait_seconds))
+            info = job.info()
+            if job.running:
+                info["note"] = f"Still running, poll job {job.id} with since={info['offset']}"
+                return {"result": info}
+            if job.status == "timeout":
+                return {"error": f"Command timed out after {info['elapsed_seconds']:.0f} seconds", **info}
+            if job.exit_code != 0:
+                return {"error": f"Command failed with return code {job.exit_code}", **info}
+            return {"result": info}
+
+        if action == "poll":
+            job = jobs.get(job_id)
+            if wait_seconds:
+                job.wait(float(wait_seconds))
+            return {"result": job.info(since)}
+
+        if action == "kill":
+            job = jobs.get(job_id)
+            job.kill()
+            job.wait(5)
+            return {"result": job.info(since)}
+
+        if action == "list":
+            return {"result": jobs.list()}
+
+        return {"error": f"Unknown action: {action}"}
+
     except Exception as e:
         return {"error": str(e)}
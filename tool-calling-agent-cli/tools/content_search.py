@@ -0,0 +1,264 @@
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
+import re
+import threading
+
+from tools.file_search import iter_files
+
+# Longest line excerpt returned; longer lines (minified code, data) are cut around the match
+MAX_LINE_CHARS = 240
+
+TOOL_SPEC = {
+    "name": "search_content",
+    "description": "Search file contents for a regular expression (like grep) and return the best matching lines "
+                   "with a few lines of context, instead of reading whole files. Skips binary files, .git, "
+                   "node_modules, virtualenvs and paths ignored by .gitignore. Stops once max_results matches "
+                   "were found.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "path": {
+                "type": "string",
+                "description": "File or directory to search"
+            },
+            "query": {
+                "type": "string",
+                "description": "Regular expression (Python syntax) or, with fixed_string, a literal string"
+            },
+            "patterns": {
+                "type": "string",
+                "description": "Semicolon-separated list of file extensions to search (e.g. 'py;md'), '*' for all files",
+                "default": "*"
+            },
+            "fixed_string": {
+                "type": "boolean",
+                "description": "Treat the query as a literal string",
+                "default": False
+            },
+            "case_sensitive": {
+                "type": "boolean",
+                "description": "Match case exactly",
+                "default": True
+            },
+            "context_lines": {
+                "type": "integer",
+                "description": "Lines of context to return before and after each match",
+                "default": 2
+            },
+            "max_results": {
+                "type": "integer",
+                "description": "Stop after this many matches in total",
+                "default": 50
+            },
+            "max_matches_per_file": {
+                "type": "integer",
+                "description": "Matches to keep per file, so one file cannot use up the whole budget",
+                "default": 5
+            }
+        },
+        "required": ["path", "query"]
+    }
+}
+
+
+def _count_lines(data, start: int, end: int, chunk: int = 1 << 20) -> int:
+    """Newlines in data[start:end], read in chunks (mmap has no count() before Python 3.13)"""
+    count = 0
+    for position in range(start, end, chunk):
+        count += data[position:min(position + chunk, end)].count(b"\n")
+    return count
+
+
+def _line_bounds(data, start: int, end: int):
+    """Start and end offsets of the line(s) containing data[start:end]"""
+    line_start = data.rfind(b"\n", 0, start) + 1
+    line_end = data.find(b"\n", end)
+    return line_start, len(data) if line_end == -1 else line_end
+
+
+def _decode(line: bytes, column: Optional[int] = None) -> str:
+    text = line.rstrip(b"\r").decode("utf-8", errors="replace")
+    if len(text) <= MAX_LINE_CHARS:
+        return text
+    if column is None:
+        return text[:MAX_LINE_CHARS] + "..."
+    start = max(0, min(column - MAX_LINE_CHARS // 3, len(text) - MAX_LINE_CHARS))
+    return ("..." if start else "") + text[start:start + MAX_LINE_CHARS] + ("..." if start + MAX_LINE_CHARS < len(text) else "")
+
+
+def _context(data, line_start: int, line_end: int, count: int):
+    before, after = [], []
+    position = line_start
+    for _ in range(count):
+        if position == 0:
+            break
+        previous = data.rfind(b"\n", 0, position - 1) + 1
+        before.insert(0, _decode(data[previous:position - 1]))
+        position = previous
+    position = line_end
+    for _ in range(count):
+        if position + 1 >= len(data):  # no line after a trailing newline
+            break
+        following = data.find(b"\n", position + 1)
+        following = len(data) if following == -1 else following
+        after.append(_decode(data[position + 1:following]))
+        position = following
+    return before, after
+
+
+def _score(data, match, query_bytes: Optional[bytes]) -> float:
+    """Whole-word and exact-case matches rank above partial and case-folded ones"""
+    score = 1.0
+    start, end = match.start(), match.end()
+    before = data[start - 1:start] if start else b""
+    after = data[end:end + 1]
+    if not (before.isalnum() or before == b"_") and not (after.isalnum() or after == b"_"):
+        score += 1.0
+    if query_bytes is not None and match.group() == query_bytes:
+        score += 0.5
+    return score
+
+
+def search_file(path: str, regex: "re.Pattern", context_lines: int = 2, max_matches: int = 5,
+                query_bytes: Optional[bytes] = None, stop: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+    """
+    Search one file with a bytes regex. Large files are memory-mapped, so only the
+    pages around matches are read; binary files (NUL byte near the start) are skipped.
+
+    Args:
+        path (str): File to search
+        regex (re.Pattern): Compiled bytes pattern, with re.MULTILINE
+        context_lines (int): Lines of context around each match
+        max_matches (int): Stop after this many matches in the file
+        query_bytes (bytes): Literal query, to rank exact-case matches higher
+        stop (threading.Event): Abandon the file when set
+
+    Returns:
+        Dict[str, Any]: {"path", "score", "matches": [{"line", "byte_offset", "text", "before", "after"}]},
+            or None if nothing matched
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return None
+            if b"\0" in f.read(8192):
+                return None
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        matches = []
+        score = 0.0
+        line_number, counted_to = 1, 0
+        for match in regex.finditer(data):
+            if stop is not None and stop.is_set():
+                break
+            line_start, line_end = _line_bounds(data, match.start(), match.end())
+            if matches and line_start <= matches[-1]["byte_offset"] <= line_end:
+                continue  # one entry per line
+            line_number += _count_lines(data, counted_to, line_start)
+            counted_to = line_start
+            first_line_end = data.find(b"\n", line_start, line_end)
+            first_line_end = line_end if first_line_end == -1 else first_line_end
+            column = len(data[line_start:match.start()].decode("utf-8", errors="replace"))
+            before, after = _context(data, line_start, line_end, context_lines)
+            matches.append({
+                "line": line_number,
+                "byte_offset": match.start(),
+                "text": _decode(data[line_start:first_line_end], column),
+                "before": before,
+                "after": after,
+            })
+            score += _score(data, match, query_bytes)
+            if len(matches) >= max_matches:
+                break
+        if not matches:
+            return None
+        return {"path": path, "score": score, "matches": matches}
+    finally:
+        data.close()
+
+
+def search_content(path: str, query: str, patterns: str = "*", fixed_string: bool = False,
+                   case_sensitive: bool = True, context_lines: int = 2, max_results: int = 50,
+                   max_matches_per_file: int = 5, workers: int = 8) -> Dict[str, Any]:
+    """
+    Search file contents for a regular expression or literal string.
+
+    Files are searched in parallel by `workers` threads. The search stops as soon
+    as `max_results` matches were collected, so the ranking covers the files
+    searched until then. Files are ranked by score: one point per matching
+    line, plus one for whole-word and a half for exact-case matches.
+
+    Args:
+        path (str): File or directory to search
+        query (str): Regular expression, or literal string with fixed_string
+        patterns (str): Semicolon-separated file extensions, '*' for all files
+        fixed_string (bool): Treat the query as a literal string
+        case_sensitive (bool): Match case exactly
+        context_lines (int): Lines of context before and after each match
+        max_results (int): Total match budget
+        max_matches_per_file (int): Match budget per file
+        workers (int): Number of search threads
+
+    Returns:
+        Dict[str, Any]: Result dictionary containing either:
+            - Success: {"result": [file results, best first], "files_searched": int, "truncated": bool}
+            - Error: {"error": error message}
+    """
+    try:
+        if not query:
+            return {"error": "Query must not be empty"}
+        flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+        query_bytes = query.encode("utf-8")
+        regex = re.compile(re.escape(query_bytes) if fixed_string else query_bytes, flags)
+        if regex.search(b""):
+            return {"error": "Query matches the empty string"}
+
+        if os.path.isfile(path):
+            files = iter([path])
+        elif os.path.isdir(path):
+            files = iter_files(path, patterns)
+        else:
+            return {"error": f"Path not found: {path}"}
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        results: List[Dict[str, Any]] = []
+        total = [0, 0]  # matches, files searched
+
+        def search(file_path):
+            if stop.is_set():
+                return
+            found = search_file(file_path, regex, context_lines, max_matches_per_file,
+                                query_bytes if not case_sensitive else None, stop)
+            with lock:
+                total[1] += 1
+                if found is None or stop.is_set():
+                    return
+                found["matches"] = found["matches"][:max_results - total[0]]
+                total[0] += len(found["matches"])
+                results.append(found)
+                if total[0] >= max_results:
+                    stop.set()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = []
+            for file_path in files:
+                if stop.is_set():
+                    break
+                futures.append(pool.submit(search, file_path))
+        for future in futures:
+            future.result()  # re-raise unexpected errors from the search threads
+
+        results.sort(key=lambda r: (-r["score"], r["path"]))
+        return {"result": results, "files_searched": total[1], "truncated": stop.is_set()}
+
+    except re.error as e:
+        return {"error": f"Invalid regular expression: {str(e)}"}
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,513 @@
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from tools.file_search import GitIgnore, _scan_directory, exclude_sets, iter_files
+
+# Files larger than this are listed but their contents are not indexed
+MAX_CONTENT_BYTES = 1_000_000
+
+# Index database files, one per indexed root directory
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "temp", "file_index")
+
+TOOL_SPEC = {
+    "name": "query_file_index",
+    "description": "Look up files by name or search file contents using a persistent index of a directory tree. "
+                   "Much faster than walking the disk when the same tree is searched repeatedly. The index is "
+                   "updated incrementally before each query (only changed directories are listed again and only "
+                   "files whose size or modification time changed are re-read). "
+                   "Skips .git, node_modules, virtualenvs and paths ignored by .gitignore.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "directory": {
+                "type": "string",
+                "description": "Root directory of the index"
+            },
+            "action": {
+                "type": "string",
+                "description": "'find' to match file names or relative paths against a glob, 'grep' to find lines "
+                               "containing a substring, 'stats' to describe the index, 'refresh' to update it now",
+                "enum": ["find", "grep", "stats", "refresh"],
+                "default": "find"
+            },
+            "query": {
+                "type": "string",
+                "description": "For 'find': glob matched against the file name, or against the relative path if it "
+                               "contains '/' (e.g. '*config*', 'src/*/test_*.py'). For 'grep': literal substring"
+            },
+            "patterns": {
+                "type": "string",
+                "description": "Semicolon-separated list of file extensions to restrict the query to (e.g. 'py;md'), "
+                               "'*' for all files",
+                "default": "*"
+            },
+            "case_sensitive": {
+                "type": "boolean",
+                "description": "For 'grep': match case exactly",
+                "default": False
+            },
+            "max_results": {
+                "type": "integer",
+                "description": "Maximum number of paths or matching lines to return",
+                "default": 100
+            }
+        },
+        "required": ["directory"]
+    }
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_indexed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_files_name ON files(name);
+CREATE INDEX IF NOT EXISTS idx_files_extension ON files(extension);
+CREATE VIRTUAL TABLE IF NOT EXISTS contents USING fts5(body, tokenize='trigram');
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+def _extension(name: str) -> str:
+    return os.path.splitext(name)[1].lstrip(".").lower()
+
+
+def _glob_escape(text: str) -> str:
+    return "".join(f"[{c}]" if c in "*?[" else c for c in text)
+
+
+def _read_text(path: str, size: int) -> Optional[str]:
+    """File contents for the content index, None for large or binary files"""
+    if size > MAX_CONTENT_BYTES:
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read(MAX_CONTENT_BYTES + 1)
+    except OSError:
+        return None
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class FileIndex:
+    """
+    SQLite index of one directory tree: path, size, mtime and extension of every
+    file, plus an optional trigram full-text index of file contents.
+
+    The tree is walked with file_search.iter_files, so the same directories are
+    pruned and .gitignore rules apply. A refresh only stats files and re-reads
+    the ones whose size or mtime changed.
+
+    The mtime of every directory is stored too: a file added, removed or renamed
+    changes the mtime of its directory, so before a query update() only stats
+    the directories and lists again the ones that changed, instead of walking
+    the tree. Contents edited in place do not change directory mtimes, so grep
+    and stats also stat the indexed files. A changed .gitignore falls back to a
+    full refresh. The check runs at most every `max_age_seconds`;
+    start_watcher() keeps the index fresh from a background thread instead.
+    """
+
+    def __init__(self, root: str, db_path: Optional[str] = None, index_content: bool = False,
+                 max_age_seconds: float = 0.0):
+        self.root = os.path.abspath(root)
+        if not os.path.isdir(self.root):
+            raise NotADirectoryError(f"Not a directory: {root}")
+        if db_path is None:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            db_path = os.path.join(INDEX_DIR, f"{digest}.sqlite")
+        self.db_path = db_path
+        self.index_content = index_content
+        self.max_age_seconds = max_age_seconds
+        self.refreshed_at = None
+        self.checked_at = None
+        self.last_refresh = {}
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # From an earlier run: the first query only checks what changed since
+        self._dirs = {os.path.normpath(os.path.join(self.root, path)): mtime
+                      for path, mtime in self._conn.execute("SELECT path, mtime_ns FROM dirs")}
+
+    def refresh(self) -> Dict[str, Any]:
+        """
+        Bring the index up to date with the disk by walking the whole tree
+
+        Returns:
+            Dict[str, Any]: Counts of added, updated, removed and unchanged files and the time taken
+        """
+        with self._lock:
+            start = time.perf_counter()
+            counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+            directories: Dict[str, int] = {}
+            with self._conn:
+                self._sync(iter_files(self.root, "*", directories=directories), self._known(), counts)
+                self._conn.execute("DELETE FROM dirs")
+                self._conn.executemany("INSERT INTO dirs (path, mtime_ns) VALUES (?, ?)",
+                                       [(self._relative(path), mtime) for path, mtime in directories.items()])
+            self._dirs = directories
+            counts["seconds"] = round(time.perf_counter() - start, 3)
+            self.refreshed_at = self.checked_at = time.monotonic()
+            self.last_refresh = counts
+            return counts
+
+    def update(self, check_files: bool = False) -> Dict[str, Any]:
+        """
+        Bring the index up to date without walking the tree: list again only the
+        directories whose mtime changed, and walk the new ones
+
+        Args:
+            check_files (bool): Also stat every indexed file, to catch contents edited in place
+
+        Returns:
+            Dict[str, Any]: Counts as for refresh(), plus the number of directories listed
+        """
+        with self._lock:
+            if not self._dirs:
+                return self.refresh()
+            start = time.perf_counter()
+            changed = []
+            for directory, mtime in self._dirs.items():
+                try:
+                    current = os.stat(directory).st_mtime_ns
+                except OSError:
+                    current = None
+                if current != mtime:
+                    changed.append(directory)
+            if self._gitignore_changed(changed):
+                return self.refresh()
+
+            counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "directories_listed": 0}
+            with self._conn:
+                queue = []
+                for directory in changed:
+                    if os.path.isdir(directory):
+                        queue.append((directory, self._ignore_for(directory)))
+                    else:
+                        self._remove_directory(directory, counts)
+                while queue:
+                    directory, ignore = queue.pop()
+                    for subdir, sub_ignore in self._list_directory(directory, ignore, counts):
+                        if subdir not in self._dirs:
+                            queue.append((subdir, sub_ignore))
+                if check_files:
+                    self._check_files(counts)
+            counts["seconds"] = round(time.perf_counter() - start, 3)
+            self.checked_at = time.monotonic()
+            if counts["added"] or counts["updated"] or counts["removed"]:
+                self.last_refresh = counts
+            return counts
+
+    def _relative(self, path: str) -> str:
+        prefix = self.root.rstrip(os.sep) + os.sep
+        if path.startswith(prefix):
+            return path[len(prefix):].replace(os.sep, "/")
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _known(self, where: str = "", args: Tuple = ()) -> Dict[str, Tuple[int, int, int, int]]:
+        return {path: (file_id, size, mtime_ns, content_indexed) for file_id, path, size, mtime_ns, content_indexed
+                in self._conn.execute(f"SELECT id, path, size, mtime_ns, content_indexed FROM files {where}", args)}
+
+    def _sync(self, paths: Iterable[str], known: Dict[str, Tuple[int, int, int, int]], counts: Dict[str, int]) -> None:
+        """
+        Make the rows in `known`, those of the part of the tree that was listed,
+        match the files found there. Runs inside a transaction.
+        """
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            relative = self._relative(path)
+            entry = known.pop(relative, None)
+            if entry is not None:
+                file_id, size, mtime_ns, content_indexed = entry
+                if size == stat.st_size and mtime_ns == stat.st_mtime_ns and (
+                        content_indexed or not self.index_content):
+                    counts["unchanged"] += 1
+                    continue
+                self._conn.execute("DELETE FROM contents WHERE rowid = ?", (file_id,))
+                self._conn.execute("UPDATE files SET size = ?, mtime_ns = ?, content_indexed = 0 WHERE id = ?",
+                                   (stat.st_size, stat.st_mtime_ns, file_id))
+                counts["updated"] += 1
+            else:
+                name = os.path.basename(path)
+                file_id = self._conn.execute(
+                    "INSERT INTO files (path, name, extension, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                    (relative, name, _extension(name), stat.st_size, stat.st_mtime_ns)).lastrowid
+                counts["added"] += 1
+            if self.index_content:
+                text = _read_text(path, stat.st_size)
+                if text is not None:
+                    self._conn.execute("INSERT INTO contents (rowid, body) VALUES (?, ?)", (file_id, text))
+                # Also marks large and binary files, so they are not re-read on every refresh
+                self._conn.execute("UPDATE files SET content_indexed = 1 WHERE id = ?", (file_id,))
+        for file_id, _, _, _ in known.values():
+            self._conn.execute("DELETE FROM contents WHERE rowid = ?", (file_id,))
+            self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        counts["removed"] += len(known)
+
+    def _check_files(self, counts: Dict[str, int]) -> None:
+        """Stat every indexed file and re-read the ones that changed or whose contents are not indexed yet"""
+        stale = {}
+        for relative, entry in self._known().items():
+            _, size, mtime_ns, content_indexed = entry
+            try:
+                stat = os.stat(os.path.join(self.root, relative))
+            except OSError:
+                stale[relative] = entry
+                continue
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns or (self.index_content and not content_indexed):
+                stale[relative] = entry
+            else:
+                counts["unchanged"] += 1
+        self._sync([os.path.join(self.root, relative) for relative in stale], stale, counts)
+
+    def _gitignore_changed(self, changed_directories: List[str]) -> bool:
+        """Whether a .gitignore was edited, removed or added, which can change what is indexed anywhere below it"""
+        for path, size, mtime_ns in self._conn.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE name = '.gitignore'").fetchall():
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                return True
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                return True
+        for directory in changed_directories:
+            path = os.path.join(directory, ".gitignore")
+            if os.path.isfile(path) and not self._conn.execute(
+                    "SELECT 1 FROM files WHERE path = ?", (self._relative(path),)).fetchone():
+                return True
+        return False
+
+    def _ignore_for(self, directory: str) -> GitIgnore:
+        """The matcher iter_files would pass when listing `directory`: rules of the root and its parents down to here"""
+        ignore = GitIgnore.for_directory(self.root)
+        if directory == self.root:
+            return ignore
+        current = self.root
+        ignore = ignore.extend(current)
+        for part in self._relative(os.path.dirname(directory)).split("/"):
+            if part != ".":
+                current = os.path.join(current, part)
+                ignore = ignore.extend(current)
+        return ignore
+
+    def _list_directory(self, directory: str, ignore: GitIgnore, counts: Dict[str, int]) -> List[Tuple[str, GitIgnore]]:
+        """List one directory again and sync the files directly in it; returns its subdirectories"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns  # before listing, so a change during the listing is seen next time
+        except OSError:
+            self._remove_directory(directory, counts)
+            return []
+        files, subdirs = _scan_directory(directory, ignore, exclude_sets(), None, True)
+        prefix = "" if directory == self.root else _glob_escape(self._relative(directory)) + "/"
+        known = self._known("WHERE path GLOB ? AND path NOT GLOB ?", (prefix + "*", prefix + "*/*"))
+        self._sync(files, known, counts)
+        self._dirs[directory] = mtime
+        self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)",
+                           (self._relative(directory), mtime))
+        counts["directories_listed"] += 1
+        return subdirs
+
+    def _remove_directory(self, directory: str, counts: Dict[str, int]) -> None:
+        """Drop a directory that no longer exists, with everything that was indexed below it"""
+        relative = self._relative(directory)
+        self._sync([], self._known("WHERE path GLOB ?", (_glob_escape(relative) + "/*",)), counts)
+        for path in [path for path in self._dirs if path == directory or path.startswith(directory + os.sep)]:
+            del self._dirs[path]
+        self._conn.execute("DELETE FROM dirs WHERE path = ? OR path GLOB ?", (relative, _glob_escape(relative) + "/*"))
+
+    def ensure_fresh(self, check_files: bool = False) -> None:
+        """Update the index unless it was checked recently or the watcher keeps it up to date"""
+        if self._watcher is not None:
+            return
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.max_age_seconds:
+            self.update(check_files)
+
+    def enable_content(self) -> None:
+        """Start indexing file contents; the next update with check_files reads the files not indexed yet"""
+        if not self.index_content:
+            self.index_content = True
+            self.checked_at = None
+
+    def start_watcher(self, interval_seconds: float = 5.0) -> None:
+        """Update the index every `interval_seconds` from a daemon thread"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.update(check_files=self.index_content)
+                except Exception as e:
+                    print(f"[DEBUG] File index refresh failed for {self.root}: {str(e)}")
+
+        self.refresh()
+        self._watcher = threading.Thread(target=watch, name="file-index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def close(self) -> None:
+        self.stop_watcher()
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _extension_filter(extensions: Optional[List[str]]):
+        if not extensions:
+            return "", []
+        return f" AND f.extension IN ({', '.join('?' * len(extensions))})", list(extensions)
+
+    def find(self, pattern: str = "*", extensions: Optional[List[str]] = None, limit: int = 100) -> List[str]:
+        """
+        Files whose name (or relative path, if the pattern contains '/') matches a glob
+
+        Args:
+            pattern (str): Glob, case-sensitive like the file system
+            extensions (List[str]): Lowercase extensions without dot to restrict to, None for all
+            limit (int): Maximum number of paths
+
+        Returns:
+            List[str]: Matching paths, sorted
+        """
+        self.ensure_fresh()
+        column = "f.path" if "/" in pattern else "f.name"
+        ext_sql, ext_args = self._extension_filter(extensions)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT f.path FROM files f WHERE {column} GLOB ?{ext_sql} ORDER BY f.path LIMIT ?",
+                [pattern.lstrip("/"), *ext_args, limit]).fetchall()
+        return [os.path.join(self.root, path) for path, in rows]
+
+    def grep(self, text: str, extensions: Optional[List[str]] = None, case_sensitive: bool = False,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Lines containing a literal substring, answered from the content index
+
+        Args:
+            text (str): Substring to find
+            extensions (List[str]): Lowercase extensions without dot to restrict to, None for all
+            case_sensitive (bool): Match case exactly
+            limit (int): Maximum number of matching lines
+
+        Returns:
+            List[Dict[str, Any]]: {"path", "line" (1-based), "text"} per matching line
+        """
+        if not text:
+            raise ValueError("Search text must not be empty")
+        self.enable_content()
+        self.ensure_fresh(check_files=True)
+        ext_sql, ext_args = self._extension_filter(extensions)
+        if len(text) >= 3:
+            # The trigram tokenizer answers substring queries of 3+ characters from the index
+            where, args = "contents MATCH ?", ['"' + text.replace('"', '""') + '"']
+        else:
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where, args = "c.body LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
+        needle = text if case_sensitive else text.lower()
+        matches = []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT f.path, c.body FROM contents c JOIN files f ON f.id = c.rowid "
+                f"WHERE {where}{ext_sql} ORDER BY f.path", [*args, *ext_args])
+            for path, body in rows:
+                for number, line in enumerate(body.splitlines(), 1):
+                    if needle in (line if case_sensitive else line.lower()):
+                        matches.append({"path": os.path.join(self.root, path), "line": number, "text": line[:300]})
+                        if len(matches) >= limit:
+                            return matches
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        self.ensure_fresh(check_files=True)
+        with self._lock:
+            files, total_bytes, content_files = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(content_indexed), 0) FROM files").fetchone()
+            extensions = self._conn.execute(
+                "SELECT extension, COUNT(*) AS n FROM files GROUP BY extension ORDER BY n DESC LIMIT 10").fetchall()
+        return {
+            "root": self.root,
+            "files": files,
+            "total_bytes": total_bytes,
+            "content_indexed": self.index_content,
+            "content_indexed_files": content_files,
+            "top_extensions": {ext or "(none)": n for ext, n in extensions},
+            "last_refresh": self.last_refresh,
+        }
+
+
+# One index per root directory for the lifetime of the process
+_indexes: Dict[str, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(directory: str) -> FileIndex:
+    """The shared index of `directory`, created on first use"""
+    root = os.path.abspath(directory)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = FileIndex(root)
+        return _indexes[root]
+
+
+def query_file_index(directory: str, action: str = "find", query: str = "*", patterns: str = "*",
+                     case_sensitive: bool = False, max_results: int = 100) -> Dict[str, Any]:
+    """
+    Answer a file lookup or content search from the persistent index of a directory.
+
+    Args:
+        directory (str): Root directory of the index
+        action (str): 'find', 'grep', 'stats' or 'refresh'
+        query (str): Glob for 'find', substring for 'grep'
+        patterns (str): Semicolon-separated extensions to restrict to, '*' for all files
+        case_sensitive (bool): For 'grep', match case exactly
+        max_results (int): Maximum number of paths or lines to return
+
+    Returns:
+        Dict[str, Any]: Result dictionary containing either:
+            - Success: {"result": [...] or {...}, "truncated": bool}
+            - Error: {"error": error message}
+    """
+    try:
+        index = get_index(directory)
+        extensions = [p.strip().lower().lstrip(".") for p in patterns.split(";")]
+        extensions = None if "*" in extensions else extensions
+
+        if action == "refresh":
+            return {"result": index.refresh()}
+        if action == "stats":
+            return {"result": index.stats()}
+        if action == "find":
+            paths = index.find(query or "*", extensions, limit=max_results + 1)
+            return {"result": paths[:max_results], "truncated": len(paths) > max_results}
+        if action == "grep":
+            lines = index.grep(query, extensions, case_sensitive, limit=max_results + 1)
+            return {"result": lines[:max_results], "truncated": len(lines) > max_results}
+        return {"error": f"Unknown action: {action}"}
+
+    except Exception as e:
+        return {"error": str(e)}
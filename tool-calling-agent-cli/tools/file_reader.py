@@ -1,32 +1,381 @@
-from typing import Dict
+from typing import Dict, Any, Optional, Tuple
+from collections import deque
+import codecs
+import mmap
 import os
 
+# Most text returned by one call; larger ranges are cut at a line boundary and can be paged
+DEFAULT_MAX_BYTES = 64 * 1024
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+# Lines shown by tail mode and at each end in preview mode
+DEFAULT_PREVIEW_LINES = 20
+
+_CHUNK = 1 << 20
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+TOOL_SPEC = {
+    "name": "read_file",
+    "description": "Read a text file, or part of it. Returns at most max_bytes of text plus the file's size and "
+                   "line count, so large files can be paged with start_line/end_line or offset/length. "
+                   "mode 'tail' returns the last lines, 'preview' the first and last lines. Binary files are refused.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "path": {
+                "type": "string",
+                "description": "Path to the file to read"
+            },
+            "mode": {
+                "type": "string",
+                "description": "'range' for a line or byte range (the whole file if none given), 'tail' for the last "
+                               "`lines` lines, 'preview' for the first and last `lines` lines",
+                "enum": ["range", "tail", "preview"],
+                "default": "range"
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "First line to return (1-based) in range mode"
+            },
+            "end_line": {
+                "type": "integer",
+                "description": "Last line to return (inclusive) in range mode"
+            },
+            "offset": {
+                "type": "integer",
+                "description": "Byte offset to start at in range mode, instead of start_line"
+            },
+            "length": {
+                "type": "integer",
+                "description": "Number of bytes to return from offset"
+            },
+            "lines": {
+                "type": "integer",
+                "description": "Number of lines for tail and preview modes",
+                "default": DEFAULT_PREVIEW_LINES
+            },
+            "encoding": {
+                "type": "string",
+                "description": "Text encoding; detected from the byte order mark or UTF-8 if not given"
+            },
+            "max_bytes": {
+                "type": "integer",
+                "description": "Maximum bytes of text to return",
+                "default": DEFAULT_MAX_BYTES
+            }
+        },
+        "required": ["path"]
+    }
+}
+
+
+class BinaryFileError(ValueError):
+    """The file does not look like text"""
+    pass
+
+
+def detect_encoding(sample: bytes) -> Tuple[str, int]:
+    """
+    Guess the encoding of a file from its first bytes
+
+    Args:
+        sample (bytes): Start of the file
+
+    Returns:
+        Tuple[str, int]: (encoding, length of the byte order mark)
+
+    Raises:
+        BinaryFileError: If the sample contains NUL bytes or mostly control characters
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+    if b"\0" in sample:
+        raise BinaryFileError("File appears to be binary")
+    control = sum(1 for byte in sample if byte < 32 and byte not in b"\t\n\r\f\b\x1b")
+    if sample and control / len(sample) > 0.1:
+        raise BinaryFileError("File appears to be binary")
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still UTF-8
+        if e.reason != "unexpected end of data":
+            return "latin-1", 0
+    return "utf-8", 0
+
+
+def _count_newlines(data, start: int = 0, end: Optional[int] = None) -> int:
+    end = len(data) if end is None else end
+    return sum(data[position:min(position + _CHUNK, end)].count(b"\n") for position in range(start, end, _CHUNK))
+
+
+def _line_offset(data, line: int, start: int = 0) -> int:
+    """Byte offset where 1-based `line` starts, len(data) if the file has fewer lines"""
+    remaining = line - 1
+    position = start
+    while remaining > 0 and position < len(data):
+        chunk = data[position:position + _CHUNK]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            position += len(chunk)
+            continue
+        index = -1
+        for _ in range(remaining):
+            index = chunk.find(b"\n", index + 1)
+        return position + index + 1
+    return len(data) if remaining > 0 else position
+
+
+def _tail_offset(data, lines: int, floor: int = 0) -> int:
+    """Byte offset where the last `lines` lines start"""
+    position = len(data)
+    if position > floor and data[position - 1:position] == b"\n":
+        position -= 1  # the trailing newline does not start another line
+    for _ in range(lines):
+        position = data.rfind(b"\n", floor, position)
+        if position == -1:
+            return floor
+    return position + 1
+
+
 class FileReader:
+    """
+    Reads text files in pages. Files from MMAP_THRESHOLD up are memory-mapped and
+    only the requested range is decoded, so memory use does not grow with the file size.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, mmap_threshold: int = MMAP_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+
     def execute(self, arguments: Dict) -> Dict:
         """
         Read contents of a file
-        
+
         Arguments:
             path: str - Path to the file to read
-            
+            mode: str - 'range' (default), 'tail' or 'preview'
+            start_line, end_line: int - 1-based inclusive line range, range mode
+            offset, length: int - Byte range, range mode
+            lines: int - Lines for tail and preview modes
+            encoding: str - Text encoding, detected if not given
+            max_bytes: int - Maximum bytes of text to return
+
         Returns:
-            Dict containing the file contents or error message
+            Dict containing the content with size, total_lines, encoding, the returned
+            line or byte range and a truncated flag; or an error message
         """
         try:
             path = arguments.get("path")
-            
+
             if not path:
                 return {"error": "File path not specified"}
-                
+
             if not os.path.exists(path):
                 return {"error": f"File not found: {path}"}
-                
-            with open(path, 'r') as file:
-                content = file.read()
-                
-            return {
-                "content": content
-            }
-            
+
+            if os.path.isdir(path):
+                return {"error": f"Path is a directory: {path}"}
+
+            mode = arguments.get("mode") or "range"
+            if mode not in ("range", "tail", "preview"):
+                return {"error": f"Unknown mode: {mode}"}
+
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                sample = f.read(8192)
+                if arguments.get("encoding"):
+                    encoding, bom = arguments["encoding"], 0  # the codec handles a byte order mark itself
+                else:
+                    encoding, bom = detect_encoding(sample)
+                if codecs.lookup(encoding).name.startswith(("utf-16", "utf-32")):
+                    return self._read_wide(path, encoding, size, mode, arguments)
+                if size >= self.mmap_threshold:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    f.seek(0)
+                    data = f.read()
+
+            try:
+                result = self._read(data, bom, encoding, mode, arguments)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+            return {"path": path, "size": size, "encoding": encoding, **result}
+
         except Exception as e:
             return {"error": str(e)}
+
+    def _limit(self, arguments: Dict) -> int:
+        return max(1, int(arguments.get("max_bytes") or self.max_bytes))
+
+    def _read(self, data, bom: int, encoding: str, mode: str, arguments: Dict) -> Dict[str, Any]:
+        """Read from bytes or an mmap of an ASCII-compatible encoding"""
+        max_bytes = self._limit(arguments)
+        total_lines = _count_newlines(data, bom)
+        if len(data) > bom and data[-1:] != b"\n":
+            total_lines += 1
+
+        def decode(start, end):
+            return data[start:end].decode(encoding, errors="replace")
+
+        if mode == "tail" or mode == "preview":
+            lines = max(1, int(arguments.get("lines") or DEFAULT_PREVIEW_LINES))
+            if mode == "preview" and total_lines > 2 * lines:
+                head_end = _line_offset(data, lines + 1, bom)
+                tail_start = _tail_offset(data, lines, bom)
+                # Each end gets half the byte budget
+                head = decode(bom, min(head_end, bom + max_bytes // 2))
+                tail = decode(max(tail_start, len(data) - max_bytes // 2), len(data))
+                omitted = total_lines - 2 * lines
+                return {
+                    "content": f"{head}... [{omitted} lines omitted] ...\n{tail}",
+                    "total_lines": total_lines,
+                    "start_line": 1,
+                    "end_line": total_lines,
+                    "truncated": True,
+                }
+            start = bom if mode == "preview" else _tail_offset(data, lines, bom)
+            if len(data) - start > max_bytes:
+                # Over budget: start at the first full line within the last max_bytes
+                start = len(data) - max_bytes
+                if data[start - 1:start] != b"\n":
+                    next_line = data.find(b"\n", start)
+                    start = next_line + 1 if next_line != -1 and next_line + 1 < len(data) else start
+            returned_lines = _count_newlines(data, start) + (0 if data[-1:] == b"\n" else 1)
+            start_line = max(1, total_lines - returned_lines + 1)
+            return {
+                "content": decode(start, len(data)),
+                "total_lines": total_lines,
+                "start_line": start_line,
+                "end_line": total_lines,
+                "truncated": start > bom,
+            }
+
+        if arguments.get("offset") is not None:
+            offset = max(bom, int(arguments["offset"]))
+            if offset > len(data):
+                return {"error": f"offset {offset} is past the end of the file ({len(data)} bytes)"}
+            length = int(arguments.get("length") or max_bytes)
+            end = min(len(data), offset + min(length, max_bytes))
+            return {
+                "content": decode(offset, end),
+                "total_lines": total_lines,
+                "offset": offset,
+                "length": end - offset,
+                "next_offset": end if end < len(data) else None,
+                "truncated": end < len(data),
+            }
+
+        start_line = max(1, int(arguments.get("start_line") or 1))
+        end_line = arguments.get("end_line")
+        end_line = total_lines if end_line is None else min(int(end_line), total_lines)
+        start = _line_offset(data, start_line, bom)
+        end = _line_offset(data, end_line - start_line + 2, start) if end_line >= start_line else start
+        cut = end - start > max_bytes
+        if cut:
+            # Stop at the last full line that fits; a single huge line is cut mid-line
+            line_end = data.rfind(b"\n", start, start + max_bytes)
+            end = line_end + 1 if line_end != -1 else start + max_bytes
+            end_line = start_line + _count_newlines(data, start, end) - 1 if line_end != -1 else start_line
+        return {
+            "content": decode(start, end),
+            "total_lines": total_lines,
+            "start_line": start_line,
+            "end_line": end_line,
+            "next_line": end_line + 1 if end_line < total_lines else None,
+            "truncated": cut or end_line < total_lines or start_line > 1,
+        }
+
+    def _read_wide(self, path: str, encoding: str, size: int, mode: str, arguments: Dict) -> Dict[str, Any]:
+        """UTF-16/32 files cannot be split on b'\\n', so they are streamed line by line"""
+        if arguments.get("offset") is not None:
+            return {"error": f"Byte ranges are not supported for {encoding} files, use start_line/end_line"}
+        max_bytes = self._limit(arguments)
+        lines = max(1, int(arguments.get("lines") or DEFAULT_PREVIEW_LINES))
+        start_line = max(1, int(arguments.get("start_line") or 1)) if mode == "range" else 1
+        end_line = arguments.get("end_line") if mode == "range" else None
+        kept, used, cut, total_lines = [], 0, False, 0
+        tail = deque(maxlen=lines)
+        with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+            for number, line in enumerate(f, 1):
+                total_lines = number
+                if mode == "range":
+                    wanted = number >= start_line and (end_line is None or number <= int(end_line))
+                else:
+                    wanted = mode == "preview" and number <= lines
+                    tail.append(line)
+                if wanted and not cut:
+                    if used + len(line) <= max_bytes:
+                        kept.append(line)
+                        used += len(line)
+                    else:
+                        cut = True
+        if mode == "tail":
+            content = "".join(tail)[-max_bytes:]
+            return {"path": path, "size": size, "encoding": encoding, "content": content,
+                    "total_lines": total_lines, "start_line": max(1, total_lines - len(tail) + 1),
+                    "end_line": total_lines, "truncated": total_lines > len(tail)}
+        if mode == "preview" and total_lines <= 2 * lines:
+            # Lines after the head, from the tail buffer; those that do not fit the budget left are omitted
+            after_head = total_lines - min(lines, total_lines)
+            rest, budget = [], max_bytes - used
+            for line in reversed(list(tail)[len(tail) - after_head:] if after_head else []):
+                if len(line) > budget:
+                    break
+                rest.insert(0, line)
+                budget -= len(line)
+            omitted = total_lines - len(kept) - len(rest)
+            marker = f"... [{omitted} lines omitted] ...\n" if omitted else ""
+            return {"path": path, "size": size, "encoding": encoding, "content": "".join(kept) + marker + "".join(rest),
+                    "total_lines": total_lines, "start_line": 1, "end_line": total_lines, "truncated": omitted > 0}
+        if mode == "preview":
+            content = f"{''.join(kept)}... [{total_lines - len(kept) - len(tail)} lines omitted] ...\n{''.join(tail)}"
+            return {"path": path, "size": size, "encoding": encoding, "content": content,
+                    "total_lines": total_lines, "start_line": 1, "end_line": total_lines, "truncated": True}
+        end_line = start_line + len(kept) - 1
+        return {"path": path, "size": size, "encoding": encoding, "content": "".join(kept),
+                "total_lines": total_lines, "start_line": start_line, "end_line": end_line,
+                "next_line": end_line + 1 if end_line < total_lines else None,
+                "truncated": end_line < total_lines or start_line > 1}
+
+
+def read_file(path: str, mode: str = "range", start_line: Optional[int] = None, end_line: Optional[int] = None,
+              offset: Optional[int] = None, length: Optional[int] = None, lines: int = DEFAULT_PREVIEW_LINES,
+              encoding: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Read a text file or a page of it.
+
+    Args:
+        path (str): Path to the file to read
+        mode (str): 'range', 'tail' or 'preview'
+        start_line (int): First line (1-based) in range mode
+        end_line (int): Last line (inclusive) in range mode
+        offset (int): Byte offset in range mode, instead of lines
+        length (int): Bytes to read from offset
+        lines (int): Lines for tail and preview modes
+        encoding (str): Text encoding, detected if not given
+        max_bytes (int): Maximum bytes of text to return
+
+    Returns:
+        Dict[str, Any]: Result dictionary containing either:
+            - Success: {"result": {"content", "size", "total_lines", "encoding", range fields, "truncated"}}
+            - Error: {"error": error message}
+    """
+    result = FileReader(max_bytes=max_bytes).execute({
+        "path": path, "mode": mode, "start_line": start_line, "end_line": end_line, "offset": offset,
+        "length": length, "lines": lines, "encoding": encoding,
+    })
+    if "error" in result:
+        return result
+    return {"result": result}
@@ -1,31 +1,284 @@
-import pathlib
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import fnmatch
+import os
+import re
 
-def search_files(directory, patterns):
+# Directories that are never worth searching: VCS data, dependencies, caches
+DEFAULT_EXCLUDES = [".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+                    ".tox", ".mypy_cache", ".pytest_cache", ".ipynb_checkpoints"]
+
+TOOL_SPEC = {
+    "name": "search_files",
+    "description": "Find files in a directory tree by extension. Skips .git, node_modules, virtualenvs, "
+                   "caches and anything ignored by .gitignore. Returns at most max_results paths.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "directory": {
+                "type": "string",
+                "description": "Directory to search in"
+            },
+            "patterns": {
+                "type": "string",
+                "description": "Semicolon-separated list of file extensions to match (e.g. 'py;txt;md'). "
+                               "Use '' to match files without extension and '*' to match all files"
+            },
+            "exclude": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Extra file or directory name patterns to skip (e.g. ['build', '*.min.js'])"
+            },
+            "respect_gitignore": {
+                "type": "boolean",
+                "description": "If true, skip files ignored by .gitignore files",
+                "default": True
+            },
+            "max_results": {
+                "type": "integer",
+                "description": "Maximum number of paths to return",
+                "default": 1000
+            }
+        },
+        "required": ["directory", "patterns"]
+    }
+}
+
+
+class GitIgnore:
+    """
+    Matcher for the .gitignore files found while walking a tree.
+
+    Supports the common syntax: blank lines and comments, `!` negation,
+    trailing `/` for directories only, patterns anchored by a leading or inner
+    `/`, and `*`, `?`, `[...]` and `**` wildcards. Rules of a .gitignore apply
+    to the directory containing it and everything below; later rules win.
+    """
+
+    def __init__(self, rules: Tuple = ()):
+        # (absolute base directory, compiled regex, negate, dir_only)
+        self.rules = rules
+
+    @staticmethod
+    def _compile(pattern: str) -> "re.Pattern":
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                parts.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i):
+                parts.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                parts.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                parts.append("[^/]")
+                i += 1
+            elif pattern[i] == "[":
+                end = pattern.find("]", i + 2)
+                if end == -1:
+                    parts.append(re.escape("["))
+                    i += 1
+                else:
+                    body = pattern[i + 1:end].replace("\\", "\\\\")
+                    parts.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+                    i = end + 1
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return re.compile("".join(parts) + r"\Z")
+
+    def extend(self, directory: str) -> "GitIgnore":
+        """Return a matcher that also applies the .gitignore in `directory` (absolute path), if any"""
+        path = os.path.join(directory, ".gitignore")
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return self
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            if "/" not in line:
+                line = "**/" + line  # unanchored: matches at any depth
+            rules.append((directory, self._compile(line.lstrip("/")), negate, dir_only))
+        return GitIgnore(tuple(rules))
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        """Whether an absolute path below the directories of the rules is ignored"""
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            relative = path[len(base):].lstrip(os.sep).replace(os.sep, "/")
+            if regex.match(relative):
+                result = not negate
+        return result
+
+    @classmethod
+    def for_directory(cls, directory: str) -> "GitIgnore":
+        """
+        Matcher with the .gitignore files of the enclosing repository, from its root
+        down to the parent of `directory`, for searches started inside a repository
+        """
+        parents = []
+        parent = os.path.dirname(os.path.abspath(directory))
+        while True:
+            parents.append(parent)
+            if os.path.isdir(os.path.join(parent, ".git")):
+                break
+            if os.path.dirname(parent) == parent:
+                return cls()  # not inside a repository
+            parent = os.path.dirname(parent)
+        ignore = cls()
+        for parent in reversed(parents):
+            ignore = ignore.extend(parent)
+        return ignore
+
+
+def _matches_extension(name: str, extensions: Optional[set]) -> bool:
+    if extensions is None:
+        return True
+    ext = os.path.splitext(name)[1]
+    return ext.lstrip(".").lower() in extensions
+
+
+def exclude_sets(exclude: Optional[List[str]] = None) -> Tuple[set, List[str]]:
+    """DEFAULT_EXCLUDES plus `exclude`, split into exact names and glob patterns"""
+    names = DEFAULT_EXCLUDES + list(exclude or [])
+    return {n for n in names if not any(c in n for c in "*?[")}, [n for n in names if any(c in n for c in "*?[")]
+
+
+def _scan_directory(directory: str, ignore: GitIgnore, exclude: Tuple[set, List[str]], extensions: Optional[set],
+                    respect_gitignore: bool) -> Tuple[List[str], List[Tuple[str, GitIgnore]]]:
+    """
+    List one directory. Uses the file type cached in each DirEntry, so no stat call is made.
+
+    Returns:
+        Tuple: (matching file paths, [(subdirectory, its ignore matcher), ...])
+    """
+    abs_directory = os.path.abspath(directory)
+    if respect_gitignore:
+        ignore = ignore.extend(abs_directory)
+    exclude_names, exclude_globs = exclude
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name in exclude_names or any(fnmatch.fnmatch(entry.name, p) for p in exclude_globs):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+                if ignore.rules and ignore.ignored(os.path.join(abs_directory, entry.name), is_dir):
+                    continue
+                if is_dir:
+                    # Virtualenvs can have any name; they are recognized by their config file
+                    if not os.path.exists(os.path.join(entry.path, "pyvenv.cfg")):
+                        subdirs.append((entry.path, ignore))
+                elif is_file and _matches_extension(entry.name, extensions):
+                    files.append(entry.path)
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        pass
+    return files, subdirs
+
+
+def iter_files(directory: str, patterns: str = "*", exclude: Optional[List[str]] = None,
+               respect_gitignore: bool = True, max_results: Optional[int] = None,
+               workers: int = 8, directories: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    Walk a directory tree and yield matching file paths as they are found.
+
+    Directories are listed by a pool of `workers` threads (os.scandir releases
+    the GIL while waiting on the file system); with more than one worker the
+    order of results is not deterministic. Excluded and ignored directories
+    are pruned, not descended into. Stops as soon as `max_results` paths were
+    yielded, and the caller may stop iterating at any time.
+
+    Args:
+        directory (str): Root directory
+        patterns (str): Semicolon-separated extensions, '' for no extension, '*' for all files
+        exclude (List[str]): Name patterns to skip, in addition to DEFAULT_EXCLUDES
+        respect_gitignore (bool): Skip paths ignored by .gitignore files
+        max_results (int): Stop after this many paths, None for no limit
+        workers (int): Number of directory listing threads
+        directories (Dict[str, int]): If given, filled with the st_mtime_ns of every directory
+            listed, taken just before listing it, so later changes to the listing can be detected
+
+    Yields:
+        str: Matching file paths
+    """
+    pattern_list = [pattern.strip().lower().lstrip(".") for pattern in patterns.split(";")]
+    extensions = None if "*" in pattern_list else set(pattern_list)
+    exclude = exclude_sets(exclude)
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(f"Not a directory: {directory}")
+    ignore = GitIgnore.for_directory(directory) if respect_gitignore else GitIgnore()
+
+    def scan(path: str, path_ignore: GitIgnore):
+        if directories is not None:
+            try:
+                directories[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        return _scan_directory(path, path_ignore, exclude, extensions, respect_gitignore)
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {pool.submit(scan, directory, ignore)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    for path in files:
+                        yield path
+                        count += 1
+                        if max_results is not None and count >= max_results:
+                            return
+                    for subdir, sub_ignore in subdirs:
+                        pending.add(pool.submit(scan, subdir, sub_ignore))
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def search_files(directory: str, patterns: str, exclude: Optional[List[str]] = None,
+                 respect_gitignore: bool = True, max_results: int = 1000) -> Dict[str, Any]:
     """
     Search for files in a directory based on file extensions.
-    
+
     Args:
         directory (str): Directory to search in
-        patterns (str): Semicolon-separated list of file extensions to match (e.g., 'py;txt;md'). 
-                       Use '' to match files without extension
-    
+        patterns (str): Semicolon-separated list of file extensions to match (e.g., 'py;txt;md').
+                       Use '' to match files without extension and '*' to match all files
+        exclude (List[str]): Extra file or directory name patterns to skip
+        respect_gitignore (bool): Skip files ignored by .gitignore files
+        max_results (int): Maximum number of paths to return
+
     Returns:
-        list: List of matching file paths as strings
+        Dict[str, Any]: Result dictionary containing either:
+            - Success: {"result": [paths], "truncated": bool}
+            - Error: {"error": error message}
     """
-    files = []
-    patterns = [pattern.lower() for pattern in patterns.split(';')]
-
-    for path in pathlib.Path(directory).rglob('*'):
-        if path.is_file():
-            # Handle files with no extension
-            if not path.suffix:
-                if '' in patterns:
-                    files.append(str(path))
-                continue
-            
-            # Handle files with extensions
-            ext = path.suffix.lstrip('.').lower()
-            if ext in patterns:
-                files.append(str(path))
+    try:
+        files = list(iter_files(directory, patterns, exclude=exclude, respect_gitignore=respect_gitignore,
+                                max_results=max_results + 1 if max_results else None))
+        truncated = bool(max_results) and len(files) > max_results
+        return {"result": sorted(files[:max_results] if truncated else files), "truncated": truncated}
 
-    return files
+    except Exception as e:
+        return {"error": str(e)}
@@ -1,54 +1,412 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import os
+import re
+import stat
+import tempfile
 
 TOOL_SPEC = {
     "name": "file_writer",
-    "description": "Write or append text content to a file. Creates parent directories if they don't exist.",
+    "description": "Write, append or edit text files. Creates parent directories if they don't exist. To change "
+                   "part of an existing file, use mode 'replace' (exact search-and-replace edits) or 'patch' "
+                   "(unified diff) instead of resending the whole file. mode 'batch' applies several file "
+                   "operations in one call. Writes are atomic: a file is never left half-written.",
     "input_schema": {
         "type": "object",
         "properties": {
+            "mode": {
+                "type": "string",
+                "description": "'write' (overwrite, or append with append=true), 'replace', 'patch' or 'batch'",
+                "enum": ["write", "replace", "patch", "batch"],
+                "default": "write"
+            },
             "path": {
                 "type": "string",
-                "description": "Path to the file to write to"
+                "description": "Path to the file to write to. For 'patch' it may be omitted and taken from the diff headers"
             },
             "content": {
                 "type": "string",
-                "description": "Content to write to the file"
+                "description": "Content to write to the file ('write' mode)"
             },
             "append": {
                 "type": "boolean",
                 "description": "If true, append content to file. If false, overwrite file.",
                 "default": False
+            },
+            "edits": {
+                "type": "array",
+                "description": "'replace' mode: edits applied in order. Each 'old' text must occur exactly once, "
+                               "unless replace_all is true",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "old": {"type": "string", "description": "Exact text to find"},
+                        "new": {"type": "string", "description": "Replacement text"},
+                        "replace_all": {"type": "boolean", "description": "Replace every occurrence", "default": False}
+                    },
+                    "required": ["old", "new"]
+                }
+            },
+            "patch": {
+                "type": "string",
+                "description": "'patch' mode: unified diff (as produced by diff -u or git diff), for one or more files"
+            },
+            "operations": {
+                "type": "array",
+                "description": "'batch' mode: list of operations, each an object with path, mode and the fields of "
+                               "that mode. Nothing is written unless every operation can be applied",
+                "items": {"type": "object"}
+            },
+            "fsync": {
+                "type": "boolean",
+                "description": "Flush writes to disk before returning",
+                "default": True
             }
-        },
-        "required": ["path", "content"]
+        }
     }
 }
 
-def file_writer(path: str, content: str, append: bool = False) -> Dict[str, Any]:
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class EditError(ValueError):
+    """An edit or patch does not apply to the current file contents"""
+    pass
+
+
+def _normalize(text: str) -> Tuple[str, str]:
+    """Text with line endings normalized to \\n, and its original line ending"""
+    newline = "\r\n" if text.count("\r\n") > text.count("\n") // 2 else "\n"
+    return text.replace("\r\n", "\n"), newline
+
+
+def _read_text(path: str) -> Tuple[str, str]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return _normalize(f.read())
+
+
+def apply_edits(text: str, edits: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """
+    Apply search-and-replace edits in order
+
+    Returns:
+        Tuple[str, int]: (new text, number of replacements)
+
+    Raises:
+        EditError: If an 'old' text is missing, or occurs more than once without replace_all
+    """
+    replacements = 0
+    for i, edit in enumerate(edits, 1):
+        old, new = edit.get("old"), edit.get("new")
+        if not old or new is None:
+            raise EditError(f"Edit {i}: 'old' and 'new' are required and 'old' must not be empty")
+        count = text.count(old)
+        if count == 0:
+            raise EditError(f"Edit {i}: text not found: {old[:80]!r}")
+        if count > 1 and not edit.get("replace_all"):
+            raise EditError(f"Edit {i}: text occurs {count} times, add context to make it unique or set replace_all")
+        text = text.replace(old, new)
+        replacements += count
+    return text, replacements
+
+
+def parse_patch(patch: str) -> List[Dict[str, Any]]:
+    """
+    Parse a unified diff
+
+    Returns:
+        List[Dict[str, Any]]: One {"old_path", "new_path", "hunks"} per file; each hunk is
+            {"old_start", "lines": [(tag, text), ...]} with tag ' ', '-' or '+'
+    """
+    files, current, hunk = [], None, None
+    for line in patch.replace("\r\n", "\n").split("\n"):
+        if line.startswith("--- ") and (hunk is None or hunk["remaining"] == [0, 0]):
+            current = {"old_path": _diff_path(line[4:]), "new_path": None, "hunks": []}
+            files.append(current)
+            hunk = None
+        elif line.startswith("+++ ") and current is not None and current["new_path"] is None and not current["hunks"]:
+            current["new_path"] = _diff_path(line[4:])
+        elif line.startswith("@@"):
+            match = _HUNK_HEADER.match(line)
+            if not match:
+                raise EditError(f"Malformed hunk header: {line}")
+            if current is None:
+                # Hunks without file headers, for the file given by path
+                current = {"old_path": "", "new_path": "", "hunks": []}
+                files.append(current)
+            old_len = int(match.group(2)) if match.group(2) is not None else 1
+            new_len = int(match.group(4)) if match.group(4) is not None else 1
+            hunk = {"old_start": int(match.group(1)), "lines": [], "remaining": [old_len, new_len]}
+            current["hunks"].append(hunk)
+        elif hunk is not None and hunk["remaining"] != [0, 0]:
+            if line.startswith("\\"):
+                continue  # "\ No newline at end of file"
+            tag, text = (line[0], line[1:]) if line else (" ", "")
+            if tag not in " -+":
+                raise EditError(f"Unexpected line in hunk: {line[:80]!r}")
+            hunk["lines"].append((tag, text))
+            if tag != "+":
+                hunk["remaining"][0] -= 1
+            if tag != "-":
+                hunk["remaining"][1] -= 1
+    if not files or not any(f["hunks"] for f in files):
+        raise EditError("No hunks found in patch")
+    for f in files:
+        for h in f["hunks"]:
+            if h["remaining"] != [0, 0]:
+                raise EditError(f"Hunk at line {h['old_start']} of {f['new_path'] or f['old_path']} is incomplete")
+            del h["remaining"]
+    return files
+
+
+def _diff_path(header: str) -> Optional[str]:
+    path = header.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    if path[:2] in ("a/", "b/"):
+        path = path[2:]
+    return path
+
+
+def apply_hunks(text: str, hunks: List[Dict[str, Any]]) -> str:
+    """
+    Apply parsed hunks to text. A hunk whose context moved is searched for nearby,
+    like patch(1) does; trailing whitespace differences are tolerated.
+
+    Raises:
+        EditError: If a hunk's context is not found
+    """
+    ends_with_newline = text.endswith("\n") or not text
+    lines = text.split("\n")
+    if ends_with_newline:
+        lines.pop()
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        old = [t for tag, t in hunk["lines"] if tag != "+"]
+        new = [t for tag, t in hunk["lines"] if tag != "-"]
+        # A pure insertion (-N,0) goes after line N, other hunks start at line N
+        base = hunk["old_start"] - 1 if old else hunk["old_start"]
+        position = _find_block(lines, old, max(0, base + offset))
+        if position is None:
+            raise EditError(f"Hunk {number} (line {hunk['old_start']}) does not apply")
+        lines[position:position + len(old)] = new
+        offset = position - base + len(new) - len(old)
+    return "\n".join(lines) + ("\n" if ends_with_newline and lines else "")
+
+
+def _find_block(lines: List[str], block: List[str], expected: int) -> Optional[int]:
+    if not block:
+        return min(expected, len(lines))
+    for normalize in (lambda s: s, lambda s: s.rstrip()):
+        wanted = [normalize(s) for s in block]
+        # Search outward from the expected position
+        for distance in range(len(lines) + 1):
+            for position in ((expected - distance, expected + distance) if distance else (expected,)):
+                if 0 <= position <= len(lines) - len(block) and \
+                        all(normalize(lines[position + i]) == wanted[i] for i in range(len(block))):
+                    return position
+    return None
+
+
+def _plan(operation: Dict[str, Any], pending: Dict[str, Optional[str]]) -> List[Tuple[str, Optional[str], str, Dict]]:
+    """
+    Work out the new contents for one operation without touching the disk
+
+    Args:
+        operation: {"mode", "path", ...} as in the tool input
+        pending: New contents of files already planned in this call, by absolute path,
+            so later operations see the result of earlier ones
+
+    Returns:
+        List[Tuple]: (absolute path, new text or None to delete, action, details) per file
+    """
+    mode = operation.get("mode") or "write"
+    path = operation.get("path")
+
+    def current(abs_path):
+        if abs_path in pending:
+            if pending[abs_path] is None:
+                raise EditError(f"File was deleted earlier in this batch: {abs_path}")
+            return _normalize(pending[abs_path])
+        if not os.path.exists(abs_path):
+            raise EditError(f"File not found: {abs_path}")
+        return _read_text(abs_path)
+
+    if mode == "write":
+        if not path or operation.get("content") is None:
+            raise EditError("'write' needs path and content")
+        abs_path = os.path.abspath(path)
+        if operation.get("append"):
+            if abs_path in pending and pending[abs_path] is not None:
+                return [(abs_path, pending[abs_path] + operation["content"], "written", {})]
+            return [(abs_path, operation["content"], "appended", {})]
+        return [(abs_path, operation["content"], "written", {})]
+
+    if mode == "replace":
+        if not path or not operation.get("edits"):
+            raise EditError("'replace' needs path and edits")
+        abs_path = os.path.abspath(path)
+        text, newline = current(abs_path)
+        new_text, count = apply_edits(text, operation["edits"])
+        return [(abs_path, new_text.replace("\n", newline), "edited", {"replacements": count})]
+
+    if mode == "patch":
+        if not operation.get("patch"):
+            raise EditError("'patch' needs a patch")
+        files = parse_patch(operation["patch"])
+        if path and len(files) > 1:
+            raise EditError("path can only be given for a single-file patch")
+        planned = []
+        for f in files:
+            target = path or f["new_path"] or f["old_path"]
+            if not target:
+                raise EditError("Cannot tell which file the patch is for, pass path")
+            abs_path = os.path.abspath(target)
+            if f["new_path"] is None and not path:
+                planned.append((abs_path, None, "deleted", {}))
+                continue
+            if f["old_path"] is None and not os.path.exists(abs_path) and abs_path not in pending:
+                text, newline = "", "\n"
+            else:
+                text, newline = current(abs_path)
+            new_text = apply_hunks(text, f["hunks"])
+            planned.append((abs_path, new_text.replace("\n", newline), "patched", {"hunks": len(f["hunks"])}))
+        return planned
+
+    raise EditError(f"Unknown mode: {mode}")
+
+
+def _commit(planned: List[Tuple[str, Optional[str], str, Dict]], durable: bool) -> List[Dict[str, Any]]:
     """
-    Write or append content to a file, creating parent directories if needed.
-    
+    Write planned contents atomically: every file goes to a temporary file next to it,
+    and is renamed over the original only after all temporary files were written.
+    With `durable`, data is fsynced once per file and each directory once, after the renames.
+    """
+    temps, directories = [], set()
+    try:
+        for abs_path, text, action, details in planned:
+            if text is None or action == "appended":
+                continue
+            directory = os.path.dirname(abs_path)
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(abs_path)}.", suffix=".tmp")
+            temps.append(temp_path)
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+                f.flush()
+                if durable:
+                    os.fsync(f.fileno())
+            if os.path.exists(abs_path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(abs_path).st_mode))
+    except BaseException:
+        for temp_path in temps:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+    temp_paths = iter(temps)
+    try:
+        results = _rename(planned, temp_paths, durable, directories)
+    finally:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    if durable and hasattr(os, "O_DIRECTORY"):
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    return results
+
+
+def _rename(planned, temp_paths, durable: bool, directories: set) -> List[Dict[str, Any]]:
+    """Move the temporary files into place, apply appends and deletions"""
+    results = []
+    for abs_path, text, action, details in planned:
+        directory = os.path.dirname(abs_path)
+        if text is None:
+            if os.path.exists(abs_path):
+                os.remove(abs_path)
+            size = 0
+        elif action == "appended":
+            os.makedirs(directory, exist_ok=True)
+            with open(abs_path, "a", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                if durable:
+                    os.fsync(f.fileno())
+            size = os.path.getsize(abs_path)
+        else:
+            os.replace(next(temp_paths), abs_path)
+            size = len(text.encode("utf-8"))
+        directories.add(directory)
+        results.append({"path": abs_path, "action": action, "bytes": size, **details})
+    return results
+
+
+def file_writer(path: Optional[str] = None, content: Optional[str] = None, append: bool = False,
+                mode: str = "write", edits: Optional[List[Dict[str, Any]]] = None, patch: Optional[str] = None,
+                operations: Optional[List[Dict[str, Any]]] = None, fsync: bool = True) -> Dict[str, Any]:
+    """
+    Write, append or edit files, creating parent directories if needed.
+
+    Every operation is checked before anything is written, so a batch or multi-file
+    patch with one bad edit leaves all files unchanged.
+
     Args:
         path (str): Path to the file to write to
-        content (str): Content to write to the file
+        content (str): Content to write to the file ('write' mode)
         append (bool): If True, append to file. If False, overwrite file.
-        
+        mode (str): 'write', 'replace', 'patch' or 'batch'
+        edits (List[Dict]): 'replace' mode edits, {"old", "new", "replace_all"}
+        patch (str): 'patch' mode unified diff
+        operations (List[Dict]): 'batch' mode operations, each with its own mode and fields
+        fsync (bool): Flush data to disk before returning
+
     Returns:
         Dict[str, Any]: Result dictionary containing either:
-            - Success: {"result": "File written successfully"}
+            - Success: {"result": summary message, "files": [{"path", "action", "bytes", ...}]}
             - Error: {"error": error message}
     """
     try:
-        # Create parent directories if they don't exist
-        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
-        
-        # Write or append content to file
-        mode = 'a' if append else 'w'
-        with open(path, mode, encoding='utf-8') as f:
-            f.write(content)
-            
-        return {"result": "File written successfully"}
-        
+        if mode == "batch":
+            if not operations:
+                return {"error": "'batch' needs a list of operations"}
+        else:
+            operations = [{"mode": mode, "path": path, "content": content, "append": append,
+                           "edits": edits, "patch": patch}]
+
+        planned, pending = [], {}
+        for i, operation in enumerate(operations, 1):
+            if operation.get("mode") == "batch":
+                return {"error": f"Operation {i}: batches cannot be nested"}
+            try:
+                steps = _plan(operation, pending)
+            except EditError as e:
+                return {"error": f"Operation {i}: {str(e)}" if mode == "batch" else str(e)}
+            for abs_path, text, action, details in steps:
+                if action == "appended":
+                    # Later operations on this file see the whole file, not only the appended part
+                    existing = ""
+                    if os.path.exists(abs_path):
+                        with open(abs_path, "r", encoding="utf-8", newline="") as f:
+                            existing = f.read()
+                    text = existing + text
+                pending[abs_path] = text
+            planned.extend(steps)
+
+        # An earlier step superseded by a later one for the same file is not written
+        last = {abs_path: index for index, (abs_path, _, _, _) in enumerate(planned)}
+        planned = [step for index, step in enumerate(planned) if last[step[0]] == index]
+
+        files = _commit(planned, fsync)
+        if mode == "write" and not append:
+            return {"result": "File written successfully", "files": files}
+        if mode == "write":
+            return {"result": "Content appended successfully", "files": files}
+        return {"result": f"{len(files)} file(s) updated", "files": files}
+
     except Exception as e:
         return {"error": str(e)}
@@ -1,64 +1,317 @@
+import hashlib
+import json
 import os
-from typing import Dict
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
+import numpy as np
+
+# Previews are written here as <key>.html/.bin/.json, key = hash of the STL content and preview options
+OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "temp", "stl_viewer"))
+FORMAT_VERSION = 1
+
+# Triangle budgets of the coarse levels of detail, sent before the full mesh
+LOD_TRIANGLES = (25_000, 250_000)
+DEFAULT_MAX_TRIANGLES = 2_000_000
+
+# Positions are stored as uint16 within the bounding box, so vertices closer
+# than 1/65535 of the box are merged; invisible in a preview
+QUANT = 65535
+
+_BINARY_RECORD = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
 
 # Tool Specification
 TOOL_SPEC = {
     "name": "view_stl",
-    "description": "View an STL file in the browser using Three.js",
+    "description": "View an STL file in the browser using Three.js. Large meshes are decimated into levels of "
+                   "detail that load coarse-first; returns the viewer URL and mesh statistics (triangle count, "
+                   "bounds, surface area, volume).",
     "input_schema": {
         "type": "object",
         "properties": {
             "stl_path": {
                 "type": "string",
                 "description": "Path to the STL file to view"
+            },
+            "max_triangles": {
+                "type": "integer",
+                "description": "Decimate the most detailed level to at most this many triangles",
+                "default": DEFAULT_MAX_TRIANGLES
             }
         },
         "required": ["stl_path"]
     }
 }
 
-def view_stl(stl_path: str) -> Dict:
+
+def read_stl(path: str) -> np.ndarray:
+    """
+    Parse a binary or ASCII STL file
+
+    Returns:
+        np.ndarray: float32 array of shape (triangles, 3, 3)
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(84)
+    # Some binary files start with "solid" too, so trust the size of a binary file first
+    if len(header) == 84:
+        count = int(np.frombuffer(header, "<u4", 1, 80)[0])
+        if size == 84 + count * _BINARY_RECORD.itemsize:
+            records = np.fromfile(path, dtype=_BINARY_RECORD, count=count, offset=84)
+            return np.ascontiguousarray(records["vertices"])
+    if not header.lstrip().startswith(b"solid"):
+        raise ValueError(f"Not an STL file, or a truncated binary one: {path}")
+
+    with open(path, "rb") as f:
+        tokens = np.array(f.read().split())
+    starts = np.flatnonzero(tokens == b"vertex")
+    if len(starts) % 3:
+        raise ValueError(f"Malformed ASCII STL, {len(starts)} vertices is not a whole number of triangles")
+    coordinates = tokens[starts[:, None] + np.arange(1, 4)].astype(np.float32)
+    return coordinates.reshape(-1, 3, 3)
+
+
+def mesh_stats(triangles: np.ndarray) -> Dict[str, Any]:
+    """Bounds, surface area and enclosed volume, in the file's units"""
+    if len(triangles) == 0:
+        return {"triangles": 0}
+    vertices = triangles.reshape(-1, 3)
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    a, b, c = (triangles[:, i].astype(np.float64) for i in range(3))
+    cross = np.cross(b - a, c - a)
+    areas = np.linalg.norm(cross, axis=1) / 2
+    # a . ((b - a) x (c - a)) == a . (b x c), six times the signed volume of the tetrahedron with the origin
+    return {
+        "triangles": len(triangles),
+        "bounds": {"min": low.tolist(), "max": high.tolist(), "size": (high - low).tolist()},
+        "center": ((low + high) / 2).tolist(),
+        "surface_area": float(areas.sum()),
+        # Meaningful when the mesh is closed
+        "volume": float(abs(np.einsum("ij,ij->", a, cross)) / 6),
+        "degenerate_triangles": int(np.count_nonzero(areas == 0)),
+    }
+
+
+def _group(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Like np.unique(keys, return_index=True, return_inverse=True), but with an
+    unstable sort, which is several times faster on millions of keys
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Index of one member per group, and the group of every key
     """
-    Creates a temporary HTML file to view the STL file and launches it in the browser.
-    
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.empty(len(keys), dtype=bool)
+    starts[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    return order[starts], inverse
+
+
+def weld(triangles: np.ndarray, low: np.ndarray, extent: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize positions and share vertices between triangles
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: uint16 positions (vertices, 3) and int64 faces (triangles, 3)
+    """
+    quantized = np.rint((triangles.reshape(-1, 3) - low) / extent * QUANT).astype(np.int64)
+    keys = (quantized[:, 0] << 32) | (quantized[:, 1] << 16) | quantized[:, 2]
+    first, inverse = _group(keys)
+    return quantized[first].astype(np.uint16), inverse.reshape(-1, 3)
+
+
+def _clean_faces(faces: np.ndarray, vertex_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop collapsed and duplicate faces; returns (faces, indices of the vertices still used)"""
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])]
+    bits = max(1, int(vertex_count - 1).bit_length())
+    if bits <= 21:
+        # Same key for the same three vertices in any order
+        low, high = faces.min(axis=1), faces.max(axis=1)
+        keys = (low << (2 * bits)) | ((faces.sum(axis=1) - low - high) << bits) | high
+        first, _ = _group(keys)
+    else:
+        _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+    used = np.zeros(vertex_count, dtype=bool)
+    used[faces] = True
+    remap = np.cumsum(used) - 1
+    return remap[faces], np.flatnonzero(used)
+
+
+def cluster(positions: np.ndarray, faces: np.ndarray, cell: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vertex clustering decimation: merge the vertices in each cube of `cell`
+    quantized units into their mean, and drop the triangles that collapse
+    """
+    cells = positions.astype(np.int64) // cell
+    keys = (cells[:, 0] << 34) | (cells[:, 1] << 17) | cells[:, 2]
+    _, inverse = _group(keys)
+    counts = np.bincount(inverse)
+    merged = np.stack([np.bincount(inverse, weights=positions[:, axis]) for axis in range(3)], axis=1)
+    merged = np.rint(merged / counts[:, None]).astype(np.uint16)
+    new_faces, used = _clean_faces(inverse[faces], len(merged))
+    return merged[used], new_faces
+
+
+def decimate(positions: np.ndarray, faces: np.ndarray, target: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster with the finest grid found, in a few tries, that gives at most `target` triangles"""
+    # Surface meshes keep roughly 2 * resolution^2 triangles at a grid resolution; after the
+    # first try the exponent is re-estimated from the last two tries (it flattens near the
+    # mesh's own resolution)
+    cell = max(1.0, (QUANT + 1) / (target / 2) ** 0.5)
+    slope = -2.0
+    best, previous = None, None
+    for _ in range(6):
+        result = cluster(positions, faces, int(round(cell)))
+        count = max(len(result[1]), 1)
+        if count <= target and (best is None or count > len(best[1])):
+            best = result
+            if count >= 0.7 * target or round(cell) == 1:
+                break
+        if previous and previous[1] != count and round(previous[0]) != round(cell):
+            slope = min(-0.25, np.log(count / previous[1]) / np.log(cell / previous[0]))
+        previous = (cell, count)
+        cell = max(1.0, cell * (0.85 * target / count) ** (1 / slope))
+    return best if best is not None else cluster(positions, faces, QUANT + 1)
+
+
+def build_levels(triangles: np.ndarray, max_triangles: int) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Levels of detail, coarsest first, packed into one buffer
+
+    Each level is uint16 positions within the bounding box followed by uint16 or
+    uint32 indices, every part aligned to 4 bytes so the viewer can view it in place.
+
+    Returns:
+        Tuple[Dict[str, Any], bytes]: Manifest (origin, extent and per-level offsets) and the buffer
+    """
+    vertices = triangles.reshape(-1, 3)
+    low, high = vertices.min(axis=0).astype(np.float64), vertices.max(axis=0).astype(np.float64)
+    extent = np.maximum(high - low, 1e-9)
+    positions, faces = weld(triangles, low, extent)
+    faces, used = _clean_faces(faces, len(positions))
+    positions = positions[used]
+
+    levels = []
+    top = (positions, faces) if len(faces) <= max_triangles else decimate(positions, faces, max_triangles)
+    levels.append(top)
+    # Each coarser level is decimated from the previous one, which is smaller than the full mesh
+    for target in sorted(LOD_TRIANGLES, reverse=True):
+        if target < 0.5 * len(levels[-1][1]):
+            levels.append(decimate(levels[-1][0], levels[-1][1], target))
+    levels.reverse()
+
+    manifest_levels: List[Dict[str, Any]] = []
+    parts: List[bytes] = []
+    offset = 0
+    for level_positions, level_faces in levels:
+        index_type = np.uint16 if len(level_positions) <= 65536 else np.uint32
+        position_bytes = level_positions.astype("<u2").tobytes()
+        index_bytes = level_faces.astype(np.dtype(index_type).newbyteorder("<")).tobytes()
+        entry = {"vertices": len(level_positions), "triangles": len(level_faces),
+                 "index_type": np.dtype(index_type).name}
+        for name, data in (("positions", position_bytes), ("indices", index_bytes)):
+            entry[f"{name}_offset"] = offset
+            padding = -len(data) % 4
+            parts.append(data + b"\0" * padding)
+            offset += len(data) + padding
+        entry["end"] = offset
+        manifest_levels.append(entry)
+
+    manifest = {"origin": low.tolist(), "extent": extent.tolist(), "quantization": QUANT,
+                "levels": manifest_levels, "byte_length": offset}
+    return manifest, b"".join(parts)
+
+
+def _content_key(path: str, max_triangles: int) -> str:
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}-{max_triangles}-{LOD_TRIANGLES}".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:24]
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def prepare_preview(stl_path: str, max_triangles: int = DEFAULT_MAX_TRIANGLES,
+                    output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse, decimate and pack an STL file, or reuse the preview of identical content
+
+    Returns:
+        Dict[str, Any]: Manifest with "key", "bin_path", "stats" and "levels", plus "cached"
+    """
+    output_dir = output_dir or OUTPUT_DIR
+    key = _content_key(stl_path, max_triangles)
+    manifest_path = os.path.join(output_dir, f"{key}.json")
+    bin_path = os.path.join(output_dir, f"{key}.bin")
+    if os.path.exists(manifest_path) and os.path.exists(bin_path):
+        with open(manifest_path) as f:
+            return {**json.load(f), "bin_path": bin_path, "cached": True}
+
+    triangles = read_stl(stl_path)
+    if len(triangles) == 0:
+        raise ValueError(f"STL file has no triangles: {stl_path}")
+    manifest, buffer = build_levels(triangles, max_triangles)
+    manifest = {"key": key, "source": os.path.abspath(stl_path), "stats": mesh_stats(triangles), **manifest}
+
+    os.makedirs(output_dir, exist_ok=True)
+    _write_atomic(bin_path, buffer)  # before the manifest, which marks the preview complete
+    _write_atomic(manifest_path, json.dumps(manifest).encode("utf-8"))
+    return {**manifest, "bin_path": bin_path, "cached": False}
+
+
+def view_stl(stl_path: str, max_triangles: int = DEFAULT_MAX_TRIANGLES) -> Dict:
+    """
+    Creates an HTML viewer for the STL file and returns the URL to launch in the browser.
+
+    The mesh is parsed once, decimated into levels of detail and written as a
+    compact binary buffer that the viewer streams, showing the coarse levels
+    first. Outputs are named by a hash of the file content and reused.
+
     Args:
         stl_path (str): Path to the STL file to view
-        
+        max_triangles (int): Most triangles in the most detailed level
+
     Returns:
         Dict: Result dictionary containing either:
-            - Success case: Path to the generated HTML file and browser launch command
+            - Success case: Path to the generated HTML file, browser launch command and mesh statistics
             - Error case: {"error": "error message"}
     """
     try:
         # Verify STL file exists
         if not os.path.exists(stl_path):
             return {"error": f"STL file not found: {stl_path}"}
-            
-        # Get absolute path and convert to file URL
-        abs_path = os.path.abspath(stl_path)
-        file_url = f"file:///{abs_path.replace(os.sep, '/')}"
-        
+
+        preview = prepare_preview(stl_path, int(max_triangles))
+
         # Read the template
         template_path = os.path.join(os.path.dirname(__file__), "stl_viewer_template.html")
         with open(template_path, 'r') as f:
             template_content = f.read()
-            
-        # Replace the placeholder with the STL file path
-        html_content = template_content.replace('{stl_path}', file_url)
-        
-        # Create output directory if it doesn't exist
-        output_dir = os.path.join(os.path.dirname(__file__), "..", "temp")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Write the viewer HTML
-        output_path = os.path.join(output_dir, "stl_viewer.html")
+
+        # The viewer loads the buffer next to it by relative URL
+        viewer_manifest = {key: preview[key] for key in ("source", "stats", "origin", "extent", "quantization",
+                                                          "levels", "byte_length")}
+        viewer_manifest["bin_url"] = os.path.basename(preview["bin_path"])
+        html_content = template_content.replace('{manifest}', json.dumps(viewer_manifest).replace("</", "<\\/"))
+
+        # Rewritten every time, so template changes apply to cached meshes too
+        output_path = os.path.join(os.path.dirname(preview["bin_path"]), f"{preview['key']}.html")
         with open(output_path, 'w') as f:
             f.write(html_content)
-            
+
         # Convert output path to file URL for browser
-        output_url = f"file:///{output_path.replace(os.sep, '/')}"
-            
+        output_url = Path(output_path).as_uri()
+
         return {
             "result": {
                 "message": "STL viewer created successfully",
@@ -67,9 +320,14 @@ def view_stl(stl_path: str) -> Dict:
                 "browser_action": {
                     "action": "launch",
                     "url": output_url
-                }
+                },
+                "stats": preview["stats"],
+                "levels": [{"triangles": level["triangles"], "vertices": level["vertices"]}
+                           for level in preview["levels"]],
+                "buffer_bytes": preview["byte_length"],
+                "cached": preview["cached"]
             }
         }
-        
+
     except Exception as e:
         return {"error": str(e)}
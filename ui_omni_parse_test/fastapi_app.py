@@ -10,7 +10,9 @@ import base64
 from typing import Optional
 import numpy as np
 
-from utils import check_ocr_box, get_yolo_model, get_caption_model_processor, get_som_labeled_img
+from utils import check_ocr_box, get_yolo_model, get_caption_model_processor, get_som_labeled_img, ocr_engines
+from util.caption_cache import CaptionCache
+from incremental_parser import IncrementalParser
 from ultralytics import YOLO
 from transformers import AutoProcessor, AutoModelForCausalLM
 
@@ -28,13 +30,27 @@ app.add_middleware(
 # Configure templates
 templates = Jinja2Templates(directory="templates")
 
-# Load models at startup
-print("Loading models...")
-yolo_model = YOLO('weights/icon_detect/best.pt').to('cuda')
-processor = AutoProcessor.from_pretrained("microsoft/Florence-2-base", trust_remote_code=True)
-model = AutoModelForCausalLM.from_pretrained("weights/icon_caption_florence", torch_dtype=torch.float16, trust_remote_code=True).to('cuda')
-caption_model_processor = {'processor': processor, 'model': model}
-print('Models loaded successfully!')
+# Models are loaded when the server starts, not at import: the OCR worker processes are
+# spawned and re-import this module, and must not load the detection and caption models
+yolo_model = None
+caption_model_processor = None
+caption_cache = None
+incremental_parser = None
+
+@app.on_event("startup")
+def load_models():
+    global yolo_model, caption_model_processor, caption_cache, incremental_parser
+    print("Loading models...")
+    yolo_model = YOLO('weights/icon_detect/best.pt').to('cuda')
+    processor = AutoProcessor.from_pretrained("microsoft/Florence-2-base", trust_remote_code=True)
+    model = AutoModelForCausalLM.from_pretrained("weights/icon_caption_florence", torch_dtype=torch.float16, trust_remote_code=True).to('cuda')
+    caption_model_processor = {'processor': processor, 'model': model}
+    caption_cache = CaptionCache('cache/caption_cache.db')
+    incremental_parser = IncrementalParser(yolo_model, caption_model_processor, caption_cache=caption_cache)
+    # /process uses PaddleOCR, load it now instead of on the first request
+    for name, engine_stats in ocr_engines.preload(['paddleocr']).items():
+        print(f"OCR engine {name}: {engine_stats}")
+    print('Models loaded successfully!')
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -44,7 +60,8 @@ async def read_root(request: Request):
 async def process_image(
     file: UploadFile = File(...),
     box_threshold: float = Form(0.05),
-    iou_threshold: float = Form(0.1)
+    iou_threshold: float = Form(0.1),
+    incremental: bool = Form(False)
 ):
     try:
         # Read and save the uploaded image
@@ -62,6 +79,24 @@ async def process_image(
             'thickness': max(int(3 * box_overlay_ratio), 1),
         }
 
+        if incremental:
+            # Only re-parse the regions that changed since the previous frame
+            dino_labled_img, label_coordinates, parsed_content_list, parse_stats = incremental_parser.parse(
+                temp_path,
+                box_threshold=box_threshold,
+                iou_threshold=iou_threshold,
+                draw_bbox_config=draw_bbox_config,
+                output_coord_in_ratio=True,
+                use_paddleocr=True
+            )
+            return JSONResponse({
+                "annotated_image": dino_labled_img,
+                "parsed_content": '\n'.join(parsed_content_list),
+                "coordinates": str(label_coordinates),
+                "parse_mode": parse_stats['mode'],
+                "dirty_fraction": parse_stats['dirty_fraction']
+            })
+
         # Process the image
         ocr_bbox_rslt, is_goal_filtered = check_ocr_box(
             temp_path, 
@@ -69,7 +104,8 @@ async def process_image(
             output_bb_format='xyxy', 
             goal_filtering=None, 
             easyocr_args={'paragraph': False, 'text_threshold': 0.9},
-            use_paddleocr=True
+            use_paddleocr=True,
+            tile_size=2048  # multi-monitor / full-page captures are OCRed in tiles
         )
         text, ocr_bbox = ocr_bbox_rslt
 
@@ -83,7 +119,8 @@ async def process_image(
             draw_bbox_config=draw_bbox_config,
             caption_model_processor=caption_model_processor,
             ocr_text=text,
-            iou_threshold=iou_threshold
+            iou_threshold=iou_threshold,
+            caption_cache=caption_cache
         )
 
         # Convert parsed content list to string
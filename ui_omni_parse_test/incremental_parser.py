@@ -0,0 +1,175 @@
+import os
+import io
+import base64
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils import check_ocr_box, get_som_labeled_img, annotate
+from util.frame_diff import dirty_tile_mask, dirty_regions, merge_regions
+
+
+class IncrementalParser(object):
+    """
+    Screen parser that only re-parses the parts of the screen that changed.
+
+    The previous frame and its parsed elements are kept between calls. A new frame
+    is diffed block-wise against the previous one, OCR / YOLO / captioning run on
+    the dirty regions only, and the re-parsed elements replace the old elements
+    in those regions. Falls back to a full parse on the first frame, on a
+    resolution change, or when too much of the screen changed.
+
+    Elements are dicts: {'type': 'text' | 'icon', 'content': str, 'bbox': [x, y, w, h]} in pixels.
+    """
+
+    def __init__(self, yolo_model, caption_model_processor=None, caption_cache=None, tile_size: int = 32,
+                 diff_threshold: int = 8, max_dirty_fraction: float = 0.5, temp_dir: str = 'imgs'):
+        self.yolo_model = yolo_model
+        self.caption_model_processor = caption_model_processor
+        self.caption_cache = caption_cache
+        self.tile_size = tile_size
+        self.diff_threshold = diff_threshold
+        self.max_dirty_fraction = max_dirty_fraction
+        self.temp_dir = temp_dir
+        self.prev_frame = None
+        self.prev_elements = None
+        self.prev_settings = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.prev_frame = None
+            self.prev_elements = None
+            self.prev_settings = None
+
+    def parse(self, image_path: str, box_threshold: float = 0.05, iou_threshold: float = 0.1,
+              draw_bbox_config: Optional[Dict] = None, output_coord_in_ratio: bool = True,
+              use_paddleocr: bool = True) -> Tuple[str, Dict, List[str], Dict]:
+        """
+        Parse a screenshot, reusing the previous result for unchanged regions.
+
+        Returns:
+            Tuple: (base64 annotated image, label coordinates, parsed content list, stats)
+                in the same format as get_som_labeled_img, plus a stats dict with
+                'mode' ('full', 'incremental' or 'unchanged'), 'dirty_fraction' and 'regions'
+        """
+        frame = np.asarray(Image.open(image_path).convert('RGB'))
+        settings = (box_threshold, iou_threshold, use_paddleocr)
+        with self._lock:
+            stats = {'mode': 'full', 'dirty_fraction': 1.0, 'regions': []}
+            if self.prev_frame is not None and self.prev_frame.shape == frame.shape and self.prev_settings == settings:
+                mask = dirty_tile_mask(self.prev_frame, frame, self.tile_size, self.diff_threshold)
+                stats['dirty_fraction'] = float(mask.mean())
+                if not mask.any():
+                    stats['mode'] = 'unchanged'
+                    elements = self.prev_elements
+                elif stats['dirty_fraction'] <= self.max_dirty_fraction:
+                    stats['mode'] = 'incremental'
+                    regions = dirty_regions(mask, self.tile_size, (frame.shape[1], frame.shape[0]))
+                    elements, regions = self._parse_regions(frame, regions, box_threshold, iou_threshold, use_paddleocr)
+                    stats['regions'] = regions
+
+            if stats['mode'] == 'full':
+                elements = self._parse_elements(image_path, box_threshold, iou_threshold, use_paddleocr)
+
+            self.prev_frame = frame
+            self.prev_elements = elements
+            self.prev_settings = settings
+
+        encoded_image, label_coordinates, parsed_content_list = render_elements(
+            frame, elements, draw_bbox_config, output_coord_in_ratio)
+        return encoded_image, label_coordinates, parsed_content_list, stats
+
+    def _parse_regions(self, frame, regions, box_threshold, iou_threshold, use_paddleocr):
+        # grow regions to fully contain any old element they touch, so no element is re-parsed half cut off
+        while True:
+            grown = []
+            for region in regions:
+                x0, y0, x1, y1 = region
+                for element in self.prev_elements:
+                    if _intersects(_xyxy(element['bbox']), region):
+                        ex0, ey0, ex1, ey1 = _xyxy(element['bbox'])
+                        x0, y0, x1, y1 = min(x0, ex0), min(y0, ey0), max(x1, ex1), max(y1, ey1)
+                grown.append((max(int(x0), 0), max(int(y0), 0),
+                              min(int(np.ceil(x1)), frame.shape[1]), min(int(np.ceil(y1)), frame.shape[0])))
+            grown = merge_regions(grown)
+            if grown == regions:
+                break
+            regions = grown
+
+        elements = [e for e in self.prev_elements if not any(_intersects(_xyxy(e['bbox']), r) for r in regions)]
+        os.makedirs(self.temp_dir, exist_ok=True)
+        for i, (x0, y0, x1, y1) in enumerate(regions):
+            crop_path = os.path.join(self.temp_dir, f'temp_region_{i}.png')
+            Image.fromarray(frame[y0:y1, x0:x1]).save(crop_path)
+            for element in self._parse_elements(crop_path, box_threshold, iou_threshold, use_paddleocr):
+                x, y, w, h = element['bbox']
+                element['bbox'] = [x + x0, y + y0, w, h]
+                elements.append(element)
+        return elements, regions
+
+    def _parse_elements(self, image_path, box_threshold, iou_threshold, use_paddleocr):
+        (text, ocr_bbox), _ = check_ocr_box(
+            image_path,
+            display_img=False,
+            output_bb_format='xyxy',
+            goal_filtering=None,
+            easyocr_args={'paragraph': False, 'text_threshold': 0.9},
+            use_paddleocr=use_paddleocr
+        )
+        _, label_coordinates, parsed_content_list = get_som_labeled_img(
+            image_path,
+            self.yolo_model,
+            BOX_TRESHOLD=box_threshold,
+            output_coord_in_ratio=False,
+            ocr_bbox=ocr_bbox,
+            caption_model_processor=self.caption_model_processor,
+            ocr_text=text,
+            use_local_semantics=self.caption_model_processor is not None,
+            iou_threshold=iou_threshold,
+            caption_cache=self.caption_cache
+        )
+        elements = []
+        for i, coord in enumerate(label_coordinates.values()):
+            content = parsed_content_list[i].split(': ', 1)[1] if i < len(parsed_content_list) else 'None'
+            elements.append({
+                'type': 'text' if i < len(text) else 'icon',
+                'content': content,
+                'bbox': [float(v) for v in coord],
+            })
+        return elements
+
+
+def render_elements(frame: np.ndarray, elements: List[Dict], draw_bbox_config: Optional[Dict] = None,
+                    output_coord_in_ratio: bool = True):
+    """Draw elements on the frame and format them like get_som_labeled_img output."""
+    # text boxes come first so IDs follow the same convention as a full parse
+    elements = [e for e in elements if e['type'] == 'text'] + [e for e in elements if e['type'] != 'text']
+    h, w, _ = frame.shape
+    boxes = torch.tensor([[(x + bw / 2) / w, (y + bh / 2) / h, bw / w, bh / h] for x, y, bw, bh in (e['bbox'] for e in elements)],
+                         dtype=torch.float32).reshape(-1, 4)
+    phrases = [i for i in range(len(elements))]
+    if draw_bbox_config is None:
+        draw_bbox_config = {'text_scale': 0.4, 'text_padding': 5}
+    annotated_frame, label_coordinates = annotate(image_source=frame, boxes=boxes, logits=None, phrases=phrases, **draw_bbox_config)
+
+    buffered = io.BytesIO()
+    Image.fromarray(annotated_frame).save(buffered, format="PNG")
+    encoded_image = base64.b64encode(buffered.getvalue()).decode('ascii')
+    if output_coord_in_ratio:
+        label_coordinates = {k: [v[0]/w, v[1]/h, v[2]/w, v[3]/h] for k, v in label_coordinates.items()}
+
+    parsed_content_list = [f"{'Text' if e['type'] == 'text' else 'Icon'} Box ID {i}: {e['content']}" for i, e in enumerate(elements)]
+    return encoded_image, label_coordinates, parsed_content_list
+
+
+def _xyxy(bbox):
+    x, y, w, h = bbox
+    return x, y, x + w, y + h
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
@@ -22,19 +22,24 @@ TOOL_SPEC = {
                 "description": "Threshold for Intersection over Union in object detection (0-1)",
                 "minimum": 0,
                 "maximum": 1
+            },
+            "incremental": {
+                "type": "boolean",
+                "description": "Only re-parse the parts of the screen that changed since the previous call (default true). Set to false to force a full parse."
             }
         },
-        "required": []  # Both parameters are optional
+        "required": []  # All parameters are optional
     }
 }
 
-def parse_ui(box_threshold: float = 0.05, iou_threshold: float = 0.1) -> Dict:
+def parse_ui(box_threshold: float = 0.05, iou_threshold: float = 0.1, incremental: bool = True) -> Dict:
     """
     Takes a screenshot and sends it to the UI parsing server for analysis
     
     Args:
         box_threshold (float): Threshold for box detection confidence (0-1)
         iou_threshold (float): Threshold for Intersection over Union (0-1)
+        incremental (bool): Reuse the previous parse for unchanged screen regions
         
     Returns:
         Dict: Result dictionary containing either:
@@ -63,7 +68,8 @@ def parse_ui(box_threshold: float = 0.05, iou_threshold: float = 0.1) -> Dict:
         }
         data = {
             'box_threshold': str(box_threshold),
-            'iou_threshold': str(iou_threshold)
+            'iou_threshold': str(iou_threshold),
+            'incremental': str(incremental).lower()
         }
         
         # Send request to server
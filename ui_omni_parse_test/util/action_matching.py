@@ -2,6 +2,8 @@
 Adapted from https://github.com/google-research/google-research/tree/master/android_in_the_wild
 '''
 
+import functools
+
 import jax
 import jax.numpy as jnp
 import numpy as np
@@ -123,7 +125,7 @@ def _resize_annotation_bounding_boxes(
 def is_tap_action(normalized_start_yx,
                   normalized_end_yx):
   distance = jnp.linalg.norm(
-      jnp.array(normalized_start_yx) - jnp.array(normalized_end_yx))
+      jnp.asarray(normalized_start_yx) - jnp.asarray(normalized_end_yx))
   return distance <= _SWIPE_DISTANCE_THRESHOLD
 
 
@@ -138,6 +140,7 @@ def _check_tap_actions_match(
     matching_tap_distance_threshold_screen_percentage,
     annotation_width_augment_fraction,
     annotation_height_augment_fraction,
+    annotation_mask=None,
 ):
   """Determines if two tap actions are the same."""
   resized_annotation_positions = _resize_annotation_bounding_boxes(
@@ -149,14 +152,18 @@ def _check_tap_actions_match(
   # Check if the ground truth tap action falls in an annotation's bounding box.
   tap1_in_box = _yx_in_bounding_boxes(tap_1_yx, resized_annotation_positions)
   tap2_in_box = _yx_in_bounding_boxes(tap_2_yx, resized_annotation_positions)
-  both_in_box = jnp.max(tap1_in_box & tap2_in_box)
+  both_in_box = tap1_in_box & tap2_in_box
+  if annotation_mask is not None:
+    # Padded rows (see `pad_annotation_positions`) never contain a tap.
+    both_in_box = both_in_box & annotation_mask
+  both_in_box = jnp.any(both_in_box)
 
   # If the ground-truth tap action falls outside any of the annotation
   # bounding boxes or one of the actions is inside a bounding box and the other
   # is outside bounding box or vice versa, compare the points using Euclidean
   # distance.
   within_threshold = (
-      jnp.linalg.norm(jnp.array(tap_1_yx) - jnp.array(tap_2_yx))
+      jnp.linalg.norm(jnp.asarray(tap_1_yx) - jnp.asarray(tap_2_yx))
       <= matching_tap_distance_threshold_screen_percentage
   )
   return jnp.logical_or(both_in_box, within_threshold)
@@ -175,10 +182,10 @@ def _check_drag_actions_match(
   # ending at (0.3, 0.5) has a main axis index of 1).
   drag_1_deltas = drag_1_lift_yx - drag_1_touch_yx
   drag_1_magnitudes = jnp.abs(drag_1_deltas)
-  drag_1_main_axis = np.argmax(drag_1_magnitudes)
+  drag_1_main_axis = jnp.argmax(drag_1_magnitudes)
   drag_2_deltas = drag_2_lift_yx - drag_2_touch_yx
   drag_2_magnitudes = jnp.abs(drag_2_deltas)
-  drag_2_main_axis = np.argmax(drag_2_magnitudes)
+  drag_2_main_axis = jnp.argmax(drag_2_magnitudes)
 
   return jnp.equal(drag_1_main_axis, drag_2_main_axis)
 
@@ -194,6 +201,7 @@ def check_actions_match(
     tap_distance_threshold = _TAP_DISTANCE_THRESHOLD,
     annotation_width_augment_fraction = ANNOTATION_WIDTH_AUGMENT_FRACTION,
     annotation_height_augment_fraction = ANNOTATION_HEIGHT_AUGMENT_FRACTION,
+    annotation_mask = None,
 ):
   """Determines if two actions are considered to be the same.
 
@@ -217,6 +225,8 @@ def check_actions_match(
       bounding box by.
     annotation_height_augment_fraction: The fraction to increase the height of
       of the bounding box by.
+    annotation_mask: Optional 1D bool array of shape (num_bboxes,) marking the
+      rows of `annotation_positions` that are real boxes rather than padding.
 
   Returns:
     A boolean representing whether the two given actions are the same or not.
@@ -253,6 +263,7 @@ def check_actions_match(
       tap_distance_threshold,
       annotation_width_augment_fraction,
       annotation_height_augment_fraction,
+      annotation_mask,
   )
   #print("tap match: "+str(taps_match))
 
@@ -276,6 +287,143 @@ def check_actions_match(
   )
 
 
+
+def pad_annotation_positions(annotation_positions_list):
+  """Pads per-step annotation boxes into one dense array.
+
+  Args:
+    annotation_positions_list: A list with one (num_bboxes_i, 4) array per step,
+      in the (y, x, height, width) format used by `check_actions_match`.
+
+  Returns:
+    A tuple (annotation_positions, annotation_mask) of shapes
+    (num_steps, max_num_bboxes, 4) and (num_steps, max_num_bboxes), where the
+    mask is False for padding rows.
+  """
+  num_steps = len(annotation_positions_list)
+  max_boxes = max([len(boxes) for boxes in annotation_positions_list] + [1])
+  positions = np.zeros((num_steps, max_boxes, 4), dtype=np.float32)
+  mask = np.zeros((num_steps, max_boxes), dtype=bool)
+  for i, boxes in enumerate(annotation_positions_list):
+    if len(boxes):
+      positions[i, :len(boxes)] = np.asarray(boxes, dtype=np.float32)
+      mask[i, :len(boxes)] = True
+  return positions, mask
+
+
+_check_actions_match_vmap = jax.vmap(
+    check_actions_match,
+    in_axes=(0, 0, 0, 0, 0, 0, 0, None, None, None, 0),
+)
+
+
+@functools.partial(jax.jit, static_argnames=("num_episodes",))
+def _batch_match(
+    action_1_touch_yx,
+    action_1_lift_yx,
+    action_1_action_type,
+    action_2_touch_yx,
+    action_2_lift_yx,
+    action_2_action_type,
+    annotation_positions,
+    annotation_mask,
+    episode_index,
+    num_episodes,
+    tap_distance_threshold,
+    annotation_width_augment_fraction,
+    annotation_height_augment_fraction,
+):
+  matches = _check_actions_match_vmap(
+      action_1_touch_yx,
+      action_1_lift_yx,
+      action_1_action_type,
+      action_2_touch_yx,
+      action_2_lift_yx,
+      action_2_action_type,
+      annotation_positions,
+      tap_distance_threshold,
+      annotation_width_augment_fraction,
+      annotation_height_augment_fraction,
+      annotation_mask,
+  )
+  matches_f = matches.astype(jnp.float32)
+  episode_correct = jax.ops.segment_sum(
+      matches_f, episode_index, num_segments=num_episodes)
+  episode_steps = jax.ops.segment_sum(
+      jnp.ones_like(matches_f), episode_index, num_segments=num_episodes)
+  return matches, episode_correct, episode_steps
+
+
+def check_actions_match_batch(
+    pred_actions,
+    gt_actions,
+    annotation_positions,
+    annotation_mask=None,
+    episode_ids=None,
+    tap_distance_threshold = _TAP_DISTANCE_THRESHOLD,
+    annotation_width_augment_fraction = ANNOTATION_WIDTH_AUGMENT_FRACTION,
+    annotation_height_augment_fraction = ANNOTATION_HEIGHT_AUGMENT_FRACTION,
+):
+  """Scores a whole evaluation set with one jit-compiled, vmapped call.
+
+  Args:
+    pred_actions: Predicted actions as returned by `preds_2_format`, a dict of
+      arrays with keys "action_type" (N,), "touch_point" (N, 2) and
+      "lift_point" (N, 2), points in (y, x) order.
+    gt_actions: Ground-truth actions in the same format, e.g. from
+      `actions_2_format`.
+    annotation_positions: A (N, max_num_bboxes, 4) array of padded annotation
+      boxes, see `pad_annotation_positions`.
+    annotation_mask: A (N, max_num_bboxes) bool array marking real boxes. If
+      None, every row is treated as a real box.
+    episode_ids: Optional sequence of N episode identifiers used to aggregate
+      per-episode accuracy. If None, all steps form a single episode.
+    tap_distance_threshold: See `check_actions_match`.
+    annotation_width_augment_fraction: See `check_actions_match`.
+    annotation_height_augment_fraction: See `check_actions_match`.
+
+  Returns:
+    A dict with "step_matches" (N,) bool array, "step_accuracy" float,
+    "episode_ids" (num_episodes,), "episode_accuracy" (num_episodes,) fraction
+    of matched steps per episode and "episode_success" (num_episodes,) bool,
+    True when every step of the episode matched.
+  """
+  annotation_positions = np.asarray(annotation_positions, dtype=np.float32)
+  if annotation_mask is None:
+    annotation_mask = np.ones(annotation_positions.shape[:2], dtype=bool)
+  num_steps = len(pred_actions["action_type"])
+  if episode_ids is None:
+    episode_ids = np.zeros(num_steps, dtype=np.int32)
+  unique_episodes, episode_index = np.unique(
+      np.asarray(episode_ids), return_inverse=True)
+
+  matches, episode_correct, episode_steps = _batch_match(
+      jnp.asarray(pred_actions["touch_point"], dtype=jnp.float32),
+      jnp.asarray(pred_actions["lift_point"], dtype=jnp.float32),
+      jnp.asarray(pred_actions["action_type"], dtype=jnp.int32),
+      jnp.asarray(gt_actions["touch_point"], dtype=jnp.float32),
+      jnp.asarray(gt_actions["lift_point"], dtype=jnp.float32),
+      jnp.asarray(gt_actions["action_type"], dtype=jnp.int32),
+      jnp.asarray(annotation_positions),
+      jnp.asarray(annotation_mask, dtype=bool),
+      jnp.asarray(episode_index.reshape(-1), dtype=jnp.int32),
+      num_episodes=len(unique_episodes),
+      tap_distance_threshold=tap_distance_threshold,
+      annotation_width_augment_fraction=annotation_width_augment_fraction,
+      annotation_height_augment_fraction=annotation_height_augment_fraction,
+  )
+  matches = np.asarray(matches)
+  episode_correct = np.asarray(episode_correct)
+  episode_steps = np.asarray(episode_steps)
+  return {
+      "step_matches": matches,
+      "step_accuracy": float(matches.mean()) if num_steps else 0.0,
+      "episode_ids": unique_episodes,
+      "episode_accuracy": episode_correct / np.maximum(episode_steps, 1),
+      "episode_success": episode_correct == episode_steps,
+  }
+
+
 def action_2_format(step_data):
     # 把test数据集中的动作格式转换为计算matching score的格式
     action_type = step_data["action_type_id"]
@@ -422,4 +570,56 @@ def pred_2_format_simplified(step_data):
     action["lift_point"] = [action["lift_point"][1], action["lift_point"][0]]
     action["typed_text"] = action["typed_text"].lower()
 
-    return action
\ No newline at end of file
+    return action
+
+
+
+# Scroll gestures as (touch, lift) points in (x, y) order, indexed by direction
+_SCROLL_DIRECTIONS = ['scroll down', 'scroll up', 'scroll left', 'scroll right']
+_SCROLL_TOUCH_XY = np.array([[0.5, 0.8], [0.5, 0.2], [0.2, 0.5], [0.8, 0.5]], dtype=np.float32)
+_SCROLL_LIFT_XY = np.array([[0.5, 0.2], [0.5, 0.8], [0.8, 0.5], [0.2, 0.5]], dtype=np.float32)
+# pred_2_format action type codes of the scroll directions above
+_PRED_SCROLL_CODES = np.array([0, 1, 8, 9])
+
+
+def _format_batch(action_type, click_touch_xy, click_lift_xy, is_click, scroll_index, typed_text):
+    # Shared tail of the batched converters: pick the points of every row at once,
+    # then swap (x, y) -> (y, x) like the per-step converters do
+    is_scroll = scroll_index >= 0
+    safe_index = np.where(is_scroll, scroll_index, 0)
+    no_point = np.full_like(click_touch_xy, -1.0)
+    touch_xy = np.where(is_click[:, None], click_touch_xy,
+                        np.where(is_scroll[:, None], _SCROLL_TOUCH_XY[safe_index], no_point))
+    lift_xy = np.where(is_click[:, None], click_lift_xy,
+                       np.where(is_scroll[:, None], _SCROLL_LIFT_XY[safe_index], no_point))
+    return {"action_type": action_type, "touch_point": touch_xy[:, ::-1].copy(),
+            "lift_point": lift_xy[:, ::-1].copy(), "typed_text": [t.lower() for t in typed_text]}
+
+
+def actions_2_format(steps):
+    # Batched action_2_format: list of test-set steps -> dict of arrays for check_actions_match_batch
+    action_type = np.array([step["action_type_id"] for step in steps], dtype=np.int32).reshape(-1)
+    type_text = [step.get("action_type_text", "") for step in steps]
+    is_click = (action_type == 4) & np.array([t == 'click' for t in type_text], dtype=bool).reshape(-1)
+    touch_xy = np.array([step["touch"] if c else [-1.0, -1.0] for step, c in zip(steps, is_click)],
+                        dtype=np.float32).reshape(-1, 2)
+    lift_xy = np.array([step["lift"] if c else [-1.0, -1.0] for step, c in zip(steps, is_click)],
+                       dtype=np.float32).reshape(-1, 2)
+    scroll_index = np.array([_SCROLL_DIRECTIONS.index(t) if t in _SCROLL_DIRECTIONS else -1 for t in type_text],
+                            dtype=np.int32).reshape(-1)
+    scroll_index = np.where(action_type == 4, scroll_index, -1)
+    typed_text = [step["type_text"] if step["action_type_id"] == 3 else "" for step in steps]
+    return _format_batch(action_type, touch_xy, lift_xy, is_click, scroll_index, typed_text)
+
+
+def preds_2_format(steps):
+    # Batched pred_2_format: list of model outputs -> dict of arrays for check_actions_match_batch
+    raw_type = np.array([step["action_type"] for step in steps], dtype=np.int32).reshape(-1)
+    click_xy = np.array([step["click_point"] if step["action_type"] == 4 else [-1.0, -1.0] for step in steps],
+                        dtype=np.float32).reshape(-1, 2)
+    is_click = raw_type == 4
+    scroll_match = raw_type[:, None] == _PRED_SCROLL_CODES[None, :]
+    scroll_index = np.where(scroll_match.any(axis=1), scroll_match.argmax(axis=1), -1)
+    action_type = np.where(is_click | (scroll_index >= 0), 4, raw_type).astype(np.int32)
+    typed_text = [step["typed_text"] if step["action_type"] == 3 else "" for step in steps]
+    return _format_batch(action_type, click_xy, click_xy, is_click, scroll_index, typed_text)
@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+_HASH_SIZE = 8
+_HASH_HIGHFREQ_FACTOR = 4
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0, :] = np.sqrt(1.0 / n)
+    return m
+
+
+_DCT = _dct_matrix(_HASH_SIZE * _HASH_HIGHFREQ_FACTOR)
+
+
+def phash(image: Image.Image) -> int:
+    """
+    Compute a 64-bit perceptual hash (DCT based) of an image.
+
+    Visually identical icons rendered with slightly different anti-aliasing,
+    compression or sub-pixel offsets end up a few bits apart, so the hamming
+    distance between two hashes can be used as a near-duplicate test.
+    """
+    size = _HASH_SIZE * _HASH_HIGHFREQ_FACTOR
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    dct = _DCT @ pixels @ _DCT.T
+    low_freq = dct[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    bits = low_freq > np.median(low_freq[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    return (hash1 ^ hash2).bit_count()
+
+
+class CaptionCache:
+    """
+    Caption cache for icon crops keyed by perceptual hash.
+
+    Lookups first try an in-memory LRU (exact hash, then nearest hash within
+    `max_distance` bits) and fall back to an exact match in a SQLite store so
+    captions survive server restarts. Entries are namespaced by caption model
+    and prompt, since different models give different captions for the same icon.
+
+    Attributes:
+        db_path (str): Path of the SQLite file backing the cache, None for memory only
+        max_entries (int): Maximum number of captions held in the in-memory LRU
+        max_distance (int): Maximum hamming distance for a near-duplicate hit
+    """
+
+    def __init__(self, db_path: Optional[str] = "cache/caption_cache.db", max_entries: int = 4096, max_distance: int = 4):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()  # (namespace, hash) -> caption
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS captions
+                                  (namespace TEXT, hash TEXT, caption TEXT,
+                                   PRIMARY KEY (namespace, hash))''')
+            self._conn.commit()
+            self._warm()
+
+    def _warm(self):
+        rows = self._conn.execute('SELECT namespace, hash, caption FROM captions ORDER BY rowid DESC LIMIT ?',
+                                  (self.max_entries,)).fetchall()
+        for namespace, hash_hex, caption in reversed(rows):
+            self._lru[(namespace, int(hash_hex, 16))] = caption
+
+    def lookup(self, image_hash: int, namespace: str = "") -> Optional[str]:
+        with self._lock:
+            key = (namespace, image_hash)
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+
+            best_key, best_distance = None, self.max_distance + 1
+            for cached_namespace, cached_hash in self._lru:
+                if cached_namespace != namespace:
+                    continue
+                distance = hamming_distance(image_hash, cached_hash)
+                if distance < best_distance:
+                    best_key, best_distance = (cached_namespace, cached_hash), distance
+            if best_key is not None:
+                self._lru.move_to_end(best_key)
+                return self._lru[best_key]
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT caption FROM captions WHERE namespace = ? AND hash = ?',
+                                         (namespace, f"{image_hash:016x}")).fetchone()
+                if row:
+                    self._put(key, row[0])
+                    return row[0]
+        return None
+
+    def store(self, image_hash: int, caption: str, namespace: str = ""):
+        self.store_many([(image_hash, caption)], namespace)
+
+    def store_many(self, entries: List[Tuple[int, str]], namespace: str = ""):
+        with self._lock:
+            for image_hash, caption in entries:
+                self._put((namespace, image_hash), caption)
+            if self._conn is not None:
+                self._conn.executemany('INSERT OR REPLACE INTO captions (namespace, hash, caption) VALUES (?, ?, ?)',
+                                       [(namespace, f"{h:016x}", c) for h, c in entries])
+                self._conn.commit()
+
+    def _put(self, key, caption):
+        self._lru[key] = caption
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def caption_images(self, images: List[Image.Image], caption_fn: Callable[[List[Image.Image]], List[str]],
+                       namespace: str = "") -> List[str]:
+        """
+        Return one caption per image, calling `caption_fn` only for cache misses.
+
+        Identical crops inside the same call (e.g. a row of identical toolbar
+        buttons) are sent to the model once.
+        """
+        hashes = [phash(image) for image in images]
+        captions = [self.lookup(h, namespace) for h in hashes]
+
+        miss_indices = {}  # hash -> indices of crops sharing it
+        for i, caption in enumerate(captions):
+            if caption is None:
+                miss_indices.setdefault(hashes[i], []).append(i)
+        self.hits += len(images) - sum(len(v) for v in miss_indices.values())
+        self.misses += len(miss_indices)
+
+        if miss_indices:
+            to_caption = [images[indices[0]] for indices in miss_indices.values()]
+            generated = caption_fn(to_caption)
+            for indices, caption in zip(miss_indices.values(), generated):
+                for i in indices:
+                    captions[i] = caption
+            self.store_many(list(zip(miss_indices.keys(), generated)), namespace)
+        return captions
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,80 @@
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+
+def dirty_tile_mask(prev_frame: np.ndarray, frame: np.ndarray, tile_size: int = 32, threshold: int = 8) -> np.ndarray:
+    """
+    Block-wise diff of two frames of the same shape.
+
+    Args:
+        prev_frame (np.ndarray): Previous frame, HxW or HxWxC uint8
+        frame (np.ndarray): Current frame, same shape as `prev_frame`
+        tile_size (int): Edge length of the square tiles in pixels
+        threshold (int): A tile is dirty when any pixel channel changed by more than this
+
+    Returns:
+        np.ndarray: Bool array of shape (ceil(H / tile_size), ceil(W / tile_size)),
+            True for tiles that changed
+    """
+    diff = cv2.absdiff(prev_frame, frame)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    h, w = diff.shape
+    rows, cols = -(-h // tile_size), -(-w // tile_size)
+    padded = np.zeros((rows * tile_size, cols * tile_size), dtype=diff.dtype)
+    padded[:h, :w] = diff
+    tile_max = padded.reshape(rows, tile_size, cols, tile_size).max(axis=(1, 3))
+    return tile_max > threshold
+
+
+def dirty_regions(mask: np.ndarray, tile_size: int, image_size: Tuple[int, int], pad_tiles: int = 1) -> List[Tuple[int, int, int, int]]:
+    """
+    Group dirty tiles into pixel rectangles.
+
+    Neighbouring dirty tiles (after dilating by `pad_tiles`) form one region, and
+    overlapping regions are merged, so every changed pixel is covered by exactly
+    one rectangle with some context around it.
+
+    Args:
+        mask (np.ndarray): Output of `dirty_tile_mask`
+        tile_size (int): Tile size used to build the mask
+        image_size (Tuple[int, int]): (width, height) of the frame
+        pad_tiles (int): Number of tiles of context added around each changed area
+
+    Returns:
+        List[Tuple[int, int, int, int]]: Regions in xyxy pixel format
+    """
+    if not mask.any():
+        return []
+    w, h = image_size
+    grid = mask.astype(np.uint8)
+    if pad_tiles > 0:
+        kernel = np.ones((2 * pad_tiles + 1, 2 * pad_tiles + 1), np.uint8)
+        grid = cv2.dilate(grid, kernel)
+    num, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+    regions = []
+    for left, top, width, height, _ in stats[1:num]:
+        regions.append((int(left * tile_size), int(top * tile_size),
+                        int(min((left + width) * tile_size, w)), int(min((top + height) * tile_size, h))))
+    return merge_regions(regions)
+
+
+def merge_regions(regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Merge xyxy rectangles until none of them overlap."""
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
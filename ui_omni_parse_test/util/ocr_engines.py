@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of the current process in bytes, None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _create_easyocr():
+    import easyocr
+    return easyocr.Reader(['en'])
+
+
+def _create_paddleocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(
+        lang='en',  # other lang also available
+        use_angle_cls=False,
+        use_gpu=False,  # using cuda will conflict with pytorch in the same process
+        show_log=False,
+        max_batch_size=1024,
+        use_dilation=True,  # improves accuracy
+        det_db_score_mode='slow',  # improves accuracy
+        rec_batch_num=1024)
+
+
+class OCREngineRegistry:
+    """
+    Creates OCR engines on first use and shares them across threads.
+
+    Each engine is built at most once per process, under its own lock, so two
+    requests asking for the same engine at the same time do not both load the
+    model. `acquire` also serializes inference on an engine, since neither
+    EasyOCR nor PaddleOCR readers are safe to call from several threads at once.
+    Load time and the resident memory growth caused by each load are recorded
+    and reported by `stats`.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._engines: Dict[str, object] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._stats: Dict[str, Dict] = {}
+
+    def register(self, name: str, factory: Callable):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        if name not in self._factories:
+            raise KeyError(f"Unknown OCR engine: {name}")
+        with self._locks[name]:
+            if name not in self._engines:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                self._engines[name] = self._factories[name]()
+                rss_after = _rss_bytes()
+                self._stats[name] = {
+                    'load_seconds': time.perf_counter() - start,
+                    'rss_delta_mb': (rss_after - rss_before) / 2**20 if rss_before is not None and rss_after is not None else None,
+                }
+        return self._engines[name]
+
+    @contextmanager
+    def acquire(self, name: str):
+        engine = self.get(name)
+        with self._locks[name]:
+            yield engine
+
+    def preload(self, names: Iterable[str]) -> Dict[str, Dict]:
+        for name in names:
+            self.get(name)
+        return self.stats()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._engines
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-engine load stats: {'name': {'loaded', 'load_seconds', 'rss_delta_mb'}}"""
+        return {name: {'loaded': name in self._engines, **self._stats.get(name, {})} for name in self._factories}
+
+
+ocr_engines = OCREngineRegistry()
+ocr_engines.register('easyocr', _create_easyocr)
+ocr_engines.register('paddleocr', _create_paddleocr)
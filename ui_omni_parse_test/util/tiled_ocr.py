@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Each worker process loads its own copy of the OCR model (PaddleOCR or EasyOCR,
+# roughly 0.5-1 GB resident each), so memory grows with every worker: keep the
+# default small and raise it through check_ocr_box(max_workers=...) when there is room
+DEFAULT_MAX_WORKERS = 2
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an image into overlapping tiles.
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        tile_size (int): Edge length of the square tiles
+        overlap (int): Number of pixels shared by neighbouring tiles, should be
+            larger than the tallest text line expected in the image
+
+    Returns:
+        List[Tuple[int, int, int, int]]: Tiles in xyxy pixel format covering the image
+    """
+    stride = max(tile_size - overlap, 1)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)  # last tile is flush with the border
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def _init_worker():
+    # several processes already, keep the OCR backends from spawning a thread per core each
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    cv2.setNumThreads(1)
+
+
+def _ocr_tile(tile_image: np.ndarray, offset: Tuple[int, int], use_paddleocr: bool, easyocr_args: Optional[Dict]):
+    from util.ocr_engines import ocr_engines
+
+    if use_paddleocr:
+        with ocr_engines.acquire('paddleocr') as paddle_ocr:
+            result = paddle_ocr.ocr(tile_image, cls=False)[0] or []
+        coord = [item[0] for item in result]
+        text = [item[1][0] for item in result]
+    else:
+        with ocr_engines.acquire('easyocr') as reader:
+            result = reader.readtext(cv2.cvtColor(tile_image, cv2.COLOR_BGR2RGB), **(easyocr_args or {}))
+        coord = [item[0] for item in result]
+        text = [item[1] for item in result]
+    dx, dy = offset
+    coord = [[[float(x) + dx, float(y) + dy] for x, y in points] for points in coord]
+    return coord, text
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    # The pool (and the OCR model loaded in each worker) is kept for the life of the process.
+    # Workers are spawned rather than forked: forking the server would copy its CUDA context,
+    # the models already loaded in it and the threads holding their locks into every worker
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker)
+            _pool_workers = max_workers
+        return _pool
+
+
+def dedupe_boxes(coord: List, text: List[str], overlap_threshold: float = 0.5) -> Tuple[List, List[str]]:
+    """
+    Remove duplicate detections of the same text found by two overlapping tiles.
+
+    Boxes are visited from largest to smallest; a box is dropped when more than
+    `overlap_threshold` of its area is covered by an already kept box, so the
+    copy of a word cut by a tile border loses to the complete copy from the
+    neighbouring tile.
+    """
+    if not coord:
+        return coord, text
+    points = np.asarray(coord, dtype=np.float32)  # (n, 4, 2)
+    xyxy = np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    order = np.argsort(-areas, kind='stable')
+    kept = []
+    for i in order:
+        if kept:
+            k = np.asarray(kept)
+            iw = np.clip(np.minimum(xyxy[k, 2], xyxy[i, 2]) - np.maximum(xyxy[k, 0], xyxy[i, 0]), 0, None)
+            ih = np.clip(np.minimum(xyxy[k, 3], xyxy[i, 3]) - np.maximum(xyxy[k, 1], xyxy[i, 1]), 0, None)
+            if np.any(iw * ih > overlap_threshold * max(areas[i], 1e-6)):
+                continue
+        kept.append(i)
+    # keep reading order: top to bottom, left to right
+    kept.sort(key=lambda i: (xyxy[i, 1], xyxy[i, 0]))
+    return [coord[i] for i in kept], [text[i] for i in kept]
+
+
+def tiled_ocr(image_path: str, use_paddleocr: bool = False, easyocr_args: Optional[Dict] = None,
+              tile_size: int = 2048, overlap: int = 128, max_workers: Optional[int] = None) -> Tuple[List, List[str]]:
+    """
+    Run OCR on overlapping tiles in worker processes and merge the results.
+
+    Only the tiles currently being processed are held by the workers: at most
+    two tiles per worker are in flight, so peak memory is bounded by the
+    decoded image plus `2 * max_workers` tiles regardless of image size. Each
+    worker also holds its own OCR model, see DEFAULT_MAX_WORKERS.
+
+    Returns:
+        Tuple[List, List[str]]: (coord, text) in the same format as the OCR engines,
+            with 4-point boxes in full-image pixel coordinates
+    """
+    image = cv2.imread(image_path)  # BGR, as the OCR engines read it from a path
+    if image is None:
+        raise ValueError(f"Failed to read image: {image_path}")
+    height, width = image.shape[:2]
+    tiles = tile_grid(width, height, tile_size, overlap)
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    pool = _get_pool(max_workers)
+
+    coord, text = [], []
+    pending = set()
+    tiles_iter = iter(tiles)
+    while True:
+        while len(pending) < 2 * max_workers:
+            tile = next(tiles_iter, None)
+            if tile is None:
+                break
+            x0, y0, x1, y1 = tile
+            tile_image = np.ascontiguousarray(image[y0:y1, x0:x1])
+            pending.add(pool.submit(_ocr_tile, tile_image, (x0, y0), use_paddleocr, easyocr_args))
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            tile_coord, tile_text = future.result()
+            coord.extend(tile_coord)
+            text.extend(tile_text)
+    return dedupe_boxes(coord, text)
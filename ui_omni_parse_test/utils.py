@@ -17,18 +17,9 @@ import cv2
 import numpy as np
 # %matplotlib inline
 from matplotlib import pyplot as plt
-import easyocr
-from paddleocr import PaddleOCR
-reader = easyocr.Reader(['en'])
-paddle_ocr = PaddleOCR(
-    lang='en',  # other lang also available
-    use_angle_cls=False,
-    use_gpu=False,  # using cuda will conflict with pytorch in the same process
-    show_log=False,
-    max_batch_size=1024,
-    use_dilation=True,  # improves accuracy
-    det_db_score_mode='slow',  # improves accuracy
-    rec_batch_num=1024)
+# OCR engines are created on first use, see util/ocr_engines.py
+from util.ocr_engines import ocr_engines
+from util.tiled_ocr import tiled_ocr
 import time
 import base64
 
@@ -75,7 +66,7 @@ def get_yolo_model(model_path):
 
 
 @torch.inference_mode()
-def get_parsed_content_icon(filtered_boxes, ocr_bbox, image_source, caption_model_processor, prompt=None):
+def get_parsed_content_icon(filtered_boxes, ocr_bbox, image_source, caption_model_processor, prompt=None, caption_cache=None):
     to_pil = ToPILImage()
     if ocr_bbox:
         non_ocr_boxes = filtered_boxes[len(ocr_bbox):]
@@ -96,24 +87,30 @@ def get_parsed_content_icon(filtered_boxes, ocr_bbox, image_source, caption_mode
             prompt = "The image shows"
 
     batch_size = 10  # Number of samples per batch
-    generated_texts = []
     device = model.device
 
-    for i in range(0, len(croped_pil_image), batch_size):
-        batch = croped_pil_image[i:i+batch_size]
-        if model.device.type == 'cuda':
-            inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device, dtype=torch.float16)
-        else:
-            inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device)
-        if 'florence' in model.config.name_or_path:
-            generated_ids = model.generate(input_ids=inputs["input_ids"],pixel_values=inputs["pixel_values"],max_new_tokens=1024,num_beams=3, do_sample=False)
-        else:
-            generated_ids = model.generate(**inputs, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=True, num_return_sequences=1) # temperature=0.01, do_sample=True,
-        generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)
-        generated_text = [gen.strip() for gen in generated_text]
-        generated_texts.extend(generated_text)
+    def generate_captions(images):
+        generated_texts = []
+        for i in range(0, len(images), batch_size):
+            batch = images[i:i+batch_size]
+            if model.device.type == 'cuda':
+                inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device, dtype=torch.float16)
+            else:
+                inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device)
+            if 'florence' in model.config.name_or_path:
+                generated_ids = model.generate(input_ids=inputs["input_ids"],pixel_values=inputs["pixel_values"],max_new_tokens=1024,num_beams=3, do_sample=False)
+            else:
+                generated_ids = model.generate(**inputs, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=True, num_return_sequences=1) # temperature=0.01, do_sample=True,
+            generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)
+            generated_text = [gen.strip() for gen in generated_text]
+            generated_texts.extend(generated_text)
+        return generated_texts
 
-    return generated_texts
+    if caption_cache is not None:
+        # only crops without a (near-)identical cached icon go through the caption model
+        namespace = f"{model.config.name_or_path}|{prompt}"
+        return caption_cache.caption_images(croped_pil_image, generate_captions, namespace=namespace)
+    return generate_captions(croped_pil_image)
 
 
 
@@ -211,6 +208,8 @@ def remove_overlap(boxes, iou_threshold, ocr_bbox=None):
                     filtered_boxes.append(box1)
             else:
                 filtered_boxes.append(box1)
+    if not filtered_boxes:
+        return torch.zeros((0, 4))
     return torch.tensor(filtered_boxes)
 
 def load_image(image_path: str) -> Tuple[np.array, torch.Tensor]:
@@ -297,8 +296,9 @@ def predict_yolo(model, image_path, box_threshold):
     return boxes, conf, phrases
 
 
-def get_som_labeled_img(img_path, model=None, BOX_TRESHOLD = 0.01, output_coord_in_ratio=False, ocr_bbox=None, text_scale=0.4, text_padding=5, draw_bbox_config=None, caption_model_processor=None, ocr_text=[], use_local_semantics=True, iou_threshold=0.9,prompt=None):
+def get_som_labeled_img(img_path, model=None, BOX_TRESHOLD = 0.01, output_coord_in_ratio=False, ocr_bbox=None, text_scale=0.4, text_padding=5, draw_bbox_config=None, caption_model_processor=None, ocr_text=[], use_local_semantics=True, iou_threshold=0.9,prompt=None, caption_cache=None):
     """ ocr_bbox: list of xyxy format bbox
+        caption_cache: optional util.caption_cache.CaptionCache, reuses icon captions across calls
     """
     TEXT_PROMPT = "clickable buttons on the screen"
     # BOX_TRESHOLD = 0.02 # 0.05/0.02 for web and 0.1 for mobile
@@ -330,7 +330,7 @@ def get_som_labeled_img(img_path, model=None, BOX_TRESHOLD = 0.01, output_coord_
         if 'phi3_v' in caption_model.config.model_type: 
             parsed_content_icon = get_parsed_content_icon_phi3v(filtered_boxes, ocr_bbox, image_source, caption_model_processor)
         else:
-            parsed_content_icon = get_parsed_content_icon(filtered_boxes, ocr_bbox, image_source, caption_model_processor, prompt=prompt)
+            parsed_content_icon = get_parsed_content_icon(filtered_boxes, ocr_bbox, image_source, caption_model_processor, prompt=prompt, caption_cache=caption_cache)
         ocr_text = [f"Text Box ID {i}: {txt}" for i, txt in enumerate(ocr_text)]
         icon_start = len(ocr_text)
         parsed_content_icon_ls = []
@@ -380,15 +380,23 @@ def get_xywh_yolo(input):
     
 
 
-def check_ocr_box(image_path, display_img = True, output_bb_format='xywh', goal_filtering=None, easyocr_args=None, use_paddleocr=False):
-    if use_paddleocr:
-        result = paddle_ocr.ocr(image_path, cls=False)[0]
+def check_ocr_box(image_path, display_img = True, output_bb_format='xywh', goal_filtering=None, easyocr_args=None, use_paddleocr=False, tile_size=None, tile_overlap=128, max_workers=None):
+    """ tile_size: when set and the image is larger than one tile, OCR runs on overlapping
+        tiles in worker processes (see util/tiled_ocr.py) to bound memory on very large screenshots
+    """
+    if tile_size and max(Image.open(image_path).size) > tile_size:
+        coord, text = tiled_ocr(image_path, use_paddleocr=use_paddleocr, easyocr_args=easyocr_args,
+                                tile_size=tile_size, overlap=tile_overlap, max_workers=max_workers)
+    elif use_paddleocr:
+        with ocr_engines.acquire('paddleocr') as paddle_ocr:
+            result = paddle_ocr.ocr(image_path, cls=False)[0] or []  # None when no text is found
         coord = [item[0] for item in result]
         text = [item[1][0] for item in result]
     else:  # EasyOCR
         if easyocr_args is None:
             easyocr_args = {}
-        result = reader.readtext(image_path, **easyocr_args)
+        with ocr_engines.acquire('easyocr') as reader:
+            result = reader.readtext(image_path, **easyocr_args)
         # print('goal filtering pred:', result[-5:])
         coord = [item[0] for item in result]
         text = [item[1] for item in result]